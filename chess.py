@@ -6,14 +6,136 @@ Semester 2, 2021
 CSSE1001/CSSE7030
 """
 
-from typing import Optional, Tuple
+import argparse
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 from a1_support import *
+from chess_tables import get_attack_tables
 
 # Replace these <strings> with your name, student number and email address.
 __author__ = "Harold Shaw, 47020665"
 __email__ = "s4702066@student.uq.edu.au"
 
+# Statuses reported by validate_game() after each move, and by
+# check_game_over() along with DRAW.
+NORMAL = 'NORMAL'
+CHECK = 'CHECK'
+CHECKMATE = 'CHECKMATE'
+STALEMATE = 'STALEMATE'
+DRAW = 'DRAW'
+
+# Positions of every square name, in either case, e.g. 'e2' and 'E2'.
+SQUARE_POSITIONS = {
+    letter + str(BOARD_SIZE - row): (row, col % BOARD_SIZE)
+    for col, letter in enumerate('abcdefghABCDEFGH')
+    for row in range(BOARD_SIZE)
+}
+
+# Moves are encoded in 16 bits as the to square in bits 0-5, the from square
+# in bits 6-11 (each square being row * BOARD_SIZE + col), the promotion piece
+# in bits 12-13 and the flags in bits 14-15. The low 12 bits alone identify
+# the move, and index tables of per-move data such as history scores.
+FROM_SHIFT = 6
+PROMOTION_SHIFT = 12
+FLAGS_SHIFT = 14
+SQUARE_MASK = 0x3f
+MOVE_MASK = 0xfff
+NUM_MOVE_CODES = MOVE_MASK + 1
+CAPTURE_FLAG = 1
+PROMOTION_FLAG = 2
+# Promotion pieces by their 2-bit code, in lowercase.
+PROMOTION_PIECES = 'nbrq'
+# Type code of an array of encoded moves, 2 bytes each.
+MOVE_ARRAY_TYPE = 'H'
+
+# Square index of every square name, in either case.
+SQUARE_INDEXES = {
+    name: row * BOARD_SIZE + col
+    for name, (row, col) in SQUARE_POSITIONS.items()
+}
+
+# Move of every 12-bit move code, so decoding is a single lookup.
+_SQUARE_POSITIONS = tuple(divmod(square, BOARD_SIZE)
+                          for square in range(BOARD_SIZE * BOARD_SIZE))
+_DECODED_MOVES = tuple((from_position, to_position)
+                       for from_position in _SQUARE_POSITIONS
+                       for to_position in _SQUARE_POSITIONS)
+
+
+class IllegalMoveError(ValueError):
+    """Raised by validate_game() at the first move which cannot be played."""
+    def __init__(self, ply: int, move: str, reason: str) -> None:
+        """Constructs an IllegalMoveError.
+
+        Parameters:
+            ply (int): Number of the offending move, starting at 1.
+            move (str): The move as given.
+            reason (str): Why the move cannot be played.
+
+        Returns:
+            (None)
+        """
+        super().__init__(f'ply {ply} ({move!r}): {reason}')
+        self.ply = ply
+        self.move = move
+        self.reason = reason
+
+
+class GameResult(object):
+    """A class representing the state of a game after a move, as found by
+    check_game_over()."""
+    def __init__(self, status: str, whites_turn: bool,
+                 checking_pieces: List[Position], num_legal_moves: int,
+                 draw_reason: Optional[str] = None) -> None:
+        """Constructs a GameResult.
+
+        Parameters:
+            status (str): One of NORMAL, CHECK, CHECKMATE, STALEMATE or DRAW.
+            whites_turn (bool): True iff it is white's turn.
+            checking_pieces (List[Position]): Positions of the pieces giving
+                check to the player to move.
+            num_legal_moves (int): Number of legal moves of the player to
+                move.
+            draw_reason (Optional[str]): The chess_draws reason when status
+                is DRAW.
+
+        Returns:
+            (None)
+        """
+        self.status = status
+        self.whites_turn = whites_turn
+        self.checking_pieces = checking_pieces
+        self.num_legal_moves = num_legal_moves
+        self.draw_reason = draw_reason
+
+    def is_over(self) -> bool:
+        """(bool) True iff the game has ended."""
+        return self.status in (CHECKMATE, STALEMATE, DRAW)
+
+    def get_message(self) -> Optional[str]:
+        """(Optional[str]) Returns the announcement for a player, or None if
+        there is nothing to announce."""
+        if self.status == DRAW:
+            return f"Draw by {self.draw_reason.replace('-', ' ')}"
+        if self.status == CHECKMATE:
+            return "Checkmate"
+        if self.status == STALEMATE:
+            return "Stalemate"
+        if self.status == CHECK:
+            if self.whites_turn == True:
+                return "White is in check"
+            return "Black is in check"
+        return None
+
+    def __repr__(self) -> str:
+        """(str) Returns representation of GameResult."""
+        return (f'GameResult(status={self.status}, '
+                f'checking_pieces={self.checking_pieces}, '
+                f'num_legal_moves={self.num_legal_moves}, '
+                f'draw_reason={self.draw_reason})')
+
+
 def initial_state() -> Board:
     """Sets initial state of board.
 
@@ -85,6 +207,77 @@ def process_move(user_input: str) -> Move:
 
     return (pos_from, pos_to)
 
+def encode_move(move: Move, promotion: Optional[str] = None,
+                flags: int = 0) -> int:
+    """Encodes a move as a 16-bit integer.
+
+    Parameters:
+        move (Move): A move of the form ((row, col), (row, col)).
+        promotion (Optional[str]): Piece a pawn is promoted to, e.g. 'q'.
+        flags (int): CAPTURE_FLAG, or 0 for a quiet move. PROMOTION_FLAG is
+            added when promotion is given.
+
+    Returns:
+        (int): The encoded move.
+    """
+    code = ((move[0][0] * BOARD_SIZE + move[0][1]) << FROM_SHIFT
+            | move[1][0] * BOARD_SIZE + move[1][1])
+    if promotion is not None:
+        code |= PROMOTION_PIECES.index(promotion.lower()) << PROMOTION_SHIFT
+        flags |= PROMOTION_FLAG
+    return code | flags << FLAGS_SHIFT
+
+def decode_move(code: int) -> Move:
+    """(Move) Returns the from and to positions of an encoded move."""
+    return _DECODED_MOVES[code & MOVE_MASK]
+
+def get_move_flags(code: int) -> int:
+    """(int) Returns the flags of an encoded move."""
+    return code >> FLAGS_SHIFT
+
+def get_move_promotion(code: int) -> Optional[str]:
+    """(Optional[str]) Returns the lowercase piece an encoded move promotes
+    to, or None if it is not a promotion."""
+    if code >> FLAGS_SHIFT & PROMOTION_FLAG == 0:
+        return None
+    return PROMOTION_PIECES[code >> PROMOTION_SHIFT & 0x3]
+
+def encode_move_text(user_input: str) -> Optional[int]:
+    """Encodes a move of the form "letternum letternum" without checking
+    anything but its squares.
+
+    Parameters:
+        user_input (str): A move of the form "letternum letternum".
+
+    Returns:
+        (Optional[int]): The encoded move, without flags, or None if either
+            square is not on the board.
+    """
+    from_square = SQUARE_INDEXES.get(user_input[0:2])
+    to_square = SQUARE_INDEXES.get(user_input[3:5])
+    if from_square is None or to_square is None:
+        return None
+    return from_square << FROM_SHIFT | to_square
+
+def decode_move_text(code: int) -> str:
+    """(str) Returns an encoded move in the form "letternum letternum"."""
+    from_position, to_position = _DECODED_MOVES[code & MOVE_MASK]
+    return (f'{position_to_square(from_position)} '
+            f'{position_to_square(to_position)}')
+
+def encode_moves(moves: Iterable[Move]) -> array:
+    """Encodes many moves compactly, two bytes each.
+
+    Parameters:
+        moves (Iterable[Move]): Moves of the form ((row, col), (row, col)).
+
+    Returns:
+        (array): The encoded moves, without flags, as an array('H').
+    """
+    return array(MOVE_ARRAY_TYPE,
+                 [(move[0][0] * BOARD_SIZE + move[0][1]) << FROM_SHIFT
+                  | move[1][0] * BOARD_SIZE + move[1][1] for move in moves])
+
 def change_position(board: Board, position: Position, character: str) -> Board:
     """Changes original character at position to character.
 
@@ -96,15 +289,10 @@ def change_position(board: Board, position: Position, character: str) -> Board:
     Returns:
         (Board): An updated state of the board with character at position.
     """
-    # Isolates position to be changed on board and substitutes character.
-    row_accessed = list(board[position[0]])
-    row_accessed[position[1]] = character
-    updated_row = ''.join(row_accessed) # joins each element of row_accessed
-
-    # Substitutes updated row containing 'character' for original row.
-    board = list(board)
-    board[position[0]] = updated_row
-    updated_board = tuple(board)
+    # Slices character into the row, leaving the other rows shared.
+    row, col = position
+    updated_row = board[row][:col] + character + board[row][col + 1:]
+    updated_board = board[:row] + (updated_row,) + board[row + 1:]
 
     return updated_board
 
@@ -141,6 +329,102 @@ def update_board(board: Board, move: Move) -> Board:
 
     return updated_board
 
+
+# Undo record: (move, captured piece, previous position of the moved king)
+Undo = Tuple[Move, str, Optional[Position]]
+
+class MutableBoard(object):
+    """A class representing a board which moves are made on in place.
+
+    Rows are lists of characters, so board[row][col] and iterating over rows
+    work as they do for Board, and the move generation functions accept
+    either. make_move() records what it overwrote on an undo stack, which
+    unmake_move() pops to restore the board without allocating a new one.
+    """
+    __slots__ = ('_rows', '_kings', '_undo')
+
+    def __init__(self, board: Board) -> None:
+        """Constructs a MutableBoard holding the same position as board.
+
+        Parameters:
+            board (Board): The current state of the board.
+
+        Returns:
+            (None)
+        """
+        self._rows = [list(row) for row in board]
+        self._kings = {True: _find_piece(get_king(True), board),
+                       False: _find_piece(get_king(False), board)}
+        self._undo = []
+
+    def get_board(self) -> Board:
+        """(Board) Returns the current position as a tuple of row strings."""
+        return tuple(''.join(row) for row in self._rows)
+
+    def get_king_position(self, whites_turn: bool) -> Optional[Position]:
+        """(Optional[Position]) Returns position of a player's king."""
+        return self._kings[whites_turn]
+
+    def make_move(self, move: Move) -> None:
+        """Moves character from initial position to valid position in place.
+
+        Parameters:
+            move (Move): A move of form ((row, col), (row, col)).
+
+        Returns:
+            (None)
+        """
+        (from_row, from_col), (to_row, to_col) = move
+        character = self._rows[from_row][from_col]
+        captured = self._rows[to_row][to_col]
+        previous_king = None
+        if character.lower() == 'k':
+            is_white = character in WHITE_PIECES
+            previous_king = self._kings[is_white]
+            self._kings[is_white] = move[1]
+        if captured.lower() == 'k':
+            self._kings[captured in WHITE_PIECES] = None
+        self._undo.append((move, captured, previous_king))
+        self._rows[to_row][to_col] = character
+        self._rows[from_row][from_col] = EMPTY
+        return None
+
+    def unmake_move(self) -> None:
+        """Takes back the last move made with make_move().
+
+        Returns:
+            (None)
+
+        Raises:
+            IndexError: If there is no move to take back.
+        """
+        ((from_row, from_col), (to_row, to_col)), captured, previous_king = \
+            self._undo.pop()
+        character = self._rows[to_row][to_col]
+        self._rows[from_row][from_col] = character
+        self._rows[to_row][to_col] = captured
+        if previous_king is not None:
+            self._kings[character in WHITE_PIECES] = previous_king
+        if captured.lower() == 'k':
+            self._kings[captured in WHITE_PIECES] = (to_row, to_col)
+        return None
+
+    def __getitem__(self, row: int) -> List[str]:
+        """(List[str]) Returns the characters of row."""
+        return self._rows[row]
+
+    def __iter__(self) -> Iterator[List[str]]:
+        """(Iterator[List[str]]) Iterates over the rows."""
+        return iter(self._rows)
+
+    def __len__(self) -> int:
+        """(int) Returns number of rows."""
+        return len(self._rows)
+
+    def __repr__(self) -> str:
+        """(str) Returns representation of MutableBoard."""
+        return f'MutableBoard({self.get_board()!r})'
+
 def get_current_players_pieces(whites_turn: bool):
     """Determines pieces of player whose turn it is.
 
@@ -225,19 +509,58 @@ def can_piece_perform(move: Move, board: Board, whites_turn: bool) -> bool:
         (bool): True iff move is appropriate for deltas of specified piece at
         specified position.
     """
-    possible_moves = get_possible_moves(move[0], board)
-    for possible_move in possible_moves:
-        if possible_move == move[1]:
+    for target in get_piece_targets(move[0], board):
+        if target == move[1]:
             return True
     return False
 
-def is_move_valid(move: Move, board: Board, whites_turn: bool) -> bool:
+def leaves_king_in_check(move: Move, board: Board, whites_turn: bool,
+                         board_state: Optional['BoardState'] = None) -> bool:
+    """Checks whether a move would leave the player whose turn it is in check,
+    without copying the board.
+
+    Given a chess_state.BoardState, its king squares and attack maps are
+    used, so only the rays move touches are looked at. Otherwise the checks
+    and pins of the king are found from board.
+
+    Parameters:
+        move (Move): A move of format ((row, col), (row, col)).
+        board (Board): The current state of the board.
+        whites_turn (bool): True iff it is white's turn.
+        board_state (Optional[BoardState]): The caller's BoardState, which
+            must hold board, or None.
+
+    Returns:
+        (bool): True iff the player's king is attacked after move.
+    """
+    if board_state is not None:
+        return board_state.leaves_king_in_check(move, whites_turn)
+    king, checks, pins = get_checks_and_pins(board, whites_turn)
+    if king is None:
+        return False
+    if move[0] == king:
+        return is_position_attacked(board, move[1], not whites_turn,
+                                    ignore=king)
+    if len(checks) > 1:
+        return True
+    pin = pins.get(move[0])
+    if pin is not None and move[1] not in pin:
+        return True
+    if len(checks) == 1 and move[1] not in checks[0]:
+        return True
+    return False
+
+def is_move_valid(move: Move, board: Board, whites_turn: bool,
+                  board_state: Optional['BoardState'] = None) -> bool:
     """Checks whether a move is valid based on board and whose turn it is.
 
     Parameters:
         move (Move): A move of format ((row, col), (row, col)).
         board (Board): The current state of the board.
         whites_turn (bool): True iff it is white's turn.
+        board_state (Optional[BoardState]): The caller's BoardState holding
+            board, kept across moves so check is tested incrementally, or
+            None.
 
     Returns:
         (bool): True iff move is valid for given board and player's turn.
@@ -265,9 +588,10 @@ def is_move_valid(move: Move, board: Board, whites_turn: bool) -> bool:
     if can_piece_perform(move, board, whites_turn) == True:
         count += 1
 
-    # Checks that move does not put player whose turn it is in check
-    updated_board = update_board(board, move)
-    if is_in_check(updated_board, whites_turn) == False:
+    # Checks that move does not put player whose turn it is in check, once
+    # the move is otherwise valid so that it can be made on the board
+    if count == 5 and leaves_king_in_check(move, board, whites_turn,
+                                           board_state) == False:
         count += 1
 
     # Checks if all above conditions are met
@@ -276,6 +600,289 @@ def is_move_valid(move: Move, board: Board, whites_turn: bool) -> bool:
     return False
 
 
+def _find_piece(piece: str, board: Board) -> Optional[Position]:
+    """(Optional[Position]) Returns first position of piece, for a Board or
+    a MutableBoard."""
+    for row_index, row in enumerate(board):
+        if piece in row:
+            return row_index, row.index(piece)
+    return None
+
+def get_king(whites_turn: bool) -> str:
+    """Determines king belonging to player whose turn it is.
+
+    Parameters:
+        whites_turn (bool): True iff it is white's turn.
+
+    Returns:
+        (str): The king piece of the player whose turn it is.
+    """
+    if whites_turn == True:
+        return 'K'
+    return 'k'
+
+def is_position_attacked(board: Board, position: Position, by_white: bool,
+                         ignore: Optional[Position] = None) -> bool:
+    """Checks whether any piece of one player attacks position.
+
+    Parameters:
+        board (Board): The current state of the board.
+        position (Position): A position on the board of form (row, col).
+        by_white (bool): True iff the attacking player is white.
+        ignore (Optional[Position]): A position to treat as empty, e.g. the
+            square a king is moving away from.
+
+    Returns:
+        (bool): True iff a piece of the attacking player attacks position.
+    """
+    attackers = get_current_players_pieces(by_white)
+    tables = get_attack_tables()
+    square = position[0] * BOARD_SIZE + position[1]
+
+    # Knights and kings attack a fixed set of squares.
+    for targets, kind in ((tables.knight_targets[square], 'n'),
+                          (tables.king_targets[square], 'k')):
+        for target_row, target_col in targets:
+            character = board[target_row][target_col]
+            if character.lower() == kind and character in attackers:
+                return True
+
+    # Pawns attack diagonally towards the other player, so an attacking pawn
+    # stands where a defending pawn on position would capture.
+    for target_row, target_col in tables.pawn_attacks[not by_white][square]:
+        character = board[target_row][target_col]
+        if character.lower() == 'p' and character in attackers:
+            return True
+
+    # Sliding pieces attack along their rays up to the first piece.
+    for direction, sliders, ray in tables.rays[square]:
+        for target in ray:
+            character = board[target[0]][target[1]]
+            if character != EMPTY and target != ignore:
+                if character.lower() in sliders and character in attackers:
+                    return True
+                break
+    return False
+
+def get_checks_and_pins(board: Board, whites_turn: bool) -> Tuple[
+        Optional[Position], List[Tuple[Position, ...]], Dict[Position,
+        Tuple[Position, ...]]]:
+    """Finds the pieces checking, and the pieces pinned to, the king of the
+    player whose turn it is.
+
+    Parameters:
+        board (Board): The current state of the board, or a MutableBoard.
+        whites_turn (bool): True iff it is white's turn.
+
+    Returns:
+        (Tuple): The king's position, a list with one entry per checking piece
+            holding the positions that capture or block it, and a mapping of
+            pinned piece positions to the positions they may still move to.
+    """
+    if isinstance(board, MutableBoard):
+        king = board.get_king_position(whites_turn)
+    else:
+        king = _find_piece(get_king(whites_turn), board)
+    checks = []
+    pins = {}
+    if king is None:
+        return king, checks, pins
+
+    current_pieces = get_current_players_pieces(whites_turn)
+    other_pieces = get_other_players_pieces(whites_turn)
+    tables = get_attack_tables()
+    square = king[0] * BOARD_SIZE + king[1]
+
+    for target in tables.knight_targets[square]:
+        character = board[target[0]][target[1]]
+        if character.lower() == 'n' and character in other_pieces:
+            checks.append((target,))
+
+    for target in tables.pawn_attacks[whites_turn][square]:
+        character = board[target[0]][target[1]]
+        if character.lower() == 'p' and character in other_pieces:
+            checks.append((target,))
+
+    # Walks each ray out from the king, remembering the first friendly piece
+    # so a slider behind it can be recognised as a pin.
+    for direction, sliders, ray in tables.rays[square]:
+        blocker = None
+        for index, target in enumerate(ray):
+            character = board[target[0]][target[1]]
+            if character in current_pieces:
+                if blocker is not None:
+                    break
+                blocker = target
+            elif character != EMPTY:
+                if character.lower() in sliders:
+                    if blocker is None:
+                        checks.append(ray[:index + 1])
+                    else:
+                        pins[blocker] = ray[:index + 1]
+                break
+
+    return king, checks, pins
+
+def get_piece_targets(position: Position, board: Board) -> Iterator[Position]:
+    """Finds the positions the piece at position can move to by the way that
+    piece moves, using the precomputed attack tables.
+
+    As with get_possible_moves(), whose turn it is and whether the move leaves
+    a king in check are not considered. Positions holding a piece of the same
+    player are never yielded.
+
+    Parameters:
+        position (Position): A position on the board of form (row, col).
+        board (Board): The current state of the board.
+
+    Yields:
+        (Position): Each position the piece can move to.
+    """
+    character = board[position[0]][position[1]]
+    if character == EMPTY:
+        return
+    is_white = character in WHITE_PIECES
+    own_pieces = get_current_players_pieces(is_white)
+    tables = get_attack_tables()
+    square = position[0] * BOARD_SIZE + position[1]
+    kind = character.lower()
+
+    if kind == 'p':
+        # Pawns move forward onto empty squares, and capture diagonally.
+        for target in tables.pawn_pushes[is_white][square]:
+            if board[target[0]][target[1]] != EMPTY:
+                break
+            yield target
+        other_pieces = get_other_players_pieces(is_white)
+        for target in tables.pawn_attacks[is_white][square]:
+            if board[target[0]][target[1]] in other_pieces:
+                yield target
+    elif kind == 'n' or kind == 'k':
+        if kind == 'n':
+            targets = tables.knight_targets[square]
+        else:
+            targets = tables.king_targets[square]
+        for target in targets:
+            if board[target[0]][target[1]] not in own_pieces:
+                yield target
+    else:
+        for direction, sliders, ray in tables.rays[square]:
+            if kind not in sliders:
+                continue
+            for target in ray:
+                target_character = board[target[0]][target[1]]
+                if target_character != EMPTY:
+                    if target_character not in own_pieces:
+                        yield target
+                    break
+                yield target
+
+def _iter_legal_moves(board: Board, whites_turn: bool,
+                      king: Optional[Position],
+                      checks: List[Tuple[Position, ...]],
+                      pins: Dict[Position, Tuple[Position, ...]]
+                      ) -> Iterator[Move]:
+    """(Iterator[Move]) Yields legal moves one at a time, see
+    generate_legal_moves()."""
+    current_pieces = get_current_players_pieces(whites_turn)
+    other_player = not whites_turn
+    double_check = len(checks) > 1
+    if len(checks) == 1:
+        allowed = set(checks[0])
+    else:
+        allowed = None
+
+    for row_index, row in enumerate(board):
+        for col_index, character in enumerate(row):
+            if character not in current_pieces:
+                continue
+            position = (row_index, col_index)
+            is_king = position == king
+            if double_check and not is_king:
+                continue
+            pin = pins.get(position)
+
+            for target in get_piece_targets(position, board):
+                if is_king:
+                    if is_position_attacked(board, target, other_player,
+                                            ignore=king):
+                        continue
+                else:
+                    if pin is not None and target not in pin:
+                        continue
+                    if allowed is not None and target not in allowed:
+                        continue
+                yield (position, target)
+
+def generate_legal_moves(board: Board, whites_turn: bool) -> List[Move]:
+    """Generates every legal move for the player whose turn it is.
+
+    Rather than copying the board and calling is_in_check() for every
+    candidate, the checking pieces and pinned pieces are found once by walking
+    out from the king, and each candidate is then filtered against them.
+
+    Parameters:
+        board (Board): The current state of the board.
+        whites_turn (bool): True iff it is white's turn.
+
+    Returns:
+        (List[Move]): All legal moves of format ((row, col), (row, col)).
+    """
+    king, checks, pins = get_checks_and_pins(board, whites_turn)
+    return list(_iter_legal_moves(board, whites_turn, king, checks, pins))
+
+def generate_legal_move_codes(board: Board, whites_turn: bool) -> array:
+    """Generates every legal move for the player whose turn it is, encoded as
+    by encode_move() with CAPTURE_FLAG set on captures.
+
+    Parameters:
+        board (Board): The current state of the board.
+        whites_turn (bool): True iff it is white's turn.
+
+    Returns:
+        (array): All legal moves as an array('H') of encoded moves.
+    """
+    king, checks, pins = get_checks_and_pins(board, whites_turn)
+    capture = CAPTURE_FLAG << FLAGS_SHIFT
+    codes = array(MOVE_ARRAY_TYPE)
+    for (from_row, from_col), (to_row, to_col) in _iter_legal_moves(
+            board, whites_turn, king, checks, pins):
+        code = ((from_row * BOARD_SIZE + from_col) << FROM_SHIFT
+                | to_row * BOARD_SIZE + to_col)
+        if board[to_row][to_col] != EMPTY:
+            code |= capture
+        codes.append(code)
+    return codes
+
+def perft(board: Board, whites_turn: bool, depth: int) -> int:
+    """Counts the positions reachable from board in exactly depth moves.
+
+    Parameters:
+        board (Board): The current state of the board.
+        whites_turn (bool): True iff it is white's turn.
+        depth (int): Number of moves (plies) to play out.
+
+    Returns:
+        (int): The number of leaf positions at depth.
+    """
+    if depth <= 0:
+        return 1
+    return _perft(MutableBoard(board), whites_turn, depth)
+
+def _perft(board: MutableBoard, whites_turn: bool, depth: int) -> int:
+    """(int) Counts leaf positions for perft(), making and taking back each
+    move on board in place."""
+    moves = generate_legal_moves(board, whites_turn)
+    if depth == 1:
+        return len(moves)
+
+    nodes = 0
+    for move in moves:
+        board.make_move(move)
+        nodes += _perft(board, not whites_turn, depth - 1)
+        board.unmake_move()
+    return nodes
+
 def can_move(board: Board, whites_turn: bool) -> bool:
     """Determines whether the player whose turn it is can (has the ability to)
     move.
@@ -287,35 +894,8 @@ def can_move(board: Board, whites_turn: bool) -> bool:
     Returns:
         (bool): True iff player whose turn it is can move based on board.
     """
-    current_pieces = get_current_players_pieces(whites_turn)
-    piece_locations = ()
-    possible_moves = ()
-    count = 0
-    valid = 0
-
-    # Finds positions of all pieces belonging to player whose turn it is.
-    for piece in current_pieces:
-        piece_locations += (find_piece(piece, board),)
-
-    # Gets all possible moves for each of the players pieces on board.
-    for location in piece_locations:
-        if location != None:
-            moves_to_append = list(get_possible_moves(location, board))
-            # Stores moves valid for piece at location with location.
-            possible_moves += (location, moves_to_append,)
-            possible_moves = list(possible_moves)
-
-    # Checks moves for each of players respective pieces remaining are valid.
-    for moves in possible_moves:
-        count += 1 # ensures moves are selected, not locations.
-        if count % 2 != 0:
-            piece_pos = moves
-        else:
-            # Checks whether for possible moves of each piece, if any are valid.
-            for move in moves:
-                if is_move_valid((piece_pos, move), board, whites_turn) == True:
-                    valid += 1
-    if valid >= 1:
+    king, checks, pins = get_checks_and_pins(board, whites_turn)
+    for move in _iter_legal_moves(board, whites_turn, king, checks, pins):
         return True
     return False
 
@@ -329,37 +909,50 @@ def is_stalemate(board: Board, whites_turn: bool) -> bool:
     Returns:
         (bool): True iff there is a stalemate.
     """
-    if is_in_check(board, whites_turn) == False:
-        if can_move(board, whites_turn) == False:
-            return True
+    king, checks, pins = get_checks_and_pins(board, whites_turn)
+    if len(checks) == 0:
+        for move in _iter_legal_moves(board, whites_turn, king, checks, pins):
+            return False
+        return True
     return False
 
-def check_game_over(board: Board, whites_turn: bool) -> bool:
-    """Checks whether game is over by either checkmate or stalemate.
+def check_game_over(board: Board, whites_turn: bool,
+                    game_state: Optional['GameState'] = None) -> GameResult:
+    """Checks whether game is over by checkmate, stalemate or, when the
+    game's history is given, a draw.
 
     Parameters:
         board (Board): The current state of the board.
         whites_turn (bool): True iff it is white's turn.
+        game_state (Optional[GameState]): The chess_draws state of the game
+            reaching board, used to detect repetition, the fifty-move rule
+            and insufficient material.
 
     Returns:
-        (bool): True iff the game is over.
+        (GameResult): The status of the game, with the pieces giving check
+            and the number of legal moves.
     """
-    if is_in_check(board, whites_turn) == True:
-        if can_move(board, whites_turn) == False:
-            print("\nCheckmate")
-            return True
-        else:
-            if whites_turn == True:
-                print("\nWhite is in check")
-                return False
-            else:
-                print("\nBlack is in check")
-                return False
+    king, checks, pins = get_checks_and_pins(board, whites_turn)
+    # The last position of each check is the checking piece.
+    checking_pieces = [check[-1] for check in checks]
+    num_legal_moves = 0
+    for move in _iter_legal_moves(board, whites_turn, king, checks, pins):
+        num_legal_moves += 1
+
+    # Checkmate and stalemate end the game before any draw is claimed, so a
+    # mate on the ply reaching the fifty-move limit still counts.
+    draw_reason = None
+    if num_legal_moves == 0:
+        status = CHECKMATE if len(checks) > 0 else STALEMATE
     else:
-        if is_stalemate(board, whites_turn) == True:
-            print("\nStalemate")
-            return True
-        return False
+        if game_state is not None:
+            draw_reason = game_state.get_draw_reason()
+        if draw_reason is not None:
+            status = DRAW
+        else:
+            status = CHECK if len(checks) > 0 else NORMAL
+    return GameResult(status, whites_turn, checking_pieces, num_legal_moves,
+                      draw_reason)
 
 def interpret_move(move: Move) -> str:
     """Determines whether user input is a move, request to quit or request
@@ -387,7 +980,9 @@ def interpret_move(move: Move) -> str:
     else:
         return 'MOVE'
 
-def make_a_move(board: Board, move: Move, whites_turn: bool) -> Optional[Board]:
+def make_a_move(board: Board, move: Move, whites_turn: bool,
+                board_state: Optional['BoardState'] = None
+                ) -> Optional[Board]:
     """Updates board with users move after completing validating and
     processing move.
 
@@ -395,13 +990,15 @@ def make_a_move(board: Board, move: Move, whites_turn: bool) -> Optional[Board]:
         board (Board): The current state of the board.
         move (Move): A move of format ((row, col), (row, col)).
         whites_turn (bool): True iff it is white's turn.
+        board_state (Optional[BoardState]): The caller's BoardState holding
+            board, passed on to is_move_valid(), or None.
 
     Returns:
         (Board | False): An updated board state with move implemented.
     """
     if valid_move_format(move) == True:
         move = process_move(move)
-        if is_move_valid(move, board, whites_turn) == True:
+        if is_move_valid(move, board, whites_turn, board_state) == True:
             updated_board = update_board(board, move)
             return updated_board
         else:
@@ -409,6 +1006,98 @@ def make_a_move(board: Board, move: Move, whites_turn: bool) -> Optional[Board]:
     else:
         return False
 
+def position_to_square(position: Position) -> str:
+    """Converts position in (row, col) format to position in square format.
+
+    Parameters:
+        position (Position): A position on the board.
+
+    Returns:
+        (str): A square on the board, e.g. 'e2'.
+    """
+    return 'abcdefgh'[position[1]] + str(BOARD_SIZE - position[0])
+
+def explain_invalid_move(move: Move, board: Board, whites_turn: bool) -> str:
+    """Describes which rule a move which fails is_move_valid() breaks.
+
+    Parameters:
+        move (Move): A move of format ((row, col), (row, col)).
+        board (Board): The current state of the board.
+        whites_turn (bool): True iff it is white's turn.
+
+    Returns:
+        (str): A description of the first broken rule.
+    """
+    from_square = position_to_square(move[0])
+    to_square = position_to_square(move[1])
+    if move[0] == move[1]:
+        return f'{from_square} is both the start and end of the move'
+    character = piece_at_position(move[0], board)
+    if is_current_players_piece(character, whites_turn) == False:
+        return f'no piece belonging to the player to move on {from_square}'
+    if is_move_position_valid(move, board, whites_turn) == False:
+        return f"{to_square} holds the moving player's own piece"
+    if can_piece_perform(move, board, whites_turn) == False:
+        return f'{character} on {from_square} cannot move to {to_square}'
+    return 'move would leave the king in check'
+
+def validate_game(moves: Iterable[str], board: Optional[Board] = None,
+                  whites_turn: bool = True
+                  ) -> Iterator[Tuple[int, Board, str]]:
+    """Parses, validates and plays a sequence of moves in one pass.
+
+    Moves are consumed lazily, so a long game can be streamed from a file.
+    Each position's legal moves are generated once, both to validate the
+    move played from it and to decide whether the game is over.
+
+    Parameters:
+        moves (Iterable[str]): Moves of the form "letternum letternum".
+        board (Optional[Board]): Position to start from, initial_state() if
+            not given.
+        whites_turn (bool): True iff white moves first.
+
+    Yields:
+        (Tuple[int, Board, str]): Ply number starting at 1, board after the
+            move and one of NORMAL, CHECK, CHECKMATE or STALEMATE.
+
+    Raises:
+        IllegalMoveError: At the first move which is badly formatted, not
+            valid, or played after the game has ended.
+    """
+    if board is None:
+        board = initial_state()
+    king, checks, pins = get_checks_and_pins(board, whites_turn)
+    legal_moves = set(_iter_legal_moves(board, whites_turn, king, checks,
+                                        pins))
+    ply = 0
+
+    for text in moves:
+        ply += 1
+        if len(legal_moves) == 0:
+            raise IllegalMoveError(ply, text, 'game is already over')
+        code = encode_move_text(text)
+        if code is None or valid_move_format(text) == False:
+            raise IllegalMoveError(ply, text, 'invalid move format')
+
+        # The decoded move is shared, so is hashed without being rebuilt.
+        move = _DECODED_MOVES[code]
+        if move not in legal_moves:
+            raise IllegalMoveError(ply, text,
+                                   explain_invalid_move(move, board,
+                                                        whites_turn))
+
+        board = update_board(board, move)
+        whites_turn = not whites_turn
+        king, checks, pins = get_checks_and_pins(board, whites_turn)
+        legal_moves = set(_iter_legal_moves(board, whites_turn, king, checks,
+                                            pins))
+
+        if len(legal_moves) == 0:
+            status = CHECKMATE if len(checks) > 0 else STALEMATE
+        else:
+            status = CHECK if len(checks) > 0 else NORMAL
+        yield ply, board, status
+
 def change_turn(whites_turn: bool) -> bool:
     """Changes whose turn it is.
 
@@ -427,41 +1116,94 @@ def change_turn(whites_turn: bool) -> bool:
 
 def main():
     """Entry point to gameplay"""
+    # Imported here, as chess_draws and chess_state themselves import this
+    # module.
+    from chess_draws import GameState
+    from chess_state import BoardState
+    # Imported here, as only the command line turns on profiling.
+    from chess_profile import (format_snapshot, get_profile_setting,
+                               get_profiler)
+
+    parser = argparse.ArgumentParser(description='Play chess.')
+    parser.add_argument('--profile', action='store_true',
+                        help='count calls to, and time in, each stage of '
+                             'move validation, printed after every move')
+    parser.add_argument('--flamegraph', metavar='FILE',
+                        help='write time in each stack of stages to FILE as '
+                             'collapsed stacks when the game ends; implies '
+                             '--profile')
+    args = parser.parse_args()
+
+    profile, flamegraph = get_profile_setting()
+    if args.flamegraph is not None:
+        flamegraph = args.flamegraph
+    profiler = None
+    if profile == True or args.profile == True or flamegraph is not None:
+        profiler = get_profiler()
+        profiler.enable()
+    previous_snapshot = {}
+
     board = initial_state()
     print_board(board)
 
     whites_turn = True
+    game_state = GameState(board, whites_turn)
+    # Follows the game, so each move is tested for check incrementally.
+    board_state = BoardState(board)
 
-    while True:
-        # Gets move input from user.
-        if whites_turn == True:
-            move = str(input("\nWhite's move: "))
-        else:
-            move = str(input("\nBlack's move: "))
-
-        # Determines whether move is help, quit or move.
-        if interpret_move(move) == 'HELP':
-            print(HELP_MESSAGE)
-            print_board(board)
-        elif interpret_move(move) == 'QUIT':
-            quit_confirm = input("Are you sure you want to quit? ")
-            if quit_confirm == 'y' or quit_confirm == 'Y':
-                break
-            else:
-                print_board(board)
-        else:
-            # Validates move.
-            test_board = make_a_move(board, move, whites_turn)
-            if test_board == False:
-                print("Invalid move\n")
-                print_board(board)
+    try:
+        while True:
+            # Gets move input from user.
+            if whites_turn == True:
+                move = str(input("\nWhite's move: "))
             else:
-                # Completes move.
-                board = test_board
+                move = str(input("\nBlack's move: "))
+
+            # Determines whether move is help, quit or move.
+            if interpret_move(move) == 'HELP':
+                print(HELP_MESSAGE)
                 print_board(board)
-                whites_turn = change_turn(whites_turn)
-                if check_game_over(board, whites_turn) == True:
+            elif interpret_move(move) == 'QUIT':
+                quit_confirm = input("Are you sure you want to quit? ")
+                if quit_confirm == 'y' or quit_confirm == 'Y':
                     break
+                else:
+                    print_board(board)
+            else:
+                # Validates move.
+                test_board = make_a_move(board, move, whites_turn,
+                                         board_state)
+                if test_board == False:
+                    print("Invalid move\n")
+                    print_board(board)
+                else:
+                    # Completes move.
+                    game_state.update(board, process_move(move))
+                    board_state.make_move(process_move(move))
+                    board = test_board
+                    print_board(board)
+                    whites_turn = change_turn(whites_turn)
+                    result = check_game_over(board, whites_turn, game_state)
+                    if result.get_message() is not None:
+                        print("\n" + result.get_message())
+                    if result.is_over() == True:
+                        break
+
+                # Reports the work done for this move alone.
+                if profiler is not None:
+                    snapshot = profiler.snapshot()
+                    for line in format_snapshot(snapshot, previous_snapshot):
+                        print(f"  {line}")
+                    previous_snapshot = snapshot
+    finally:
+        if profiler is not None:
+            print("\nProfile of the whole game:")
+            for line in format_snapshot(profiler.snapshot()):
+                print(f"  {line}")
+            if flamegraph is not None:
+                profiler.write_collapsed(flamegraph)
+                print(f"Collapsed stacks written to {flamegraph}")
+            profiler.disable()
 
 if __name__ == "__main__":
     main()
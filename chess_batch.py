@@ -0,0 +1,472 @@
+"""
+Chess Batch Evaluation
+Scores many positions at once with NumPy. Boards are packed into an (N, 64)
+array of piece codes, or (N, 12, 64) planes with one plane per piece, and
+material, piece-square and mobility scores are computed for every position
+with array operations rather than a Python loop per square.
+
+evaluate_boards() gives the same scores as chess_search.evaluate(). Mobility
+counts the squares each knight, bishop, rook and queen could move to, as
+get_piece_targets() does, without checking whether the king is left in check.
+
+Requires NumPy.
+
+The benchmark exits with a non-zero status unless the batch gives the same
+scores and reaches TARGET_SPEEDUP over one position at a time, packing
+included.
+
+Usage:
+    python chess_batch.py [--positions N] [--seed N] [--repeats N]
+"""
+
+import argparse
+import random
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from a1_support import *
+from chess import (generate_legal_moves, get_piece_targets, initial_state,
+                   update_board)
+from chess_search import PIECE_SQUARE_TABLES, PIECE_VALUES, evaluate
+from chess_tables import (DIAGONAL_DIRECTIONS, KNIGHT_DELTAS, NUM_SQUARES,
+                          ORTHOGONAL_DIRECTIONS)
+
+__author__ = "Harold Shaw, 47020665"
+__email__ = "s4702066@student.uq.edu.au"
+
+# Pieces in plane order. Piece codes are 1 + the index here, 0 being EMPTY.
+PIECE_ORDER = 'PNBRQKpnbrqk'
+NUM_CODES = len(PIECE_ORDER) + 1
+
+# XORing a square with this flips its row, as from white's side to black's.
+MIRROR = NUM_SQUARES - BOARD_SIZE
+
+# Squares are scored two at a time, the pair of codes read as one 16-bit
+# number indexing a table of both squares' scores. Codes are below 16, so
+# each pair's table needs 1 << 12 entries.
+NUM_PAIRS = NUM_SQUARES // 2
+PAIR_TABLE_SIZE = 1 << 12
+
+# Pieces in each bitboard made by pack_bitboards(): each player's pieces,
+# knights, pieces moving along rows and columns, and along diagonals.
+BITBOARD_PIECES = ('PNBRQK', 'pnbrqk', 'N', 'n', 'RQ', 'rq', 'BQ', 'bq')
+
+# Positions worked on at a time, keeping intermediate arrays in cache.
+EVALUATION_CHUNK = 1024
+MOBILITY_CHUNK = 4096
+
+DEFAULT_BENCHMARK_POSITIONS = 20000
+# Longest random game played to collect benchmark positions.
+RANDOM_GAME_PLIES = 200
+BENCHMARK_REPEATS = 3
+# Speedup of the batch over one position at a time, packing included, which
+# the benchmark checks for.
+TARGET_SPEEDUP = 50
+
+
+def _build_score_tables() -> np.ndarray:
+    """Builds the score of each piece code on each square.
+
+    Returns:
+        (np.ndarray): (2, NUM_CODES, 64) material then piece-square scores,
+            positive for white's pieces and negative for black's.
+    """
+    tables = np.zeros((2, NUM_CODES, NUM_SQUARES), dtype=np.int32)
+    for index, piece in enumerate(PIECE_ORDER):
+        kind = piece.lower()
+        sign = 1 if piece in WHITE_PIECES else -1
+        mirror = 0 if piece in WHITE_PIECES else MIRROR
+        for square in range(NUM_SQUARES):
+            tables[0, index + 1, square] = sign * PIECE_VALUES[kind]
+            tables[1, index + 1, square] = \
+                sign * PIECE_SQUARE_TABLES[kind][square ^ mirror]
+    return tables
+
+def _build_pair_table(table: np.ndarray) -> np.ndarray:
+    """Combines the scores of each pair of neighbouring squares.
+
+    Parameters:
+        table (np.ndarray): (NUM_CODES, 64) score of each code on each square.
+
+    Returns:
+        (np.ndarray): Flat NUM_PAIRS * PAIR_TABLE_SIZE scores, entry
+            pair << 12 | second code << 8 | first code being the score of the
+            pair of squares 2 * pair and 2 * pair + 1.
+    """
+    codes = np.arange(NUM_CODES)
+    pair_table = np.zeros((NUM_PAIRS, PAIR_TABLE_SIZE), dtype=np.int32)
+    pair_table[:, codes[:, np.newaxis] | codes[np.newaxis, :] << 8] = \
+        table[:, 0::2].T[:, :, np.newaxis] + table[:, 1::2].T[:, np.newaxis, :]
+    return pair_table.ravel()
+
+def _build_feature_lookup() -> np.ndarray:
+    """(np.ndarray) Returns byte of each piece code with bit i set iff the
+    piece is in BITBOARD_PIECES[i]."""
+    lookup = np.zeros(NUM_CODES, dtype=np.uint8)
+    for index, piece in enumerate(PIECE_ORDER):
+        for bit, pieces in enumerate(BITBOARD_PIECES):
+            if piece in pieces:
+                lookup[index + 1] |= 1 << bit
+    return lookup
+
+# Shift of every bit of a bitboard by one delta: the ufunc moving bits the
+# right way, how far, and the squares which can be landed on without wrapping
+# around the board.
+Shift = Tuple[np.ufunc, np.uint64, np.uint64]
+
+def _build_shifts(deltas: Sequence[Tuple[int, int]]) -> Tuple[Shift, ...]:
+    """Builds what is needed to move every bit of a bitboard by each delta.
+
+    Parameters:
+        deltas (Sequence[Tuple[int, int]]): (row, col) steps.
+
+    Returns:
+        (Tuple[Shift, ...]): Shift for each delta.
+    """
+    shifts = []
+    for d_row, d_col in deltas:
+        shift = d_row * BOARD_SIZE + d_col
+        mask = 0
+        for square in range(NUM_SQUARES):
+            if 0 <= square % BOARD_SIZE - d_col < BOARD_SIZE:
+                mask |= 1 << square
+        shifter = np.left_shift if shift > 0 else np.right_shift
+        shifts.append((shifter, np.uint64(abs(shift)), np.uint64(mask)))
+    return tuple(shifts)
+
+CODE_LOOKUP = np.zeros(256, dtype=np.uint8)
+for _index, _piece in enumerate(PIECE_ORDER):
+    CODE_LOOKUP[ord(_piece)] = _index + 1
+CODE_TRANSLATION = bytes(CODE_LOOKUP)
+
+MATERIAL_TABLE, PIECE_SQUARE_TABLE = _build_score_tables()
+EVALUATION_TABLE = MATERIAL_TABLE + PIECE_SQUARE_TABLE
+MATERIAL_PAIRS = _build_pair_table(MATERIAL_TABLE)
+PIECE_SQUARE_PAIRS = _build_pair_table(PIECE_SQUARE_TABLE)
+EVALUATION_PAIRS = _build_pair_table(EVALUATION_TABLE)
+PAIR_OFFSETS = np.arange(NUM_PAIRS, dtype=np.intp) << 12
+
+FEATURE_LOOKUP = _build_feature_lookup()
+FEATURE_TRANSLATION = bytes(FEATURE_LOOKUP) + bytes(256 - NUM_CODES)
+KNIGHT_SHIFTS = _build_shifts(KNIGHT_DELTAS)
+# Sliders along the first four directions use the rook bitboards, and along
+# the last four the bishop bitboards.
+SLIDER_DIRECTIONS = ORTHOGONAL_DIRECTIONS + DIAGONAL_DIRECTIONS
+SLIDER_SHIFTS = _build_shifts(SLIDER_DIRECTIONS)
+
+if hasattr(np, 'bitwise_count'):
+    _popcount = np.bitwise_count
+else:
+    _BYTE_COUNTS = np.array([bin(byte).count('1') for byte in range(256)],
+                            dtype=np.uint8)
+
+    def _popcount(bitboards: np.ndarray) -> np.ndarray:
+        """(np.ndarray) Returns number of bits set in each bitboard."""
+        counts = _BYTE_COUNTS[bitboards.view(np.uint8)]
+        return counts.reshape(bitboards.shape + (8,)).sum(axis=-1)
+
+
+def pack_boards(boards: Sequence[Board]) -> np.ndarray:
+    """Packs boards into an array of piece codes.
+
+    Parameters:
+        boards (Sequence[Board]): The positions.
+
+    Returns:
+        (np.ndarray): (N, 64) uint8 piece codes, squares ordered as in
+            chess_bitboard with a8 first.
+    """
+    data = ''.join(map(''.join, boards)).encode('ascii')
+    codes = np.frombuffer(bytearray(data.translate(CODE_TRANSLATION)),
+                          dtype=np.uint8)
+    return codes.reshape(len(boards), NUM_SQUARES)
+
+def to_planes(codes: np.ndarray) -> np.ndarray:
+    """Expands piece codes into one plane per piece.
+
+    Parameters:
+        codes (np.ndarray): (N, 64) piece codes from pack_boards().
+
+    Returns:
+        (np.ndarray): (N, 12, 64) bool, plane i marking squares holding
+            PIECE_ORDER[i].
+    """
+    pieces = np.arange(1, NUM_CODES, dtype=np.uint8)
+    return codes[:, np.newaxis, :] == pieces[np.newaxis, :, np.newaxis]
+
+def pack_bitboards(codes: np.ndarray) -> np.ndarray:
+    """Packs piece codes into one bitboard per entry of BITBOARD_PIECES.
+
+    Each square's bits of BITBOARD_PIECES are looked up as one byte, so a row
+    of the board is a 64-bit word of 8 bytes by 8 bits. Transposing that as
+    an 8x8 bit matrix leaves a byte per bitboard holding the row's squares.
+
+    Parameters:
+        codes (np.ndarray): (N, 64) piece codes from pack_boards().
+
+    Returns:
+        (np.ndarray): (8, N) uint64, bit square of row i set iff that square
+            holds a piece in BITBOARD_PIECES[i].
+    """
+    # bytes.translate() looks up every square several times faster than
+    # indexing FEATURE_LOOKUP with the array.
+    features = np.ascontiguousarray(codes, dtype=np.uint8).tobytes()
+    rows = np.frombuffer(features.translate(FEATURE_TRANSLATION),
+                         dtype='<u8').astype(np.uint64)
+    for shift, mask in ((7, 0x00AA00AA00AA00AA), (14, 0x0000CCCC0000CCCC),
+                        (28, 0x00000000F0F0F0F0)):
+        swap = (rows ^ (rows >> np.uint64(shift))) & np.uint64(mask)
+        rows ^= swap ^ (swap << np.uint64(shift))
+    row_bytes = rows.astype('<u8', copy=False).view(np.uint8).reshape(
+        len(codes), BOARD_SIZE, 8)
+    bitboards = np.ascontiguousarray(row_bytes.transpose(2, 0, 1))
+    return bitboards.reshape(8, -1).view('<u8').astype(np.uint64, copy=False)
+
+def _sum_pairs(pair_table: np.ndarray, codes: np.ndarray) -> np.ndarray:
+    """(np.ndarray) Returns (N,) sum over squares of the scores in a table
+    from _build_pair_table()."""
+    pairs = np.ascontiguousarray(codes, dtype=np.uint8).view('<u2')
+    scores = np.empty(len(codes), dtype=np.int64)
+    for start in range(0, len(codes), EVALUATION_CHUNK):
+        index = np.bitwise_or(pairs[start:start + EVALUATION_CHUNK],
+                              PAIR_OFFSETS, dtype=np.intp)
+        scores[start:start + EVALUATION_CHUNK] = \
+            pair_table.take(index).sum(axis=1)
+    return scores
+
+def material_scores(codes: np.ndarray) -> np.ndarray:
+    """(np.ndarray) Returns (N,) material balance of each position in
+    centipawns, positive when white is ahead."""
+    return _sum_pairs(MATERIAL_PAIRS, codes)
+
+def piece_square_scores(codes: np.ndarray) -> np.ndarray:
+    """(np.ndarray) Returns (N,) piece-square balance of each position in
+    centipawns, positive when white is better placed."""
+    return _sum_pairs(PIECE_SQUARE_PAIRS, codes)
+
+def evaluate_codes(codes: np.ndarray) -> np.ndarray:
+    """(np.ndarray) Returns (N,) chess_search.evaluate() score of each
+    position of piece codes."""
+    return _sum_pairs(EVALUATION_PAIRS, codes)
+
+def evaluate_planes(planes: np.ndarray) -> np.ndarray:
+    """(np.ndarray) Returns (N,) chess_search.evaluate() score of each
+    position of (N, 12, 64) piece planes."""
+    return np.tensordot(planes.astype(np.int32), EVALUATION_TABLE[1:],
+                        axes=([1, 2], [0, 1]))
+
+def evaluate_boards(boards: Sequence[Board]) -> np.ndarray:
+    """Scores positions by material and piece placement, as
+    chess_search.evaluate() scores one.
+
+    Parameters:
+        boards (Sequence[Board]): The positions.
+
+    Returns:
+        (np.ndarray): (N,) scores in centipawns, positive when white is
+            better.
+    """
+    return evaluate_codes(pack_boards(boards))
+
+def mobility_scores(codes: np.ndarray) -> np.ndarray:
+    """Counts the moves of each player's knights, bishops, rooks and queens.
+
+    Moves along each direction are found for all sliders at once by a
+    Kogge-Stone fill through empty squares. Sliders of one player never
+    reach the same square along the same direction, as the nearer one blocks
+    the other, so counting the bits of each fill counts every move. Each
+    delta is worked on in turn, into preallocated arrays, so one chunk's
+    intermediate bitboards stay in cache.
+
+    Parameters:
+        codes (np.ndarray): (N, 64) piece codes from pack_boards().
+
+    Returns:
+        (np.ndarray): (N,) white's moves less black's moves.
+    """
+    scores = np.empty(len(codes), dtype=np.int64)
+    num_orthogonal = len(ORTHOGONAL_DIRECTIONS)
+    for start in range(0, len(codes), MOBILITY_CHUNK):
+        bitboards = pack_bitboards(codes[start:start + MOBILITY_CHUNK])
+        # Axes are (player, position).
+        not_own = ~bitboards[0:2]
+        empty = ~(bitboards[0] | bitboards[1])
+        counts = np.zeros(not_own.shape, dtype=np.int64)
+        moves = np.empty_like(not_own)
+        sliders = np.empty_like(not_own)
+        open_squares = np.empty_like(empty)
+        shifted = np.empty_like(empty)
+
+        # Knights jump, so one knight's moves are a shift of its square.
+        for shifter, amount, mask in KNIGHT_SHIFTS:
+            shifter(bitboards[2:4], amount, out=moves)
+            moves &= not_own
+            moves &= mask
+            counts += _popcount(moves)
+
+        for index, (shifter, amount, mask) in enumerate(SLIDER_SHIFTS):
+            if index < num_orthogonal:
+                np.copyto(sliders, bitboards[4:6])
+            else:
+                np.copyto(sliders, bitboards[6:8])
+            np.bitwise_and(empty, mask, out=open_squares)
+            for times in (1, 2, 4):
+                shifter(sliders, amount * np.uint64(times), out=moves)
+                moves &= open_squares
+                sliders |= moves
+                if times < 4:
+                    shifter(open_squares, amount * np.uint64(times),
+                            out=shifted)
+                    open_squares &= shifted
+            shifter(sliders, amount, out=moves)
+            moves &= not_own
+            moves &= mask
+            counts += _popcount(moves)
+        scores[start:start + MOBILITY_CHUNK] = counts[0] - counts[1]
+    return scores
+
+def mobility(board: Board) -> int:
+    """Counts the moves of each player's knights, bishops, rooks and queens
+    one square at a time, as mobility_scores() does for many positions.
+
+    Parameters:
+        board (Board): The current state of the board.
+
+    Returns:
+        (int): White's moves less black's moves.
+    """
+    score = 0
+    for row_index, row in enumerate(board):
+        for col_index, character in enumerate(row):
+            if character == EMPTY or character.lower() not in 'nbrq':
+                continue
+            moves = sum(1 for target in get_piece_targets(
+                (row_index, col_index), board))
+            score += moves if character in WHITE_PIECES else -moves
+    return score
+
+
+def random_positions(count: int, seed: int = 0) -> List[Board]:
+    """Collects positions from games of random legal moves.
+
+    Parameters:
+        count (int): Number of positions to collect.
+        seed (int): Seed for the moves chosen.
+
+    Returns:
+        (List[Board]): The positions, in the order they were reached.
+    """
+    generator = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        board = initial_state()
+        whites_turn = True
+        for ply in range(RANDOM_GAME_PLIES):
+            moves = generate_legal_moves(board, whites_turn)
+            if len(moves) == 0 or len(positions) == count:
+                break
+            board = update_board(board, generator.choice(moves))
+            whites_turn = not whites_turn
+            positions.append(board)
+    return positions
+
+def _best_time(function: Callable[[], object],
+               repeats: int = BENCHMARK_REPEATS) -> Tuple[object, float]:
+    """(Tuple[object, float]) Returns the result of calling function and the
+    shortest time in seconds a call took."""
+    best = float('inf')
+    for repeat in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+def _report(name: str, count: int, single: float, batch: float,
+            matches: bool) -> None:
+    """(None) Prints the rates of scoring one position at a time and in a
+    batch."""
+    print(f'{name}: {count / single:.0f}/s one at a time, '
+          f'{count / batch:.0f}/s batched, {single / batch:.0f}x'
+          + ('' if matches else ', NOT MATCHING'))
+
+def benchmark(count: int = DEFAULT_BENCHMARK_POSITIONS, seed: int = 0,
+              repeats: int = BENCHMARK_REPEATS) -> Dict[str, float]:
+    """Times scoring random positions one at a time against in a batch,
+    printing the rate of each.
+
+    Parameters:
+        count (int): Number of positions to score.
+        seed (int): Seed for the random games played.
+        repeats (int): Runs of each stage, the fastest being kept.
+
+    Returns:
+        (Dict[str, float]): Speedup of the batch over one position at a time
+            for 'evaluate', 'mobility' and 'total', packing included in
+            'total'. 'matches' is 1.0 iff the batch gave the same scores.
+    """
+    boards = random_positions(count, seed)
+    count = len(boards)
+    print(f'{count} positions, best of {repeats} runs')
+
+    expected_scores, evaluate_time = _best_time(
+        lambda: [evaluate(board) for board in boards], repeats)
+    expected_mobility, mobility_time = _best_time(
+        lambda: [mobility(board) for board in boards], repeats)
+    codes, pack_time = _best_time(lambda: pack_boards(boards), repeats)
+    scores, batch_evaluate_time = _best_time(lambda: evaluate_codes(codes),
+                                             repeats)
+    mobilities, batch_mobility_time = _best_time(
+        lambda: mobility_scores(codes), repeats)
+    matches = (np.array_equal(scores, expected_scores)
+               and np.array_equal(mobilities, expected_mobility))
+
+    print(f'packing: {count / pack_time:.0f}/s')
+    _report('evaluate', count, evaluate_time, batch_evaluate_time,
+            np.array_equal(scores, expected_scores))
+    _report('mobility', count, mobility_time, batch_mobility_time,
+            np.array_equal(mobilities, expected_mobility))
+    _report('both, packing included', count, evaluate_time + mobility_time,
+            pack_time + batch_evaluate_time + batch_mobility_time, matches)
+    return {
+        'evaluate': evaluate_time / batch_evaluate_time,
+        'mobility': mobility_time / batch_mobility_time,
+        'total': ((evaluate_time + mobility_time)
+                  / (pack_time + batch_evaluate_time + batch_mobility_time)),
+        'matches': float(matches),
+    }
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Entry point to the batch evaluation benchmark.
+
+    Parameters:
+        argv (List[str]): Command line arguments, excluding program name.
+
+    Returns:
+        (int): Exit status, 0 iff the batch scores matched and reached
+            TARGET_SPEEDUP, packing included.
+    """
+    parser = argparse.ArgumentParser(description='Compare batch evaluation '
+                                                 'with one position at a '
+                                                 'time.')
+    parser.add_argument('--positions', type=int,
+                        default=DEFAULT_BENCHMARK_POSITIONS,
+                        help='positions to score (default '
+                             f'{DEFAULT_BENCHMARK_POSITIONS})')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed for the random games played')
+    parser.add_argument('--repeats', type=int, default=BENCHMARK_REPEATS,
+                        help='runs of each stage, the fastest kept (default '
+                             f'{BENCHMARK_REPEATS})')
+    args = parser.parse_args(argv)
+
+    speedups = benchmark(args.positions, args.seed, args.repeats)
+    reached = speedups['total'] >= TARGET_SPEEDUP
+    print(f'target {TARGET_SPEEDUP}x, packing included: '
+          + ('reached' if reached else 'MISSED'))
+    return 0 if reached and speedups['matches'] == 1.0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,366 @@
+"""
+Chess Bitboards
+Alternative board representation for the chess game, storing one 64-bit
+integer per piece kind rather than a tuple of row strings.
+"""
+
+from typing import List, Optional, Tuple
+
+from a1_support import *
+from chess_tables import get_attack_tables
+
+__author__ = "Harold Shaw, 47020665"
+__email__ = "s4702066@student.uq.edu.au"
+
+# Piece kinds in bitboard order: white pieces followed by black pieces.
+PIECE_KINDS = tuple(WHITE_PIECES) + tuple(BLACK_PIECES)
+PIECE_INDEX = {piece: index for index, piece in enumerate(PIECE_KINDS)}
+NUM_WHITE_KINDS = len(tuple(WHITE_PIECES))
+NO_PIECE = -1
+
+NUM_SQUARES = BOARD_SIZE * BOARD_SIZE
+FULL_MASK = (1 << NUM_SQUARES) - 1
+
+# Undo record: (from square, to square, moved piece, captured piece)
+Undo = Tuple[int, int, int, int]
+
+def position_to_square(position: Position) -> int:
+    """Converts position in (row, col) format to a square index.
+
+    Parameters:
+        position (Position): A position on the board.
+
+    Returns:
+        (int): Square index in range 0-63, counting along rows from a8.
+    """
+    return position[0] * BOARD_SIZE + position[1]
+
+def square_to_position(square: int) -> Position:
+    """Converts a square index to position in (row, col) format.
+
+    Parameters:
+        square (int): Square index in range 0-63.
+
+    Returns:
+        (Position): A position on the board.
+    """
+    return divmod(square, BOARD_SIZE)
+
+
+class BitBoard(object):
+    """A class representing a chess board as a set of bitboards.
+
+    Each piece kind has its own 64-bit integer with bit n set iff that piece
+    occupies square n. A square-to-piece lookup list is kept alongside the
+    bitboards so that make_move() and unmake_move() never need to search.
+    """
+    __slots__ = ('_pieces', '_white', '_black', '_squares', '_history')
+
+    def __init__(self) -> None:
+        """Constructs an empty BitBoard.
+
+        Returns:
+            (None)
+        """
+        self._pieces = [0] * len(PIECE_KINDS)
+        self._white = 0
+        self._black = 0
+        self._squares = [NO_PIECE] * NUM_SQUARES
+        self._history = []
+
+    def get_pieces(self, piece: str) -> int:
+        """Returns bitboard of all squares occupied by piece.
+
+        Parameters:
+            piece (str): A piece character, e.g. 'K' or 'p'.
+
+        Returns:
+            (int): Bitboard of squares holding piece.
+        """
+        return self._pieces[PIECE_INDEX[piece]]
+
+    def get_white(self) -> int:
+        """(int) Returns occupancy bitboard of white pieces."""
+        return self._white
+
+    def get_black(self) -> int:
+        """(int) Returns occupancy bitboard of black pieces."""
+        return self._black
+
+    def get_occupied(self) -> int:
+        """(int) Returns occupancy bitboard of all pieces."""
+        return self._white | self._black
+
+    def get_empty(self) -> int:
+        """(int) Returns bitboard of all empty squares."""
+        return ~(self._white | self._black) & FULL_MASK
+
+    def piece_at_square(self, square: int) -> str:
+        """Returns the piece at square, or EMPTY.
+
+        Parameters:
+            square (int): Square index in range 0-63.
+
+        Returns:
+            (str): The piece character at square.
+        """
+        index = self._squares[square]
+        if index == NO_PIECE:
+            return EMPTY
+        return PIECE_KINDS[index]
+
+    def place_piece(self, square: int, piece: str) -> None:
+        """Puts piece on an empty square.
+
+        Parameters:
+            square (int): Square index in range 0-63.
+            piece (str): A piece character.
+
+        Returns:
+            (None)
+        """
+        self._add(square, PIECE_INDEX[piece])
+        return None
+
+    def _add(self, square: int, index: int) -> None:
+        """(None) Sets bits for piece index at square."""
+        bit = 1 << square
+        self._pieces[index] |= bit
+        if index < NUM_WHITE_KINDS:
+            self._white |= bit
+        else:
+            self._black |= bit
+        self._squares[square] = index
+
+    def _remove(self, square: int, index: int) -> None:
+        """(None) Clears bits for piece index at square."""
+        bit = 1 << square
+        self._pieces[index] ^= bit
+        if index < NUM_WHITE_KINDS:
+            self._white ^= bit
+        else:
+            self._black ^= bit
+        self._squares[square] = NO_PIECE
+
+    def make_move(self, move: Move) -> None:
+        """Moves piece in place, recording enough to undo the move.
+
+        Parameters:
+            move (Move): A move of form ((row, col), (row, col)).
+
+        Returns:
+            (None)
+        """
+        from_square = position_to_square(move[0])
+        to_square = position_to_square(move[1])
+        moved = self._squares[from_square]
+        captured = self._squares[to_square]
+
+        if captured != NO_PIECE:
+            self._remove(to_square, captured)
+        self._remove(from_square, moved)
+        self._add(to_square, moved)
+
+        self._history.append((from_square, to_square, moved, captured))
+        return None
+
+    def unmake_move(self) -> None:
+        """Reverts the most recent make_move() in place.
+
+        Returns:
+            (None)
+        """
+        from_square, to_square, moved, captured = self._history.pop()
+
+        self._remove(to_square, moved)
+        self._add(from_square, moved)
+        if captured != NO_PIECE:
+            self._add(to_square, captured)
+        return None
+
+    def copy(self) -> 'BitBoard':
+        """(BitBoard) Returns an independent copy without move history."""
+        bitboard = BitBoard.__new__(BitBoard)
+        bitboard._pieces = self._pieces[:]
+        bitboard._white = self._white
+        bitboard._black = self._black
+        bitboard._squares = self._squares[:]
+        bitboard._history = []
+        return bitboard
+
+    def __eq__(self, other: object) -> bool:
+        """(bool) True iff other holds the same pieces on the same squares."""
+        if not isinstance(other, BitBoard):
+            return NotImplemented
+        return self._pieces == other._pieces
+
+    def __hash__(self) -> int:
+        """(int) Returns hash of piece placement."""
+        return hash(tuple(self._pieces))
+
+    def __repr__(self) -> str:
+        """(str) Returns representation of BitBoard."""
+        return f'BitBoard({to_board(self)!r})'
+
+
+def from_board(board: Board) -> BitBoard:
+    """Converts a tuple-of-strings Board into a BitBoard.
+
+    Parameters:
+        board (Board): The current state of the board.
+
+    Returns:
+        (BitBoard): The same position as a BitBoard.
+    """
+    bitboard = BitBoard()
+    square = 0
+    for row in board:
+        for character in row:
+            if character != EMPTY:
+                bitboard.place_piece(square, character)
+            square += 1
+    return bitboard
+
+def to_board(bitboard: BitBoard) -> Board:
+    """Converts a BitBoard into a tuple-of-strings Board.
+
+    Parameters:
+        bitboard (BitBoard): A position stored as bitboards.
+
+    Returns:
+        (Board): The same position as a tuple of row strings.
+    """
+    characters = [bitboard.piece_at_square(square)
+                  for square in range(NUM_SQUARES)]
+    rows = []
+    for start in range(0, NUM_SQUARES, BOARD_SIZE):
+        rows.append(''.join(characters[start:start + BOARD_SIZE]))
+    return tuple(rows)
+
+def initial_state() -> BitBoard:
+    """Sets initial state of board.
+
+    Returns:
+        (BitBoard): each piece is in starting position.
+    """
+    row_b1 = "rnbqkbnr"
+    row_b2 = "pppppppp"
+    row_w1 = row_b1.upper()
+    row_w2 = row_b2.upper()
+    row_emp = 8 * EMPTY
+
+    return from_board((row_b1, row_b2, row_emp, row_emp,
+                       row_emp, row_emp, row_w2, row_w1))
+
+def piece_at_position(position: Position, board: BitBoard) -> str:
+    """Returns the piece at position on board.
+
+    Parameters:
+        position (Position): A position on the board of form (row, col).
+        board (BitBoard): The current state of the board.
+
+    Returns:
+        (str): The piece at position, or EMPTY.
+    """
+    return board.piece_at_square(position_to_square(position))
+
+def update_board(board: BitBoard, move: Move) -> BitBoard:
+    """Moves character from initial position to valid position.
+
+    The original board is left unchanged, as with chess.update_board().
+
+    Parameters:
+        board (BitBoard): The current state of the board.
+        move (Move): A move of form ((row, col), (row, col)).
+
+    Returns:
+        (BitBoard): An updated state of the board with move completed.
+    """
+    updated_board = board.copy()
+    updated_board.make_move(move)
+    return updated_board
+
+def iter_squares(bits: int) -> List[int]:
+    """Returns the indices of all set bits in a bitboard.
+
+    Parameters:
+        bits (int): A bitboard.
+
+    Returns:
+        (List[int]): Square indices in ascending order.
+    """
+    squares = []
+    while bits:
+        lowest = bits & -bits
+        squares.append(lowest.bit_length() - 1)
+        bits ^= lowest
+    return squares
+
+def find_piece(piece: str, board: BitBoard) -> Optional[Position]:
+    """Returns the first position of piece on board, if any.
+
+    Parameters:
+        piece (str): A piece character.
+        board (BitBoard): The current state of the board.
+
+    Returns:
+        (Optional[Position]): Position of piece with the lowest square index.
+    """
+    bits = board.get_pieces(piece)
+    if not bits:
+        return None
+    return square_to_position((bits & -bits).bit_length() - 1)
+
+def is_in_check(board: BitBoard, whites_turn: bool) -> bool:
+    """Checks whether the king of the player whose turn it is is attacked.
+
+    Parameters:
+        board (BitBoard): The current state of the board.
+        whites_turn (bool): True iff it is white's turn.
+
+    Returns:
+        (bool): True iff the player's king is attacked.
+    """
+    king = find_piece('K' if whites_turn else 'k', board)
+    if king is None:
+        return False
+    return is_square_attacked(board, position_to_square(king),
+                              not whites_turn)
+
+def is_square_attacked(board: BitBoard, square: int, by_white: bool) -> bool:
+    """Checks whether any piece of one player attacks square, by intersecting
+    the attack masks from square with that player's pieces.
+
+    Parameters:
+        board (BitBoard): The current state of the board.
+        square (int): Square index in range 0-63.
+        by_white (bool): True iff the attacking player is white.
+
+    Returns:
+        (bool): True iff a piece of the attacking player attacks square.
+    """
+    tables = get_attack_tables()
+    if by_white:
+        knight, king, pawn, rook, bishop, queen = 'NKPRBQ'
+    else:
+        knight, king, pawn, rook, bishop, queen = 'nkprbq'
+
+    if tables.knight_masks[square] & board.get_pieces(knight):
+        return True
+    if tables.king_masks[square] & board.get_pieces(king):
+        return True
+    # A pawn attacks square iff a pawn of the other player on square would
+    # attack the pawn.
+    if tables.pawn_attack_masks[not by_white][square] & \
+       board.get_pieces(pawn):
+        return True
+
+    occupied = board.get_occupied()
+    queens = board.get_pieces(queen)
+    if tables.rook_attacks(square, occupied) & \
+       (board.get_pieces(rook) | queens):
+        return True
+    if tables.bishop_attacks(square, occupied) & \
+       (board.get_pieces(bishop) | queens):
+        return True
+    return False
@@ -0,0 +1,248 @@
+"""
+Chess Opening Book
+Moves played from each position early in a collection of games, stored in a
+compact binary file and looked up through a memory map without loading it.
+
+The file holds a header, then the Zobrist hash of every entry in ascending
+order, then each entry's move and weight in the same order. Hashes are
+binary-searched in place, so a lookup touches a handful of pages however
+large the book is.
+
+Usage:
+    python chess_book.py BOOK_FILE GAMES_FILE... [--plies N]
+"""
+
+import argparse
+import bisect
+import mmap
+import random
+import struct
+import sys
+import time
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from a1_support import *
+from chess import (decode_move, encode_move, generate_legal_moves,
+                   initial_state, process_move, validate_game)
+from chess_zobrist import BLACK_TO_MOVE_KEY, hash_position, update_hash
+
+__author__ = "Harold Shaw, 47020665"
+__email__ = "s4702066@student.uq.edu.au"
+
+BOOK_MAGIC = b'CHESSBK1'
+# Magic and number of entries.
+HEADER_FORMAT = struct.Struct('<8sQ')
+# Move, encoded by chess.encode_move(), and weight.
+ENTRY_FORMAT = struct.Struct('<HH')
+HASH_SIZE = 8
+
+DEFAULT_BOOK_PLIES = 16
+MAX_WEIGHT = 0xffff
+
+
+def build_book(games: Iterable[List[str]],
+               max_plies: int = DEFAULT_BOOK_PLIES
+               ) -> Dict[int, Dict[Move, int]]:
+    """Counts the moves played from each position in the opening of games.
+
+    Parameters:
+        games (Iterable[List[str]]): Games as moves of the form
+            "letternum letternum".
+        max_plies (int): Number of moves of each game to include.
+
+    Returns:
+        (Dict[int, Dict[Move, int]]): Times each move was played, by hash of
+            the position it was played from.
+
+    Raises:
+        IllegalMoveError: If a game contains an illegal move.
+    """
+    book = {}
+    for moves in games:
+        opening = moves[:max_plies]
+        board = initial_state()
+        position_hash = hash_position(board, True)
+        for ply, next_board, status in validate_game(opening):
+            move = process_move(opening[ply - 1])
+            counts = book.setdefault(position_hash, {})
+            counts[move] = counts.get(move, 0) + 1
+            position_hash = update_hash(position_hash, board, move) \
+                ^ BLACK_TO_MOVE_KEY
+            board = next_board
+    return book
+
+def write_book(file_name: str, book: Dict[int, Dict[Move, int]]) -> int:
+    """Writes a book built by build_book() to file_name.
+
+    Parameters:
+        file_name (str): File to write.
+        book (Dict[int, Dict[Move, int]]): Move counts by position hash.
+
+    Returns:
+        (int): Number of entries written.
+    """
+    hashes = array('Q')
+    entries = bytearray()
+    for position_hash in sorted(book):
+        counts = book[position_hash]
+        for move in sorted(counts, key=counts.get, reverse=True):
+            hashes.append(position_hash)
+            entries += ENTRY_FORMAT.pack(encode_move(move),
+                                         min(counts[move], MAX_WEIGHT))
+    if sys.byteorder != 'little':
+        hashes.byteswap()
+
+    with open(file_name, 'wb') as file:
+        file.write(HEADER_FORMAT.pack(BOOK_MAGIC, len(hashes)))
+        file.write(hashes.tobytes())
+        file.write(entries)
+    return len(hashes)
+
+
+class OpeningBook(object):
+    """A class representing an opening book file opened for lookups."""
+    def __init__(self, file_name: str) -> None:
+        """Opens the book in file_name.
+
+        Parameters:
+            file_name (str): File written by write_book().
+
+        Returns:
+            (None)
+
+        Raises:
+            ValueError: If file_name is not an opening book.
+        """
+        self._file = open(file_name, 'rb')
+        self._hashes = None
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._count = HEADER_FORMAT.unpack_from(self._map)
+        size = HEADER_FORMAT.size + self._count * (HASH_SIZE
+                                                   + ENTRY_FORMAT.size)
+        if magic != BOOK_MAGIC or len(self._map) != size:
+            self.close()
+            raise ValueError(f'{file_name!r} is not an opening book')
+
+        hashes_end = HEADER_FORMAT.size + self._count * HASH_SIZE
+        if sys.byteorder == 'little':
+            self._hashes = memoryview(self._map)[HEADER_FORMAT.size:
+                                                 hashes_end].cast('Q')
+        else:
+            self._hashes = array('Q', self._map[HEADER_FORMAT.size:
+                                                hashes_end])
+            self._hashes.byteswap()
+        self._entries_offset = hashes_end
+
+    def probe(self, position_hash: int) -> List[Tuple[Move, int]]:
+        """Looks up the moves played from a position.
+
+        Parameters:
+            position_hash (int): Hash of the position, side to move included.
+
+        Returns:
+            (List[Tuple[Move, int]]): Each move and its weight, most played
+                first. Empty if the position is not in the book.
+        """
+        index = bisect.bisect_left(self._hashes, position_hash)
+        moves = []
+        while index < self._count and self._hashes[index] == position_hash:
+            packed, weight = ENTRY_FORMAT.unpack_from(
+                self._map, self._entries_offset + index * ENTRY_FORMAT.size)
+            moves.append((decode_move(packed), weight))
+            index += 1
+        return moves
+
+    def get_moves(self, board: Board, whites_turn: bool
+                  ) -> List[Tuple[Move, int]]:
+        """Looks up the legal moves played from board.
+
+        Parameters:
+            board (Board): The current state of the board.
+            whites_turn (bool): True iff it is white's turn.
+
+        Returns:
+            (List[Tuple[Move, int]]): Each move and its weight, most played
+                first.
+        """
+        moves = self.probe(hash_position(board, whites_turn))
+        if len(moves) == 0:
+            return moves
+        # Guards against another position sharing the hash.
+        legal_moves = set(generate_legal_moves(board, whites_turn))
+        return [(move, weight) for move, weight in moves
+                if move in legal_moves]
+
+    def choose_move(self, board: Board, whites_turn: bool,
+                    generator: Optional[random.Random] = None
+                    ) -> Optional[Move]:
+        """Chooses a book move for board.
+
+        Parameters:
+            board (Board): The current state of the board.
+            whites_turn (bool): True iff it is white's turn.
+            generator (Optional[random.Random]): Picks a move at random in
+                proportion to weight if given, otherwise the most played move
+                is chosen.
+
+        Returns:
+            (Optional[Move]): The move, or None if board is not in the book.
+        """
+        moves = self.get_moves(board, whites_turn)
+        if len(moves) == 0:
+            return None
+        if generator is None:
+            return moves[0][0]
+        return generator.choices([move for move, weight in moves],
+                                 [weight for move, weight in moves])[0]
+
+    def close(self) -> None:
+        """(None) Closes the book file."""
+        if isinstance(self._hashes, memoryview):
+            self._hashes.release()
+        self._map.close()
+        self._file.close()
+
+    def __len__(self) -> int:
+        """(int) Returns number of entries in the book."""
+        return self._count
+
+    def __enter__(self) -> 'OpeningBook':
+        """(OpeningBook) Returns self, for use in a with statement."""
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """(None) Closes the book file on leaving a with statement."""
+        self.close()
+
+
+def main():
+    """Entry point to building an opening book."""
+    # Imported here, as only the command line reads games files.
+    from chess_games import read_games
+
+    parser = argparse.ArgumentParser(description='Build an opening book from '
+                                                 'games files.')
+    parser.add_argument('book', metavar='BOOK_FILE',
+                        help='book file to write')
+    parser.add_argument('games', metavar='GAMES_FILE', nargs='+',
+                        help='files of games, one per line')
+    parser.add_argument('--plies', type=int, default=DEFAULT_BOOK_PLIES,
+                        help='moves of each game to include (default '
+                             f'{DEFAULT_BOOK_PLIES})')
+    args = parser.parse_args()
+
+    def iter_games() -> Iterable[List[str]]:
+        for file_name in args.games:
+            with open(file_name, 'r') as file:
+                for line_number, moves in read_games(file):
+                    yield moves
+
+    start = time.perf_counter()
+    book = build_book(iter_games(), args.plies)
+    entries = write_book(args.book, book)
+    print(f'{len(book)} positions, {entries} entries, '
+          f'{time.perf_counter() - start:.2f}s')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Chess Draw Detection
+Game state carried alongside the Board, recording what the Board alone does
+not: how often each position has occurred, the moves since the last capture
+or pawn move, and the material left on the board. Every draw rule is then
+checked in constant time per move.
+"""
+
+from typing import Optional
+
+from a1_support import *
+from chess import initial_state
+from chess_zobrist import BLACK_TO_MOVE_KEY, hash_position, update_hash
+
+__author__ = "Harold Shaw, 47020665"
+__email__ = "s4702066@student.uq.edu.au"
+
+# Reasons a game is drawn.
+REPETITION = 'repetition'
+FIFTY_MOVES = 'fifty-moves'
+INSUFFICIENT_MATERIAL = 'insufficient-material'
+
+REPETITION_LIMIT = 3
+# Fifty moves by each player.
+HALFMOVE_LIMIT = 100
+
+# Lowercase pieces which leave checkmate possible whatever else is left.
+MATING_PIECES = 'pqr'
+
+
+class GameState(object):
+    """A class representing the history of a game needed to detect draws.
+
+    Call update() with the board before each move, as the move is made.
+    """
+    def __init__(self, board: Optional[Board] = None, whites_turn: bool = True,
+                 halfmove_clock: int = 0) -> None:
+        """Constructs a GameState for a game currently at board.
+
+        Parameters:
+            board (Optional[Board]): The current state of the board, the
+                initial state if None.
+            whites_turn (bool): True iff it is white's turn.
+            halfmove_clock (int): Moves since the last capture or pawn move.
+
+        Returns:
+            (None)
+        """
+        if board is None:
+            board = initial_state()
+
+        self._hash = hash_position(board, whites_turn)
+        self._halfmove_clock = halfmove_clock
+        # Only positions since the last capture or pawn move can recur.
+        self._repetitions = {self._hash: 1}
+
+        # Counts of mating pieces and knights, and of bishops by the colour
+        # of their square, for both players together.
+        self._mating_pieces = 0
+        self._knights = 0
+        self._bishops = [0, 0]
+        for row_index, row in enumerate(board):
+            for col_index, character in enumerate(row):
+                self._count_piece(character, (row_index, col_index), 1)
+
+    def _count_piece(self, piece: str, position: Position, change: int
+                     ) -> None:
+        """(None) Adds change to the material count of piece at position."""
+        kind = piece.lower()
+        if kind in MATING_PIECES:
+            self._mating_pieces += change
+        elif kind == 'n':
+            self._knights += change
+        elif kind == 'b':
+            self._bishops[(position[0] + position[1]) % 2] += change
+
+    def get_hash(self) -> int:
+        """(int) Returns Zobrist hash of the current position."""
+        return self._hash
+
+    def get_halfmove_clock(self) -> int:
+        """(int) Returns moves since the last capture or pawn move."""
+        return self._halfmove_clock
+
+    def get_repetitions(self) -> int:
+        """(int) Returns number of times the current position has occurred."""
+        return self._repetitions[self._hash]
+
+    def update(self, board: Board, move: Move) -> None:
+        """Records move being made.
+
+        Parameters:
+            board (Board): The state of the board before move.
+            move (Move): A move of form ((row, col), (row, col)).
+
+        Returns:
+            (None)
+        """
+        moved = board[move[0][0]][move[0][1]]
+        captured = board[move[1][0]][move[1][1]]
+        self._hash = update_hash(self._hash, board, move) ^ BLACK_TO_MOVE_KEY
+
+        if captured != EMPTY or moved.lower() == 'p':
+            self._halfmove_clock = 0
+            self._repetitions = {}
+            if captured != EMPTY:
+                self._count_piece(captured, move[1], -1)
+        else:
+            self._halfmove_clock += 1
+        self._repetitions[self._hash] = \
+            self._repetitions.get(self._hash, 0) + 1
+        return None
+
+    def is_insufficient_material(self) -> bool:
+        """Checks whether neither player has the pieces to checkmate.
+
+        This is the case with only kings and one knight or bishop, or with
+        only kings and bishops which all stand on squares of one colour.
+
+        Returns:
+            (bool): True iff checkmate is impossible.
+        """
+        if self._mating_pieces > 0:
+            return False
+        light, dark = self._bishops
+        if self._knights + light + dark <= 1:
+            return True
+        return self._knights == 0 and (light == 0 or dark == 0)
+
+    def get_draw_reason(self) -> Optional[str]:
+        """Checks every draw rule against the current position.
+
+        Returns:
+            (Optional[str]): REPETITION, FIFTY_MOVES or INSUFFICIENT_MATERIAL
+                if the game is drawn, otherwise None.
+        """
+        if self._repetitions[self._hash] >= REPETITION_LIMIT:
+            return REPETITION
+        if self._halfmove_clock >= HALFMOVE_LIMIT:
+            return FIFTY_MOVES
+        if self.is_insufficient_material():
+            return INSUFFICIENT_MATERIAL
+        return None
+
+    def __repr__(self) -> str:
+        """(str) Returns representation of GameState."""
+        return (f'GameState(hash={self._hash:#x}, '
+                f'halfmove_clock={self._halfmove_clock}, '
+                f'repetitions={self.get_repetitions()})')
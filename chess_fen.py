@@ -0,0 +1,178 @@
+"""
+Chess Position Formats
+Conversion between the chess game's Board and Forsyth-Edwards Notation (FEN),
+and a fixed-size binary encoding for storing positions in bulk.
+
+The binary encoding packs each square into 4 bits, two squares per byte in
+the order of Board (a8, b8, ..., h1), so every board is PACKED_SIZE (32) bytes.
+"""
+
+from typing import Iterator, Tuple, Union
+
+from a1_support import *
+
+__author__ = "Harold Shaw, 47020665"
+__email__ = "s4702066@student.uq.edu.au"
+
+WHITE_TO_MOVE = 'w'
+BLACK_TO_MOVE = 'b'
+NO_FEN_FIELD = '-'
+FEN_ROW_SEPARATOR = '/'
+
+NUM_SQUARES = BOARD_SIZE * BOARD_SIZE
+PACKED_SIZE = NUM_SQUARES // 2
+PACKED_ROW_SIZE = BOARD_SIZE // 2
+
+# 4-bit code of each square's contents, 0 being EMPTY.
+PIECE_CODES = {
+    piece: code for code, piece in
+    enumerate((EMPTY,) + tuple(WHITE_PIECES) + tuple(BLACK_PIECES))
+}
+CODE_PIECES = {code: piece for piece, code in PIECE_CODES.items()}
+
+# Contents of both squares held in each possible byte. Bytes using codes which
+# are not pieces map to None.
+BYTE_SQUARES = tuple(
+    CODE_PIECES[byte >> 4] + CODE_PIECES[byte & 0xf]
+    if byte >> 4 in CODE_PIECES and byte & 0xf in CODE_PIECES else None
+    for byte in range(256)
+)
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+def board_to_fen(board: Board, whites_turn: bool = True, halfmoves: int = 0,
+                 fullmoves: int = 1) -> str:
+    """Converts board to Forsyth-Edwards Notation.
+
+    Castling and en passant are not part of the game, so those fields are
+    always '-'.
+
+    Parameters:
+        board (Board): The current state of the board.
+        whites_turn (bool): True iff it is white's turn.
+        halfmoves (int): Moves since the last capture or pawn move.
+        fullmoves (int): Number of the current move, starting at 1.
+
+    Returns:
+        (str): The position in FEN, e.g. "8/8/8/8/8/8/8/K6k w - - 0 1".
+    """
+    rows = []
+    for row in board:
+        fen_row = ''
+        empty_count = 0
+        for character in row:
+            if character == EMPTY:
+                empty_count += 1
+            else:
+                if empty_count:
+                    fen_row += str(empty_count)
+                    empty_count = 0
+                fen_row += character
+        if empty_count:
+            fen_row += str(empty_count)
+        rows.append(fen_row)
+
+    side = WHITE_TO_MOVE if whites_turn else BLACK_TO_MOVE
+    return (f'{FEN_ROW_SEPARATOR.join(rows)} {side} {NO_FEN_FIELD} '
+            f'{NO_FEN_FIELD} {halfmoves} {fullmoves}')
+
+def fen_to_board(fen: str) -> Tuple[Board, bool]:
+    """Converts Forsyth-Edwards Notation to a board.
+
+    Only the piece placement field is required; a missing side to move means
+    white. Castling and en passant fields are accepted but ignored.
+
+    Parameters:
+        fen (str): A position in FEN.
+
+    Returns:
+        (Tuple[Board, bool]): The board, and True iff it is white's turn.
+
+    Raises:
+        ValueError: If fen is not a valid position.
+    """
+    fields = fen.split()
+    if len(fields) == 0:
+        raise ValueError('empty FEN')
+
+    fen_rows = fields[0].split(FEN_ROW_SEPARATOR)
+    if len(fen_rows) != BOARD_SIZE:
+        raise ValueError(f'FEN must have {BOARD_SIZE} rows, not '
+                         f'{len(fen_rows)}: {fen!r}')
+
+    rows = []
+    for fen_row in fen_rows:
+        row = ''
+        for character in fen_row:
+            if character.isdigit():
+                row += EMPTY * int(character)
+            elif character in PIECE_CODES and character != EMPTY:
+                row += character
+            else:
+                raise ValueError(f'unknown piece {character!r} in FEN: '
+                                 f'{fen!r}')
+        if len(row) != BOARD_SIZE:
+            raise ValueError(f'FEN row {fen_row!r} does not have '
+                             f'{BOARD_SIZE} squares: {fen!r}')
+        rows.append(row)
+
+    whites_turn = True
+    if len(fields) > 1:
+        if fields[1] not in (WHITE_TO_MOVE, BLACK_TO_MOVE):
+            raise ValueError(f'unknown side to move {fields[1]!r} in FEN: '
+                             f'{fen!r}')
+        whites_turn = fields[1] == WHITE_TO_MOVE
+    return tuple(rows), whites_turn
+
+def pack_board(board: Board) -> bytes:
+    """Encodes board as PACKED_SIZE bytes.
+
+    Parameters:
+        board (Board): The current state of the board.
+
+    Returns:
+        (bytes): The packed board.
+    """
+    codes = [PIECE_CODES[character] for row in board for character in row]
+    return bytes(codes[index] << 4 | codes[index + 1]
+                 for index in range(0, NUM_SQUARES, 2))
+
+def unpack_board(data: BytesLike, offset: int = 0) -> Board:
+    """Decodes a board packed by pack_board().
+
+    Each row is built from one table lookup per pair of squares, so data can
+    be read straight out of a memory-mapped file.
+
+    Parameters:
+        data (BytesLike): Buffer holding the packed board.
+        offset (int): Position of the packed board in data.
+
+    Returns:
+        (Board): The unpacked board.
+
+    Raises:
+        ValueError: If data does not hold a packed board at offset.
+    """
+    if len(data) - offset < PACKED_SIZE:
+        raise ValueError(f'need {PACKED_SIZE} bytes at offset {offset}, '
+                         f'have {len(data) - offset}')
+    rows = []
+    for start in range(offset, offset + PACKED_SIZE, PACKED_ROW_SIZE):
+        pairs = [BYTE_SQUARES[byte]
+                 for byte in data[start:start + PACKED_ROW_SIZE]]
+        if None in pairs:
+            raise ValueError(f'invalid packed board at offset {offset}')
+        rows.append(''.join(pairs))
+    return tuple(rows)
+
+def iter_packed_boards(data: BytesLike) -> Iterator[Board]:
+    """Decodes every board in a buffer of back-to-back packed boards.
+
+    Parameters:
+        data (BytesLike): Buffer of packed boards, e.g. a memory-mapped file.
+
+    Yields:
+        (Board): Each board in order.
+    """
+    for offset in range(0, len(data) - PACKED_SIZE + 1, PACKED_SIZE):
+        yield unpack_board(data, offset)
@@ -0,0 +1,130 @@
+"""
+Chess Game Replay
+Validates archived games in bulk using chess.validate_game().
+
+Games are read from a text file with one game per line, moves written as
+"letternum letternum" and separated by commas, e.g. "e2 e4,e7 e5,g1 f3".
+Blank lines and lines starting with '#' are ignored.
+
+Usage:
+    python chess_games.py [--jobs N] GAMES_FILE [GAMES_FILE ...]
+"""
+
+import argparse
+import multiprocessing
+import time
+from typing import Iterator, List, Optional, TextIO, Tuple
+
+from a1_support import *
+from chess import (CHECKMATE, STALEMATE, IllegalMoveError, initial_state,
+                   validate_game)
+
+__author__ = "Harold Shaw, 47020665"
+__email__ = "s4702066@student.uq.edu.au"
+
+MOVE_SEPARATOR = ','
+
+# Games sent to a worker process at a time when using --jobs.
+GAMES_PER_TASK = 64
+
+def read_games(file: TextIO) -> Iterator[Tuple[int, List[str]]]:
+    """Reads games from an open file, one at a time.
+
+    Parameters:
+        file (TextIO): A file of games, one per line.
+
+    Yields:
+        (Tuple[int, List[str]]): Line number and the moves of each game.
+    """
+    for line_number, line in enumerate(file, start=1):
+        line = line.strip()
+        if line == '' or line.startswith('#'):
+            continue
+        yield line_number, [move.strip()
+                            for move in line.split(MOVE_SEPARATOR)]
+
+def replay_game(moves: List[str]) -> Tuple[Board, int, str]:
+    """Plays a whole game, keeping only its final position.
+
+    Parameters:
+        moves (List[str]): Moves of the form "letternum letternum".
+
+    Returns:
+        (Tuple[Board, int, str]): Final board, number of plies and status of
+            the final position.
+
+    Raises:
+        IllegalMoveError: At the first move which cannot be played.
+    """
+    board = initial_state()
+    plies = 0
+    status = None
+    for plies, board, status in validate_game(moves):
+        pass
+    return board, plies, status
+
+def check_game(game: Tuple[int, List[str]]
+               ) -> Tuple[int, int, Optional[str], Optional[str]]:
+    """Replays one game read by read_games(), catching any illegal move.
+
+    Parameters:
+        game (Tuple[int, List[str]]): Line number and moves of the game.
+
+    Returns:
+        (Tuple[int, int, Optional[str], Optional[str]]): Line number, plies
+            played legally, final status and error message if illegal.
+    """
+    line_number, moves = game
+    try:
+        board, plies, status = replay_game(moves)
+    except IllegalMoveError as error:
+        return line_number, error.ply - 1, None, str(error)
+    return line_number, plies, status, None
+
+def main():
+    """Entry point to bulk game validation."""
+    parser = argparse.ArgumentParser(description='Validate archived games.')
+    parser.add_argument('files', nargs='+', metavar='GAMES_FILE',
+                        help='file of games, one per line')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='number of processes to validate games with')
+    args = parser.parse_args()
+
+    pool = None
+    if args.jobs > 1:
+        pool = multiprocessing.Pool(args.jobs)
+
+    games = 0
+    plies = 0
+    illegal = 0
+    finished = 0
+    start = time.perf_counter()
+
+    for file_name in args.files:
+        with open(file_name, 'r') as file:
+            if pool is None:
+                results = map(check_game, read_games(file))
+            else:
+                results = pool.imap(check_game, read_games(file),
+                                    GAMES_PER_TASK)
+            for line_number, game_plies, status, error in results:
+                games += 1
+                plies += game_plies
+                if error is not None:
+                    illegal += 1
+                    print(f'{file_name}:{line_number}: {error}')
+                elif status == CHECKMATE or status == STALEMATE:
+                    finished += 1
+
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+    elapsed = time.perf_counter() - start
+    rate = games / elapsed * 60 if elapsed > 0 else 0
+    print(f'\n{games} games, {plies} plies, {illegal} illegal, '
+          f'{finished} ended in checkmate or stalemate')
+    print(f'{elapsed:.2f}s ({rate:.0f} games/minute)')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Chess Server Load Generator
+Plays many games of random legal moves against chess_server at once and
+reports the latency of its responses.
+
+Each connection keeps all of its games in flight together, sending the next
+move of a game as soon as the response to its last one arrives.
+
+Usage:
+    python chess_loadgen.py [--host HOST] [--port PORT | --unix PATH]
+                            [--connections N] [--games N] [--plies N]
+                            [--seed N]
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from chess_server import DEFAULT_HOST, DEFAULT_PORT
+
+__author__ = "Harold Shaw, 47020665"
+__email__ = "s4702066@student.uq.edu.au"
+
+DEFAULT_CONNECTIONS = 8
+DEFAULT_GAMES = 64
+DEFAULT_PLIES = 40
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Finds the value below which a fraction of values lie.
+
+    Parameters:
+        values (List[float]): Values in ascending order.
+        fraction (float): Between 0 and 1, e.g. 0.99.
+
+    Returns:
+        (float): The nearest-rank percentile, or 0 if values is empty.
+    """
+    if len(values) == 0:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class LoadClient(object):
+    """A class representing one connection to the server, matching responses
+    to requests by id and timing each request."""
+    def __init__(self, reader: asyncio.StreamReader,
+                 writer: asyncio.StreamWriter) -> None:
+        """Constructs a LoadClient over an open connection.
+
+        Parameters:
+            reader (StreamReader): Stream of response lines.
+            writer (StreamWriter): Stream for request lines.
+
+        Returns:
+            (None)
+        """
+        self._reader = reader
+        self._writer = writer
+        self._ids = itertools.count()
+        self._waiting = {}
+        self.latencies = []
+        self._receiver = asyncio.create_task(self._receive())
+
+    async def _receive(self) -> None:
+        """(None) Passes each response to the request waiting for it."""
+        while True:
+            line = await self._reader.readline()
+            if line == b'':
+                break
+            response = json.loads(line)
+            future = self._waiting.pop(response.get('id'), None)
+            if future is not None and not future.done():
+                future.set_result(response)
+        for future in self._waiting.values():
+            if not future.done():
+                future.set_exception(ConnectionError('server disconnected'))
+
+    async def request(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Sends a request and waits for its response.
+
+        Parameters:
+            request (Dict[str, Any]): The request, without "id".
+
+        Returns:
+            (Dict[str, Any]): The response.
+        """
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[request_id] = future
+        request['id'] = request_id
+        start = time.perf_counter()
+        self._writer.write(json.dumps(request).encode() + b'\n')
+        await self._writer.drain()
+        response = await future
+        self.latencies.append(time.perf_counter() - start)
+        return response
+
+    async def close(self) -> None:
+        """(None) Closes the connection."""
+        self._writer.close()
+        await self._writer.wait_closed()
+        self._receiver.cancel()
+
+
+async def play_game(client: LoadClient, plies: int,
+                    generator: random.Random) -> int:
+    """Plays random legal moves in one game until it ends or plies moves
+    have been made.
+
+    Parameters:
+        client (LoadClient): Connection to play on.
+        plies (int): Most moves to make.
+        generator (random.Random): Chooses the moves.
+
+    Returns:
+        (int): Number of responses which reported an error.
+    """
+    errors = 0
+    response = await client.request({'op': 'new', 'moves': True})
+    if response['ok'] == False:
+        return 1
+    game_id = response['game']
+    for ply in range(plies):
+        if len(response.get('moves', [])) == 0:
+            break
+        move = generator.choice(response['moves'])
+        response = await client.request({'op': 'move', 'game': game_id,
+                                         'move': move, 'moves': True})
+        if response['ok'] == False:
+            errors += 1
+            break
+    await client.request({'op': 'close', 'game': game_id})
+    return errors
+
+async def run_connection(host: str, port: int, unix_path: Optional[str],
+                         games: int, plies: int,
+                         generator: random.Random) -> Tuple[List[float], int]:
+    """Plays games at once over a new connection.
+
+    Parameters:
+        host (str): Server address for TCP.
+        port (int): Server port for TCP.
+        unix_path (Optional[str]): Server Unix socket, used instead of TCP.
+        games (int): Number of games to play at once.
+        plies (int): Most moves per game.
+        generator (random.Random): Chooses the moves.
+
+    Returns:
+        (Tuple[List[float], int]): Seconds taken by each request, and the
+            number of errors.
+    """
+    if unix_path is None:
+        reader, writer = await asyncio.open_connection(host, port)
+    else:
+        reader, writer = await asyncio.open_unix_connection(unix_path)
+    client = LoadClient(reader, writer)
+    errors = await asyncio.gather(*(play_game(client, plies, generator)
+                                    for game in range(games)))
+    await client.close()
+    return client.latencies, sum(errors)
+
+async def run_load(host: str, port: int, unix_path: Optional[str],
+                   connections: int, games: int, plies: int,
+                   seed: Optional[int]) -> None:
+    """Runs every connection at once and prints latency statistics.
+
+    Parameters:
+        host (str): Server address for TCP.
+        port (int): Server port for TCP.
+        unix_path (Optional[str]): Server Unix socket, used instead of TCP.
+        connections (int): Number of connections to open.
+        games (int): Games played at once on each connection.
+        plies (int): Most moves per game.
+        seed (Optional[int]): Seed for the moves chosen.
+
+    Returns:
+        (None)
+    """
+    generator = random.Random(seed)
+    start = time.perf_counter()
+    results = await asyncio.gather(*(
+        run_connection(host, port, unix_path, games, plies, generator)
+        for connection in range(connections)))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for connection_latencies, errors in results
+                       for latency in connection_latencies)
+    errors = sum(errors for connection_latencies, errors in results)
+    print(f'{connections * games} games over {connections} connections, '
+          f'{len(latencies)} requests, {errors} errors')
+    print(f'{elapsed:.2f}s, {len(latencies) / elapsed:.0f} requests/s')
+    print(f'latency p50 {percentile(latencies, 0.5) * 1000:.2f}ms, '
+          f'p99 {percentile(latencies, 0.99) * 1000:.2f}ms, '
+          f'max {percentile(latencies, 1.0) * 1000:.2f}ms')
+
+def main():
+    """Entry point to the load generator."""
+    parser = argparse.ArgumentParser(description='Load test chess_server.')
+    parser.add_argument('--host', default=DEFAULT_HOST,
+                        help=f'server address (default {DEFAULT_HOST})')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                        help=f'server port (default {DEFAULT_PORT})')
+    parser.add_argument('--unix', metavar='PATH',
+                        help='connect to a Unix socket instead of TCP')
+    parser.add_argument('--connections', type=int,
+                        default=DEFAULT_CONNECTIONS,
+                        help='connections to open (default '
+                             f'{DEFAULT_CONNECTIONS})')
+    parser.add_argument('--games', type=int, default=DEFAULT_GAMES,
+                        help='games in flight on each connection (default '
+                             f'{DEFAULT_GAMES})')
+    parser.add_argument('--plies', type=int, default=DEFAULT_PLIES,
+                        help=f'most moves per game (default {DEFAULT_PLIES})')
+    parser.add_argument('--seed', type=int,
+                        help='seed for the moves chosen')
+    args = parser.parse_args()
+    asyncio.run(run_load(args.host, args.port, args.unix, args.connections,
+                         args.games, args.plies, args.seed))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+"""
+Chess Parallel Search
+Multi-process search for the chess game. The legal moves at the root are
+split between a pool of worker processes, which share what they learn through
+a transposition table held in shared memory.
+
+Experimental: the tree is only split at the root, and workers share nothing
+but that table and the root's alpha, so below the root they search
+independently. No speedup over one process has been measured, as it has only
+been run on a single core, where extra workers are pure overhead (two workers
+took 1.8x as long as one at depth 3). Use chess_search.Searcher where speed
+matters, and run the benchmark below on a multi-core machine before relying
+on the speedup.
+
+Usage:
+    python chess_parallel.py [--depth N] [--workers 1 2 4 8 16]
+"""
+
+import argparse
+import multiprocessing
+import struct
+import time
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+from a1_support import *
+from chess import (MOVE_MASK, decode_move, encode_move, generate_legal_moves,
+                   get_checks_and_pins)
+from chess_perft import TEST_POSITIONS
+from chess_search import (INFINITY, MATE_SCORE, MAX_DEPTH, SearchResult,
+                          SearchTimeout, Searcher)
+
+__author__ = "Harold Shaw, 47020665"
+__email__ = "s4702066@student.uq.edu.au"
+
+# Each entry is two unsigned 64-bit words: the key XORed with the data, then
+# the data. A torn write by two processes at once leaves a key which no
+# longer matches, so no locking is needed.
+ENTRY_FORMAT = struct.Struct('<QQ')
+ENTRY_SIZE = ENTRY_FORMAT.size
+DEFAULT_TABLE_ENTRIES = 1 << 20
+
+SCORE_OFFSET = 1 << 31
+HASH_MASK = (1 << 64) - 1
+
+
+class SharedTranspositionTable(object):
+    """A class representing a fixed-size transposition table in shared
+    memory, usable as the table of a Searcher from any process.
+
+    Entries are replaced when the new result is at least as deep as the old
+    one, or belongs to a different position.
+    """
+    def __init__(self, num_entries: int = DEFAULT_TABLE_ENTRIES,
+                 name: Optional[str] = None) -> None:
+        """Creates a new table, or attaches to an existing one by name.
+
+        Parameters:
+            num_entries (int): Number of entries when creating a table.
+            name (Optional[str]): Name of an existing table to attach to.
+
+        Returns:
+            (None)
+        """
+        if name is None:
+            self._memory = shared_memory.SharedMemory(
+                create=True, size=num_entries * ENTRY_SIZE)
+            self._memory.buf[:num_entries * ENTRY_SIZE] = \
+                bytes(num_entries * ENTRY_SIZE)
+            self._owner = True
+        else:
+            self._memory = shared_memory.SharedMemory(name=name)
+            self._owner = False
+        self._num_entries = num_entries
+        self._buffer = self._memory.buf
+
+    def get_name(self) -> str:
+        """(str) Returns name other processes use to attach to this table."""
+        return self._memory.name
+
+    def get_num_entries(self) -> int:
+        """(int) Returns number of entries in the table."""
+        return self._num_entries
+
+    def probe(self, position_hash: int) -> Optional[Tuple[int, int, int,
+                                                          Optional[Move]]]:
+        """Looks up a position.
+
+        Parameters:
+            position_hash (int): Hash of the position, side to move included.
+
+        Returns:
+            (Optional[Tuple[int, int, int, Optional[Move]]]): Depth, score,
+                score kind and best move, if the position is present.
+        """
+        offset = (position_hash % self._num_entries) * ENTRY_SIZE
+        checked_key, data = ENTRY_FORMAT.unpack_from(self._buffer, offset)
+        if data == 0 or checked_key ^ data != position_hash & HASH_MASK:
+            return None
+        return _unpack_data(data)
+
+    def store(self, position_hash: int, depth: int, score: int, kind: int,
+              move: Optional[Move]) -> None:
+        """Stores a search result for a position.
+
+        Parameters:
+            position_hash (int): Hash of the position, side to move included.
+            depth (int): Depth the position was searched to.
+            score (int): Score found.
+            kind (int): EXACT, LOWER_BOUND or UPPER_BOUND.
+            move (Optional[Move]): Best move found, if any.
+
+        Returns:
+            (None)
+        """
+        position_hash &= HASH_MASK
+        offset = (position_hash % self._num_entries) * ENTRY_SIZE
+        checked_key, old_data = ENTRY_FORMAT.unpack_from(self._buffer, offset)
+        if old_data != 0 and checked_key ^ old_data == position_hash and \
+           old_data >> 32 & 0xff > depth:
+            return None
+        data = _pack_data(depth, score, kind, move)
+        ENTRY_FORMAT.pack_into(self._buffer, offset, position_hash ^ data,
+                               data)
+        return None
+
+    def close(self) -> None:
+        """(None) Detaches from the table, freeing it if this process created
+        it."""
+        self._buffer = None
+        self._memory.close()
+        if self._owner:
+            self._memory.unlink()
+
+    def __repr__(self) -> str:
+        """(str) Returns representation of SharedTranspositionTable."""
+        return (f'SharedTranspositionTable({self._num_entries}, '
+                f'name={self.get_name()!r})')
+
+
+def _pack_data(depth: int, score: int, kind: int,
+               move: Optional[Move]) -> int:
+    """(int) Packs an entry into 64 bits, never returning 0."""
+    data = (score + SCORE_OFFSET) | min(depth, 0xff) << 32 | kind << 40
+    if move is not None:
+        data |= 1 << 42 | encode_move(move) << 43
+    return data
+
+def _unpack_data(data: int) -> Tuple[int, int, int, Optional[Move]]:
+    """(Tuple[int, int, int, Optional[Move]]) Unpacks an entry."""
+    score = (data & 0xffffffff) - SCORE_OFFSET
+    depth = data >> 32 & 0xff
+    kind = data >> 40 & 0x3
+    move = None
+    if data >> 42 & 1:
+        move = decode_move(data >> 43 & MOVE_MASK)
+    return depth, score, kind, move
+
+
+# State of each worker process, set up by _start_worker().
+_worker_searcher = None
+_worker_table = None
+_worker_alpha = None
+
+def _start_worker(table_name: str, num_entries: int,
+                  shared_alpha: 'multiprocessing.Value') -> None:
+    """(None) Attaches a worker process to the shared table."""
+    global _worker_searcher, _worker_table, _worker_alpha
+    _worker_table = SharedTranspositionTable(num_entries, name=table_name)
+    _worker_searcher = Searcher(table=_worker_table)
+    _worker_alpha = shared_alpha
+
+def _score_root_move(task: Tuple[Board, bool, Move, int, float]
+                     ) -> Tuple[Move, Optional[int], bool, int]:
+    """Scores one root move in a worker process.
+
+    Parameters:
+        task (Tuple): Board, whose turn it is, root move, depth and deadline.
+
+    Returns:
+        (Tuple[Move, Optional[int], bool, int]): The move, its score (None if
+            out of time), whether the score is exact rather than an upper
+            bound, and the number of nodes searched.
+    """
+    board, whites_turn, move, depth, deadline = task
+    alpha = _worker_alpha.value
+    nodes_before = _worker_searcher.get_nodes()
+    try:
+        score = _worker_searcher.score_move(board, whites_turn, move, depth,
+                                            alpha, deadline)
+    except SearchTimeout:
+        return move, None, False, _worker_searcher.get_nodes() - nodes_before
+
+    # Raises the bar for root moves searched after this one.
+    exact = score > alpha
+    if exact:
+        with _worker_alpha.get_lock():
+            if score > _worker_alpha.value:
+                _worker_alpha.value = score
+    return move, score, exact, _worker_searcher.get_nodes() - nodes_before
+
+
+class ParallelSearcher(object):
+    """A class representing an iterative deepening search whose root moves
+    are scored in parallel by a pool of worker processes.
+    """
+    def __init__(self, workers: int, time_limit: float = 1.0,
+                 max_depth: int = MAX_DEPTH,
+                 table_entries: int = DEFAULT_TABLE_ENTRIES) -> None:
+        """Constructs a ParallelSearcher and starts its worker processes.
+
+        Parameters:
+            workers (int): Number of worker processes.
+            time_limit (float): Seconds allowed per call to search().
+            max_depth (int): Deepest iteration to attempt.
+            table_entries (int): Size of the shared transposition table.
+
+        Returns:
+            (None)
+        """
+        self._time_limit = time_limit
+        self._max_depth = max_depth
+        self._table = SharedTranspositionTable(table_entries)
+        self._alpha = multiprocessing.Value('q', -INFINITY)
+        self._pool = multiprocessing.Pool(
+            workers, initializer=_start_worker,
+            initargs=(self._table.get_name(), table_entries, self._alpha))
+
+    def search(self, board: Board, whites_turn: bool) -> SearchResult:
+        """Finds the best move for the player whose turn it is.
+
+        Parameters:
+            board (Board): The current state of the board.
+            whites_turn (bool): True iff it is white's turn.
+
+        Returns:
+            (SearchResult): Best move from the deepest completed iteration,
+                with nodes totalled over all workers.
+        """
+        start = time.perf_counter()
+        deadline = time.time() + self._time_limit
+
+        moves = generate_legal_moves(board, whites_turn)
+        if len(moves) == 0:
+            king, checks, pins = get_checks_and_pins(board, whites_turn)
+            score = -MATE_SCORE if len(checks) > 0 else 0
+            return SearchResult(None, score, 0, 0, 0.0)
+
+        scores = {move: 0 for move in moves}
+        best_move = moves[0]
+        best_score = 0
+        completed_depth = 0
+        nodes = 0
+
+        for depth in range(1, self._max_depth + 1):
+            # Dispatches the best moves from the last iteration first, so the
+            # shared alpha rises quickly.
+            ordered = sorted(moves, key=lambda move: scores[move],
+                             reverse=True)
+            self._alpha.value = -INFINITY
+            tasks = [(board, whites_turn, move, depth, deadline)
+                     for move in ordered]
+
+            timed_out = False
+            exact_scores = {}
+            for move, score, exact, move_nodes in \
+                    self._pool.imap_unordered(_score_root_move, tasks):
+                nodes += move_nodes
+                if score is None:
+                    timed_out = True
+                elif exact:
+                    exact_scores[move] = score
+            if timed_out or len(exact_scores) == 0:
+                break
+
+            for move in moves:
+                scores[move] = exact_scores.get(move, -INFINITY)
+            best_move = max(exact_scores, key=exact_scores.get)
+            best_score = exact_scores[best_move]
+            completed_depth = depth
+            if abs(best_score) >= MATE_SCORE - MAX_DEPTH:
+                break
+
+        elapsed = time.perf_counter() - start
+        return SearchResult(best_move, best_score, completed_depth, nodes,
+                            elapsed)
+
+    def close(self) -> None:
+        """(None) Stops the worker processes and frees the shared table."""
+        self._pool.close()
+        self._pool.join()
+        self._table.close()
+
+    def __enter__(self) -> 'ParallelSearcher':
+        """(ParallelSearcher) Returns self, for use in a with statement."""
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """(None) Stops the workers and frees the shared table, on leaving a
+        with statement."""
+        self.close()
+
+
+def benchmark(worker_counts: List[int], depth: int) -> Dict[int, float]:
+    """Searches each test position to a fixed depth with each number of
+    workers, printing time, nodes/second and speedup over the first count.
+
+    Parameters:
+        worker_counts (List[int]): Numbers of workers to compare.
+        depth (int): Depth to search each position to.
+
+    Returns:
+        (Dict[int, float]): Total seconds taken for each number of workers.
+    """
+    totals = {}
+    cores = multiprocessing.cpu_count()
+    if max(worker_counts) > cores:
+        print(f'cpu_count() is {cores}: speedups with more workers than '
+              f'that measure overhead, not scaling.\n')
+    print(f'{"workers":>7} {"position":<10} {"move":>16} {"nodes":>9} '
+          f'{"time":>9} {"nodes/s":>9}')
+    for workers in worker_counts:
+        total = 0.0
+        # A fresh pool and table each time so no run benefits from another.
+        with ParallelSearcher(workers, time_limit=float('inf'),
+                              max_depth=depth) as searcher:
+            for name, (board, whites_turn, expected) in \
+                    TEST_POSITIONS.items():
+                result = searcher.search(board, whites_turn)
+                total += result.elapsed
+                print(f'{workers:>7} {name:<10} {str(result.move):>16} '
+                      f'{result.nodes:>9} {result.elapsed:>8.2f}s '
+                      f'{result.get_nodes_per_second():>9.0f}')
+        totals[workers] = total
+
+    baseline = totals[worker_counts[0]]
+    print(f'\n{"workers":>7} {"time":>9} {"speedup":>8}')
+    for workers, total in totals.items():
+        print(f'{workers:>7} {total:>8.2f}s {baseline / total:>7.2f}x')
+    return totals
+
+def main():
+    """Entry point to parallel search benchmark."""
+    parser = argparse.ArgumentParser(description='Compare parallel search '
+                                                 'speed over worker counts.')
+    parser.add_argument('--depth', type=int, default=4,
+                        help='depth to search each position to (default 4)')
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=[1, 2, 4, 8, 16],
+                        help='worker counts to compare (default 1 2 4 8 16)')
+    args = parser.parse_args()
+    benchmark(args.workers, args.depth)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Chess Perft
+Move generation benchmark and correctness check for the chess game.
+
+Runs perft (a count of every position reachable in a fixed number of moves)
+over a set of test positions, reporting nodes per second and comparing each
+count against its known value. Exits with a non-zero status on a mismatch.
+
+Usage:
+    python chess_perft.py [--depth N] [--position NAME] [--validator]
+"""
+
+import argparse
+import sys
+import time
+from typing import Callable, List, Optional
+
+from a1_support import *
+from chess import (get_current_players_pieces, initial_state, is_move_valid,
+                   perft, update_board)
+from chess_state import BoardState
+from chess_tables import get_attack_tables
+
+__author__ = "Harold Shaw, 47020665"
+__email__ = "s4702066@student.uq.edu.au"
+
+# Builds the attack tables on import rather than inside the first timed call.
+get_attack_tables()
+
+# Known node counts per depth, starting at depth 1. The rules implemented here
+# have no castling, en passant or promotion, so counts differ from published
+# tables wherever those moves would appear (e.g. the initial position at
+# depth 5 excludes the 258 en passant captures).
+TEST_POSITIONS = {
+    'initial': (
+        initial_state(),
+        True,
+        (20, 400, 8902, 197281, 4865351),
+    ),
+    # Position 3 of the Chess Programming Wiki perft suite.
+    'endgame': (
+        ("........",
+         "..p.....",
+         "...p....",
+         "KP.....r",
+         ".R...p.k",
+         "........",
+         "....P.P.",
+         "........"),
+        True,
+        (14, 191, 2810, 43087, 671300),
+    ),
+    # "Kiwipete", a move generation stress test, without castling rights.
+    'kiwipete': (
+        ("r...k..r",
+         "p.ppqpb.",
+         "bn..pnp.",
+         "...PN...",
+         ".p..P...",
+         "..N..Q.p",
+         "PPPBBPPP",
+         "R...K..R"),
+        True,
+        (46, 1865, 86585, 3488552),
+    ),
+}
+
+def validator_perft(board: Board, whites_turn: bool, depth: int,
+                    board_state: Optional[BoardState] = None) -> int:
+    """Counts positions as perft() does, but checks every candidate from
+    get_possible_moves() with is_move_valid() instead of generating legal moves
+    directly. Used to benchmark and cross-check the move validator.
+
+    Parameters:
+        board (Board): The current state of the board.
+        whites_turn (bool): True iff it is white's turn.
+        depth (int): Number of moves (plies) to play out.
+        board_state (Optional[BoardState]): BoardState holding board, made
+            and unmade along with each move, or None to start one.
+
+    Returns:
+        (int): The number of leaf positions at depth.
+    """
+    if depth <= 0:
+        return 1
+
+    if board_state is None:
+        board_state = BoardState(board)
+    current_pieces = get_current_players_pieces(whites_turn)
+    nodes = 0
+    for row_index, row in enumerate(board):
+        for col_index, character in enumerate(row):
+            if character not in current_pieces:
+                continue
+            position = (row_index, col_index)
+            for target in get_possible_moves(position, board):
+                move = (position, target)
+                if not is_move_valid(move, board, whites_turn,
+                                     board_state):
+                    continue
+                if depth == 1:
+                    nodes += 1
+                else:
+                    board_state.make_move(move)
+                    nodes += validator_perft(update_board(board, move),
+                                             not whites_turn, depth - 1,
+                                             board_state)
+                    board_state.unmake_move()
+    return nodes
+
+def run_position(name: str, max_depth: int,
+                 counter: Callable[[Board, bool, int], int]) -> bool:
+    """Runs perft on one test position at depths 1 to max_depth, printing a
+    line per depth.
+
+    Parameters:
+        name (str): Key of the position in TEST_POSITIONS.
+        max_depth (int): Deepest depth to run.
+        counter (Callable): The perft function to benchmark.
+
+    Returns:
+        (bool): True iff every count matched its known value.
+    """
+    board, whites_turn, expected = TEST_POSITIONS[name]
+    passed = True
+
+    for depth in range(1, min(max_depth, len(expected)) + 1):
+        start = time.perf_counter()
+        nodes = counter(board, whites_turn, depth)
+        elapsed = time.perf_counter() - start
+
+        correct = nodes == expected[depth - 1]
+        passed = passed and correct
+        rate = nodes / elapsed if elapsed > 0 else float('inf')
+        status = 'ok' if correct else f'FAIL (expected {expected[depth - 1]})'
+        print(f'{name:<10} {depth:>5} {nodes:>10} {elapsed:>9.3f}s '
+              f'{rate:>12.0f}  {status}')
+    return passed
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Entry point to perft benchmark.
+
+    Parameters:
+        argv (List[str]): Command line arguments, excluding program name.
+
+    Returns:
+        (int): Exit status, 0 iff all counts matched.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[2])
+    parser.add_argument('--depth', type=int, default=5,
+                        help='deepest depth to run (default 5)')
+    parser.add_argument('--position', choices=sorted(TEST_POSITIONS),
+                        action='append',
+                        help='position to run, may be repeated (default all)')
+    parser.add_argument('--validator', action='store_true',
+                        help='count moves with is_move_valid() instead of '
+                             'generate_legal_moves()')
+    args = parser.parse_args(argv)
+
+    counter = validator_perft if args.validator else perft
+    names = args.position or list(TEST_POSITIONS)
+
+    print(f'{"position":<10} {"depth":>5} {"nodes":>10} {"time":>10} '
+          f'{"nodes/s":>12}')
+    passed = True
+    for name in names:
+        passed = run_position(name, args.depth, counter) and passed
+    return 0 if passed else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
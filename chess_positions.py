@@ -0,0 +1,407 @@
+"""
+Chess Position Store
+An on-disk database of positions reached in games of chess, recording how
+often each was seen and how those games ended.
+
+Positions are kept as fixed-width records in a memory-mapped data file, and
+found through an open-addressing hash index in a second memory-mapped file
+keyed by Zobrist hash, so a lookup reads a handful of slots rather than the
+whole store. Records are appended as new positions are seen; the results of
+a position already present are updated in place.
+
+Usage:
+    python chess_positions.py STORE GAMES_FILE [GAMES_FILE ...]
+    python chess_positions.py STORE --lookup FEN
+"""
+
+import argparse
+import mmap
+import os
+import struct
+import time
+from typing import Iterable, Optional, Tuple
+
+from a1_support import *
+from chess import CHECKMATE, STALEMATE, initial_state, validate_game
+from chess_fen import PACKED_SIZE, fen_to_board, pack_board, unpack_board
+from chess_zobrist import hash_position
+
+__author__ = "Harold Shaw, 47020665"
+__email__ = "s4702066@student.uq.edu.au"
+
+# Game results, as written in PGN.
+WHITE_WIN = '1-0'
+BLACK_WIN = '0-1'
+DRAW = '1/2-1/2'
+RESULTS = (WHITE_WIN, BLACK_WIN, DRAW)
+
+INDEX_SUFFIX = '.idx'
+DATA_MAGIC = b'CHESSPDB'
+INDEX_MAGIC = b'CHESSIDX'
+
+# Data file: magic and record count, then records of hash, packed board,
+# side to move and counts of white wins, black wins and draws.
+DATA_HEADER = struct.Struct('<8sQ')
+RECORD = struct.Struct(f'<Q{PACKED_SIZE}s?3xIII')
+
+# Index file: magic, number of slots and number of records indexed, then
+# slots of hash and record number plus one (0 marking an empty slot).
+INDEX_HEADER = struct.Struct('<8sQQ')
+SLOT = struct.Struct('<QQ')
+
+INITIAL_CAPACITY = 1024
+MAX_LOAD_FACTOR = 0.5
+HASH_MASK = (1 << 64) - 1
+
+
+class PositionRecord(object):
+    """A class representing what the store knows about one position."""
+    def __init__(self, number: int, position_hash: int, packed: bytes,
+                 whites_turn: bool, white_wins: int, black_wins: int,
+                 draws: int) -> None:
+        """Constructs a PositionRecord.
+
+        Parameters:
+            number (int): Index of the record in the store.
+            position_hash (int): Zobrist hash, side to move included.
+            packed (bytes): Board packed by chess_fen.pack_board().
+            whites_turn (bool): True iff it is white's turn.
+            white_wins (int): Games from this position which white won.
+            black_wins (int): Games from this position which black won.
+            draws (int): Games from this position which were drawn.
+
+        Returns:
+            (None)
+        """
+        self.number = number
+        self.position_hash = position_hash
+        self.packed = packed
+        self.whites_turn = whites_turn
+        self.white_wins = white_wins
+        self.black_wins = black_wins
+        self.draws = draws
+
+    def get_board(self) -> Board:
+        """(Board) Returns the position's board."""
+        return unpack_board(self.packed)
+
+    def get_games(self) -> int:
+        """(int) Returns number of games this position was seen in."""
+        return self.white_wins + self.black_wins + self.draws
+
+    def __repr__(self) -> str:
+        """(str) Returns representation of PositionRecord."""
+        return (f'PositionRecord({self.number}, +{self.white_wins} '
+                f'-{self.black_wins} ={self.draws})')
+
+
+class PositionStore(object):
+    """A class representing a memory-mapped store of positions."""
+    def __init__(self, path: str) -> None:
+        """Opens the store at path, creating it if it does not exist.
+
+        Parameters:
+            path (str): Data file path; the index is kept at path + '.idx'.
+
+        Returns:
+            (None)
+        """
+        self._path = path
+        self._index_path = path + INDEX_SUFFIX
+
+        if not os.path.exists(path):
+            with open(path, 'wb') as file:
+                file.write(DATA_HEADER.pack(DATA_MAGIC, 0))
+                file.truncate(DATA_HEADER.size
+                              + INITIAL_CAPACITY * RECORD.size)
+        self._data_file = open(path, 'r+b')
+        self._data = mmap.mmap(self._data_file.fileno(), 0)
+        magic, self._count = DATA_HEADER.unpack_from(self._data, 0)
+        if magic != DATA_MAGIC:
+            raise ValueError(f'{path} is not a position store')
+
+        self._index_file = None
+        self._index = None
+        self._slots = 0
+        if os.path.exists(self._index_path):
+            self._open_index()
+        # Rebuilds an index which is missing, or behind after a crash.
+        if self._index is None or self._indexed_count() != self._count:
+            self._build_index(self._index_size_for(self._count))
+
+    def __len__(self) -> int:
+        """(int) Returns number of distinct positions stored."""
+        return self._count
+
+    def get_record(self, number: int) -> PositionRecord:
+        """Reads a record by its index in the store.
+
+        Parameters:
+            number (int): Index of the record, from 0 to len(store) - 1.
+
+        Returns:
+            (PositionRecord): The record.
+        """
+        if not 0 <= number < self._count:
+            raise IndexError(f'record {number} out of range')
+        fields = RECORD.unpack_from(self._data, self._record_offset(number))
+        return PositionRecord(number, *fields)
+
+    def lookup(self, board: Board,
+               whites_turn: bool) -> Optional[PositionRecord]:
+        """Looks up a position.
+
+        Parameters:
+            board (Board): The position's board.
+            whites_turn (bool): True iff it is white's turn.
+
+        Returns:
+            (Optional[PositionRecord]): The position's record, if seen.
+        """
+        position_hash = hash_position(board, whites_turn) & HASH_MASK
+        number = self._find(position_hash, pack_board(board), whites_turn)[0]
+        if number is None:
+            return None
+        return self.get_record(number)
+
+    def add_position(self, board: Board, whites_turn: bool,
+                     result: str) -> int:
+        """Records a position as seen in a game with result.
+
+        Parameters:
+            board (Board): The position's board.
+            whites_turn (bool): True iff it is white's turn.
+            result (str): WHITE_WIN, BLACK_WIN or DRAW.
+
+        Returns:
+            (int): Index of the position's record.
+        """
+        if result not in RESULTS:
+            raise ValueError(f'unknown result {result!r}')
+        position_hash = hash_position(board, whites_turn) & HASH_MASK
+        packed = pack_board(board)
+        number, slot = self._find(position_hash, packed, whites_turn)
+
+        if number is None:
+            number = self._append(position_hash, packed, whites_turn)
+            self._set_slot(slot, position_hash, number)
+            if self._count > self._slots * MAX_LOAD_FACTOR:
+                self._build_index(self._slots * 2)
+
+        offset = self._record_offset(number)
+        (position_hash, packed, whites_turn, white_wins, black_wins,
+         draws) = RECORD.unpack_from(self._data, offset)
+        if result == WHITE_WIN:
+            white_wins += 1
+        elif result == BLACK_WIN:
+            black_wins += 1
+        else:
+            draws += 1
+        RECORD.pack_into(self._data, offset, position_hash, packed,
+                         whites_turn, white_wins, black_wins, draws)
+        return number
+
+    def add_game(self, moves: Iterable[str],
+                 result: Optional[str] = None) -> int:
+        """Replays a game with chess.validate_game() and records every
+        position reached, including the starting position.
+
+        Nothing is recorded if the game contains an illegal move.
+
+        Parameters:
+            moves (Iterable[str]): Moves of the form "letternum letternum".
+            result (Optional[str]): WHITE_WIN, BLACK_WIN or DRAW. May be
+                omitted if the game ends in checkmate or stalemate.
+
+        Returns:
+            (int): Number of plies in the game.
+
+        Raises:
+            IllegalMoveError: If a move cannot be played.
+            ValueError: If result is omitted for an unfinished game.
+        """
+        whites_turn = True
+        positions = [(initial_state(), whites_turn)]
+        status = None
+        for ply, board, status in validate_game(moves):
+            whites_turn = not whites_turn
+            positions.append((board, whites_turn))
+
+        if result is None:
+            if status == CHECKMATE:
+                result = BLACK_WIN if whites_turn else WHITE_WIN
+            elif status == STALEMATE:
+                result = DRAW
+            else:
+                raise ValueError('result is needed for an unfinished game')
+
+        for board, whites_turn in positions:
+            self.add_position(board, whites_turn, result)
+        return len(positions) - 1
+
+    def flush(self) -> None:
+        """(None) Writes any changes through to disk."""
+        self._data.flush()
+        self._index.flush()
+
+    def close(self) -> None:
+        """(None) Flushes and closes the store."""
+        self.flush()
+        self._data.close()
+        self._data_file.close()
+        self._index.close()
+        self._index_file.close()
+
+    def __enter__(self) -> 'PositionStore':
+        """(PositionStore) Returns self, for use in a with statement."""
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """(None) Flushes and closes the store on leaving a with statement."""
+        self.close()
+
+    def _record_offset(self, number: int) -> int:
+        """(int) Returns offset of a record in the data file."""
+        return DATA_HEADER.size + number * RECORD.size
+
+    def _append(self, position_hash: int, packed: bytes,
+                whites_turn: bool) -> int:
+        """(int) Appends an empty record, growing the file if full."""
+        capacity = (len(self._data) - DATA_HEADER.size) // RECORD.size
+        if self._count == capacity:
+            self._data.flush()
+            self._data.close()
+            self._data_file.truncate(self._record_offset(capacity * 2))
+            self._data = mmap.mmap(self._data_file.fileno(), 0)
+
+        number = self._count
+        RECORD.pack_into(self._data, self._record_offset(number),
+                         position_hash, packed, whites_turn, 0, 0, 0)
+        self._count += 1
+        DATA_HEADER.pack_into(self._data, 0, DATA_MAGIC, self._count)
+        return number
+
+    def _find(self, position_hash: int, packed: bytes,
+              whites_turn: bool) -> Tuple[Optional[int], int]:
+        """(Tuple[Optional[int], int]) Returns the record number of a
+        position, or None, and the slot where it is or would be indexed."""
+        mask = self._slots - 1
+        slot = position_hash & mask
+        while True:
+            slot_hash, number = SLOT.unpack_from(self._index,
+                                                 self._slot_offset(slot))
+            if number == 0:
+                return None, slot
+            if slot_hash == position_hash:
+                offset = self._record_offset(number - 1) + 8
+                if self._data[offset:offset + PACKED_SIZE] == packed and \
+                   bool(self._data[offset + PACKED_SIZE]) == whites_turn:
+                    return number - 1, slot
+            slot = (slot + 1) & mask
+
+    def _slot_offset(self, slot: int) -> int:
+        """(int) Returns offset of a slot in the index file."""
+        return INDEX_HEADER.size + slot * SLOT.size
+
+    def _set_slot(self, slot: int, position_hash: int, number: int) -> None:
+        """(None) Points a slot at a record and counts it as indexed."""
+        SLOT.pack_into(self._index, self._slot_offset(slot), position_hash,
+                       number + 1)
+        INDEX_HEADER.pack_into(self._index, 0, INDEX_MAGIC, self._slots,
+                               self._count)
+
+    def _indexed_count(self) -> int:
+        """(int) Returns number of records the index file covers."""
+        return INDEX_HEADER.unpack_from(self._index, 0)[2]
+
+    def _index_size_for(self, count: int) -> int:
+        """(int) Returns a power of two number of slots for count records."""
+        slots = INITIAL_CAPACITY * 2
+        while count > slots * MAX_LOAD_FACTOR:
+            slots *= 2
+        return slots
+
+    def _open_index(self) -> None:
+        """(None) Maps an existing index file."""
+        self._index_file = open(self._index_path, 'r+b')
+        self._index = mmap.mmap(self._index_file.fileno(), 0)
+        magic, self._slots = INDEX_HEADER.unpack_from(self._index, 0)[:2]
+        if magic != INDEX_MAGIC:
+            raise ValueError(f'{self._index_path} is not a position index')
+
+    def _build_index(self, slots: int) -> None:
+        """(None) Writes a fresh index with slots slots covering every
+        record."""
+        if self._index is not None:
+            self._index.close()
+            self._index_file.close()
+        with open(self._index_path, 'wb') as file:
+            file.write(INDEX_HEADER.pack(INDEX_MAGIC, slots, 0))
+            file.truncate(INDEX_HEADER.size + slots * SLOT.size)
+        self._open_index()
+
+        mask = slots - 1
+        for number in range(self._count):
+            position_hash = struct.unpack_from('<Q', self._data,
+                                               self._record_offset(number))[0]
+            slot = position_hash & mask
+            while SLOT.unpack_from(self._index, self._slot_offset(slot))[1]:
+                slot = (slot + 1) & mask
+            SLOT.pack_into(self._index, self._slot_offset(slot),
+                           position_hash, number + 1)
+        INDEX_HEADER.pack_into(self._index, 0, INDEX_MAGIC, slots,
+                               self._count)
+
+    def __repr__(self) -> str:
+        """(str) Returns representation of PositionStore."""
+        return f'PositionStore({self._path!r})'
+
+
+def main():
+    """Entry point to position store ingestion and lookup."""
+    # Imported here, as only the command line reads game files.
+    from chess_games import read_games
+
+    parser = argparse.ArgumentParser(description='Build or query a position '
+                                                 'store.')
+    parser.add_argument('store', help='position store file')
+    parser.add_argument('files', nargs='*', metavar='GAMES_FILE',
+                        help='files of finished games to add, one per line')
+    parser.add_argument('--result', choices=RESULTS,
+                        help='result of every game that is not decided by '
+                             'checkmate or stalemate')
+    parser.add_argument('--lookup', metavar='FEN',
+                        help='print what is known about a position')
+    args = parser.parse_args()
+
+    with PositionStore(args.store) as store:
+        start = time.perf_counter()
+        games = 0
+        for file_name in args.files:
+            with open(file_name, 'r') as file:
+                for line_number, moves in read_games(file):
+                    try:
+                        store.add_game(moves, args.result)
+                        games += 1
+                    except ValueError as error:
+                        print(f'{file_name}:{line_number}: {error}')
+        if args.files:
+            elapsed = time.perf_counter() - start
+            print(f'Added {games} games in {elapsed:.2f}s, '
+                  f'{len(store)} positions stored')
+
+        if args.lookup is not None:
+            board, whites_turn = fen_to_board(args.lookup)
+            start = time.perf_counter()
+            record = store.lookup(board, whites_turn)
+            elapsed = time.perf_counter() - start
+            if record is None:
+                print(f'Not seen ({elapsed * 1e6:.1f} microseconds)')
+            else:
+                print(f'Seen in {record.get_games()} games: '
+                      f'{record.white_wins} white wins, {record.black_wins} '
+                      f'black wins, {record.draws} draws '
+                      f'({elapsed * 1e6:.1f} microseconds)')
+
+if __name__ == "__main__":
+    main()
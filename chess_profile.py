@@ -0,0 +1,238 @@
+"""
+Chess Profiling
+Counts calls to, and time spent in, each stage of move validation. When
+profiling is off nothing is changed, so the stages run at full speed; turning
+it on replaces each stage function, wherever it has been imported, with a
+wrapper which records every call, and turning it off puts the originals back.
+
+Time is recorded against the stack of profiled stages active at the time, and
+can be written as collapsed stacks ("stage;stage;stage microseconds" per
+line), the input format of flamegraph.pl and speedscope.
+
+Profiling is turned on for chess.main() by its --profile or --flamegraph
+options, or by setting CHESS_PROFILE to 1, or to a file to write collapsed
+stacks to.
+"""
+
+import inspect
+import os
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+__author__ = "Harold Shaw, 47020665"
+__email__ = "s4702066@student.uq.edu.au"
+
+PROFILE_VARIABLE = 'CHESS_PROFILE'
+
+# Stages profiled by default. get_possible_moves() and is_in_check() are the
+# a1_support versions; chess itself finds moves with get_piece_targets() and
+# checks with get_checks_and_pins().
+DEFAULT_STAGES = (
+    'make_a_move',
+    'is_move_valid',
+    'get_possible_moves',
+    'get_piece_targets',
+    'is_in_check',
+    'get_checks_and_pins',
+    'update_board',
+    'generate_legal_moves',
+    'check_game_over',
+)
+
+# Calls and seconds spent in a stage.
+StageStats = Tuple[int, float]
+
+
+def get_profile_setting() -> Tuple[bool, Optional[str]]:
+    """Reads the CHESS_PROFILE environment variable.
+
+    Returns:
+        (Tuple[bool, Optional[str]]): True iff profiling is requested, and
+            the file to write collapsed stacks to, if one is named.
+    """
+    value = os.environ.get(PROFILE_VARIABLE, '')
+    if value == '' or value == '0':
+        return False, None
+    if value == '1':
+        return True, None
+    return True, value
+
+
+class Profiler(object):
+    """A class representing call counts and times of the profiled stages."""
+    def __init__(self) -> None:
+        """Constructs a Profiler with profiling off.
+
+        Returns:
+            (None)
+        """
+        self._calls = {}
+        self._seconds = {}
+        # Microseconds spent in each stack of stages, excluding the time
+        # spent in stages called from the innermost one.
+        self._stacks = {}
+        # (stage, start time, seconds spent in stages it called) per active
+        # call, innermost last.
+        self._active = []
+        # (module, name, original function) of each wrapper installed.
+        self._patched = []
+
+    def is_enabled(self) -> bool:
+        """(bool) True iff profiling is on."""
+        return len(self._patched) > 0
+
+    def enable(self, stages: Tuple[str, ...] = DEFAULT_STAGES) -> None:
+        """Turns profiling on, wrapping every function named in stages held
+        by a loaded module. This includes chess run as a script, which is
+        loaded as __main__ rather than chess.
+
+        Parameters:
+            stages (Tuple[str, ...]): Names of the functions to profile.
+
+        Returns:
+            (None)
+        """
+        if self.is_enabled():
+            return
+        # One wrapper per function, however many modules import it.
+        wrappers = {}
+        for module in list(sys.modules.values()):
+            for stage in stages:
+                try:
+                    original = getattr(module, stage, None)
+                except Exception:
+                    # Some modules compute attributes lazily on lookup.
+                    continue
+                if not inspect.isfunction(original):
+                    continue
+                if original not in wrappers:
+                    wrappers[original] = self._wrap(stage, original)
+                setattr(module, stage, wrappers[original])
+                self._patched.append((module, stage, original))
+
+    def disable(self) -> None:
+        """(None) Turns profiling off, restoring the original functions."""
+        for module, stage, original in self._patched:
+            setattr(module, stage, original)
+        self._patched = []
+
+    def reset(self) -> None:
+        """(None) Clears every count and time recorded."""
+        self._calls = {}
+        self._seconds = {}
+        self._stacks = {}
+
+    def snapshot(self) -> Dict[str, StageStats]:
+        """Returns the counts and times recorded so far.
+
+        Returns:
+            (Dict[str, StageStats]): Calls and seconds of each stage called,
+                seconds including time in the stages it called.
+        """
+        return {stage: (self._calls[stage], self._seconds[stage])
+                for stage in self._calls}
+
+    def write_collapsed(self, file_name: str) -> int:
+        """Writes the time spent in each stack of stages in the collapsed
+        stack format read by flamegraph.pl.
+
+        Parameters:
+            file_name (str): File to write.
+
+        Returns:
+            (int): Number of stacks written.
+        """
+        with open(file_name, 'w') as file:
+            for stack in sorted(self._stacks):
+                microseconds = round(self._stacks[stack])
+                if microseconds > 0:
+                    file.write(f'{";".join(stack)} {microseconds}\n')
+        return len(self._stacks)
+
+    def _record(self, count: bool = True) -> None:
+        """(None) Records the end of the innermost active call, counting it
+        as a call unless count is False."""
+        now = time.perf_counter()
+        stage, start, child_seconds = self._active.pop()
+        elapsed = now - start
+        if count == True:
+            self._calls[stage] = self._calls.get(stage, 0) + 1
+        self._seconds[stage] = self._seconds.get(stage, 0.0) + elapsed
+        stack = tuple(call[0] for call in self._active) + (stage,)
+        self._stacks[stack] = (self._stacks.get(stack, 0.0)
+                               + (elapsed - child_seconds) * 1e6)
+        if len(self._active) > 0:
+            parent = self._active[-1]
+            self._active[-1] = (parent[0], parent[1], parent[2] + elapsed)
+
+    def _wrap(self, stage: str, original: Callable) -> Callable:
+        """(Callable) Returns a function recording each call to original."""
+        active = self._active
+
+        if inspect.isgeneratorfunction(original):
+            # Only time spent producing each item counts, not time the
+            # caller spends between items.
+            def wrapper(*args, **kwargs):
+                iterator = original(*args, **kwargs)
+                first = True
+                while True:
+                    active.append((stage, time.perf_counter(), 0.0))
+                    try:
+                        item = next(iterator)
+                    except StopIteration:
+                        self._record(first)
+                        return
+                    except BaseException:
+                        self._record(first)
+                        raise
+                    self._record(first)
+                    first = False
+                    yield item
+        else:
+            def wrapper(*args, **kwargs):
+                active.append((stage, time.perf_counter(), 0.0))
+                try:
+                    return original(*args, **kwargs)
+                finally:
+                    self._record()
+
+        wrapper.__name__ = original.__name__
+        wrapper.__doc__ = original.__doc__
+        wrapper.__wrapped__ = original
+        return wrapper
+
+
+def format_snapshot(snapshot: Dict[str, StageStats],
+                    previous: Optional[Dict[str, StageStats]] = None
+                    ) -> List[str]:
+    """Describes the stages called, one line each, busiest first.
+
+    Parameters:
+        snapshot (Dict[str, StageStats]): A Profiler.snapshot().
+        previous (Optional[Dict[str, StageStats]]): An earlier snapshot, to
+            describe only the calls made since.
+
+    Returns:
+        (List[str]): Lines of the form "stage: calls, milliseconds".
+    """
+    if previous is None:
+        previous = {}
+    lines = []
+    for stage, (calls, seconds) in sorted(snapshot.items(),
+                                          key=lambda item: -item[1][1]):
+        previous_calls, previous_seconds = previous.get(stage, (0, 0.0))
+        if calls == previous_calls:
+            continue
+        lines.append(f'{stage}: {calls - previous_calls} calls, '
+                     f'{(seconds - previous_seconds) * 1000:.3f}ms')
+    return lines
+
+_profiler = None
+
+def get_profiler() -> Profiler:
+    """(Profiler) Returns the profiler shared by every caller."""
+    global _profiler
+    if _profiler is None:
+        _profiler = Profiler()
+    return _profiler
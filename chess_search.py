@@ -0,0 +1,571 @@
+"""
+Chess Search
+A computer opponent for the chess game: iterative deepening alpha-beta search
+over the moves accepted by is_move_valid(), with a material and piece-square
+evaluation.
+
+Usage:
+    python chess_search.py [--time SECONDS] [--black] [--book BOOK_FILE]
+        [--tablebase DIRECTORY]
+"""
+
+import argparse
+import time
+from typing import List, Optional, Tuple
+
+from a1_support import *
+from chess import (FROM_SHIFT, NUM_MOVE_CODES, MutableBoard, change_turn,
+                   check_game_over, encode_move, generate_legal_moves,
+                   get_checks_and_pins, initial_state, interpret_move,
+                   make_a_move, print_board, process_move, update_board)
+from chess_draws import GameState
+from chess_tables import get_attack_tables
+from chess_zobrist import BLACK_TO_MOVE_KEY, hash_position, update_hash
+
+__author__ = "Harold Shaw, 47020665"
+__email__ = "s4702066@student.uq.edu.au"
+
+# Builds the attack tables on import rather than inside the first timed call.
+get_attack_tables()
+
+# Material values in centipawns, indexed by lowercase piece.
+PIECE_VALUES = {'p': 100, 'n': 320, 'b': 330, 'r': 500, 'q': 900, 'k': 0}
+
+# Piece-square bonuses from white's point of view, row 0 being black's back
+# rank as in Board. Black pieces read the table with rows mirrored.
+PIECE_SQUARE_TABLES = {
+    'p': (
+          0,   0,   0,   0,   0,   0,   0,   0,
+         50,  50,  50,  50,  50,  50,  50,  50,
+         10,  10,  20,  30,  30,  20,  10,  10,
+          5,   5,  10,  25,  25,  10,   5,   5,
+          0,   0,   0,  20,  20,   0,   0,   0,
+          5,  -5, -10,   0,   0, -10,  -5,   5,
+          5,  10,  10, -20, -20,  10,  10,   5,
+          0,   0,   0,   0,   0,   0,   0,   0),
+    'n': (
+        -50, -40, -30, -30, -30, -30, -40, -50,
+        -40, -20,   0,   0,   0,   0, -20, -40,
+        -30,   0,  10,  15,  15,  10,   0, -30,
+        -30,   5,  15,  20,  20,  15,   5, -30,
+        -30,   0,  15,  20,  20,  15,   0, -30,
+        -30,   5,  10,  15,  15,  10,   5, -30,
+        -40, -20,   0,   5,   5,   0, -20, -40,
+        -50, -40, -30, -30, -30, -30, -40, -50),
+    'b': (
+        -20, -10, -10, -10, -10, -10, -10, -20,
+        -10,   0,   0,   0,   0,   0,   0, -10,
+        -10,   0,   5,  10,  10,   5,   0, -10,
+        -10,   5,   5,  10,  10,   5,   5, -10,
+        -10,   0,  10,  10,  10,  10,   0, -10,
+        -10,  10,  10,  10,  10,  10,  10, -10,
+        -10,   5,   0,   0,   0,   0,   5, -10,
+        -20, -10, -10, -10, -10, -10, -10, -20),
+    'r': (
+          0,   0,   0,   0,   0,   0,   0,   0,
+          5,  10,  10,  10,  10,  10,  10,   5,
+         -5,   0,   0,   0,   0,   0,   0,  -5,
+         -5,   0,   0,   0,   0,   0,   0,  -5,
+         -5,   0,   0,   0,   0,   0,   0,  -5,
+         -5,   0,   0,   0,   0,   0,   0,  -5,
+         -5,   0,   0,   0,   0,   0,   0,  -5,
+          0,   0,   0,   5,   5,   0,   0,   0),
+    'q': (
+        -20, -10, -10,  -5,  -5, -10, -10, -20,
+        -10,   0,   0,   0,   0,   0,   0, -10,
+        -10,   0,   5,   5,   5,   5,   0, -10,
+         -5,   0,   5,   5,   5,   5,   0,  -5,
+          0,   0,   5,   5,   5,   5,   0,  -5,
+        -10,   5,   5,   5,   5,   5,   0, -10,
+        -10,   0,   5,   0,   0,   0,   0, -10,
+        -20, -10, -10,  -5,  -5, -10, -10, -20),
+    'k': (
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -20, -30, -30, -40, -40, -30, -30, -20,
+        -10, -20, -20, -20, -20, -20, -20, -10,
+         20,  20,   0,   0,   0,   0,  20,  20,
+         20,  30,  10,   0,   0,  10,  30,  20),
+}
+
+MATE_SCORE = 100000
+INFINITY = MATE_SCORE + 1
+MAX_DEPTH = 64
+
+# How many nodes are searched between checks of the clock.
+TIME_CHECK_INTERVAL = 1024
+
+# Move ordering scores. Captures are ordered most valuable victim, least
+# valuable attacker first, ahead of the two killer moves at each ply.
+CAPTURE_ORDER = 1000000
+KILLER_ORDER = (900000, 800000)
+HASH_MOVE_ORDER = 2000000
+
+# Kinds of score stored in a transposition table entry.
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+
+class SearchTimeout(Exception):
+    """Raised inside a search when its time budget has run out."""
+    pass
+
+
+class SearchResult(object):
+    """A class representing the outcome of searching a position."""
+    def __init__(self, move: Optional[Move], score: int, depth: int,
+                 nodes: int, elapsed: float) -> None:
+        """Constructs a SearchResult.
+
+        Parameters:
+            move (Optional[Move]): Best move found, None if there are none.
+            score (int): Score of move in centipawns for the side to move.
+            depth (int): Deepest fully completed iteration.
+            nodes (int): Number of positions searched.
+            elapsed (float): Time taken in seconds.
+
+        Returns:
+            (None)
+        """
+        self.move = move
+        self.score = score
+        self.depth = depth
+        self.nodes = nodes
+        self.elapsed = elapsed
+
+    def get_nodes_per_second(self) -> float:
+        """(float) Returns search speed in positions per second."""
+        if self.elapsed <= 0:
+            return float(self.nodes)
+        return self.nodes / self.elapsed
+
+    def __repr__(self) -> str:
+        """(str) Returns representation of SearchResult."""
+        return (f'SearchResult(move={self.move}, score={self.score}, '
+                f'depth={self.depth}, nodes={self.nodes}, '
+                f'nps={self.get_nodes_per_second():.0f})')
+
+
+def evaluate(board: Board) -> int:
+    """Scores board by material and piece placement.
+
+    Parameters:
+        board (Board): The current state of the board.
+
+    Returns:
+        (int): Score in centipawns, positive when white is better.
+    """
+    score = 0
+    for row_index, row in enumerate(board):
+        for col_index, character in enumerate(row):
+            if character == EMPTY:
+                continue
+            kind = character.lower()
+            if character in WHITE_PIECES:
+                square = row_index * BOARD_SIZE + col_index
+                score += PIECE_VALUES[kind] + PIECE_SQUARE_TABLES[kind][square]
+            else:
+                square = (BOARD_SIZE - 1 - row_index) * BOARD_SIZE + col_index
+                score -= PIECE_VALUES[kind] + PIECE_SQUARE_TABLES[kind][square]
+    return score
+
+
+class Searcher(object):
+    """A class representing an alpha-beta search with iterative deepening.
+
+    Killer moves and history scores are kept between iterations and between
+    calls to search(), so they carry over from one move of a game to the next.
+    Moves are made and taken back on one MutableBoard per search rather than
+    copying the board at every node.
+
+    An optional transposition table may be given, providing
+    probe(position_hash) -> Optional[(depth, score, kind, move)] and
+    store(position_hash, depth, score, kind, move), where kind is one of
+    EXACT, LOWER_BOUND or UPPER_BOUND.
+
+    An optional chess_book.OpeningBook and chess_tablebase.Tablebase are
+    consulted, in that order, before searching, and their move is played
+    without a search whenever they have one.
+    """
+    def __init__(self, time_limit: float = 1.0,
+                 max_depth: int = MAX_DEPTH, table: object = None,
+                 book: object = None, tablebase: object = None) -> None:
+        """Constructs a Searcher.
+
+        Parameters:
+            time_limit (float): Seconds allowed per call to search().
+            max_depth (int): Deepest iteration to attempt.
+            table (object): Transposition table shared between searches, or
+                None to search without one.
+            book (object): Opening book, or None.
+            tablebase (object): Endgame tablebase, or None.
+
+        Returns:
+            (None)
+        """
+        self._time_limit = time_limit
+        self._max_depth = max_depth
+        self._table = table
+        self._book = book
+        self._tablebase = tablebase
+        # Killer moves and history scores are kept by chess.encode_move()
+        # code, without flags, so they compare and index as integers.
+        self._killers = [[-1, -1] for ply in range(MAX_DEPTH + 1)]
+        self._history = [0] * NUM_MOVE_CODES
+        self._nodes = 0
+        self._deadline = 0.0
+
+    def search(self, board: Board, whites_turn: bool) -> SearchResult:
+        """Finds the best move for the player whose turn it is.
+
+        Parameters:
+            board (Board): The current state of the board.
+            whites_turn (bool): True iff it is white's turn.
+
+        Returns:
+            (SearchResult): Best move from the deepest completed iteration.
+        """
+        start = time.perf_counter()
+        self._deadline = start + self._time_limit
+        self._nodes = 0
+
+        moves = generate_legal_moves(board, whites_turn)
+        if len(moves) == 0:
+            king, checks, pins = get_checks_and_pins(board, whites_turn)
+            score = -MATE_SCORE if len(checks) > 0 else 0
+            return SearchResult(None, score, 0, 0, 0.0)
+
+        if self._book is not None:
+            move = self._book.choose_move(board, whites_turn)
+            if move is not None:
+                return SearchResult(move, 0, 0, 0,
+                                    time.perf_counter() - start)
+        if self._tablebase is not None:
+            probed = self._tablebase.best_move(board, whites_turn)
+            if probed is not None:
+                return SearchResult(probed[0], probed[1], 0, 0,
+                                    time.perf_counter() - start)
+
+        position_hash = hash_position(board, whites_turn)
+        position = MutableBoard(board)
+        best_move = moves[0]
+        best_score = 0
+        completed_depth = 0
+        for depth in range(1, self._max_depth + 1):
+            try:
+                score, move = self._search_root(position, whites_turn, moves,
+                                                depth, best_move,
+                                                position_hash)
+            except SearchTimeout:
+                break
+            best_score = score
+            best_move = move
+            completed_depth = depth
+            # Stop early once a forced mate has been found.
+            if abs(score) >= MATE_SCORE - MAX_DEPTH:
+                break
+
+        elapsed = time.perf_counter() - start
+        return SearchResult(best_move, best_score, completed_depth,
+                            self._nodes, elapsed)
+
+    def score_move(self, board: Board, whites_turn: bool, move: Move,
+                   depth: int, alpha: int = -INFINITY,
+                   deadline: Optional[float] = None) -> int:
+        """Scores a single root move by searching the position after it.
+
+        Used to split the root moves of a search between processes.
+
+        Parameters:
+            board (Board): The current state of the board.
+            whites_turn (bool): True iff it is white's turn.
+            move (Move): A legal move in board.
+            depth (int): Depth of the search, counting move itself.
+            alpha (int): Score already achieved by another root move; lower
+                scores are reported as alpha.
+            deadline (Optional[float]): time.time() at which to give up, or
+                None to use this Searcher's time limit.
+
+        Returns:
+            (int): Score of move for the player whose turn it is.
+
+        Raises:
+            SearchTimeout: If the deadline passes before the search ends.
+        """
+        if deadline is None:
+            self._deadline = time.perf_counter() + self._time_limit
+        else:
+            self._deadline = time.perf_counter() + (deadline - time.time())
+        child_hash = self._child_hash(hash_position(board, whites_turn),
+                                      board, move)
+        position = MutableBoard(board)
+        position.make_move(move)
+        return -self._alpha_beta(position, not whites_turn, depth - 1, 1,
+                                 -INFINITY, -alpha, child_hash)
+
+    def get_nodes(self) -> int:
+        """(int) Returns nodes searched since the last call to search()."""
+        return self._nodes
+
+    def _child_hash(self, position_hash: int, board: MutableBoard,
+                    move: Move) -> int:
+        """(int) Returns hash of the position after move, side included."""
+        return update_hash(position_hash, board, move) ^ BLACK_TO_MOVE_KEY
+
+    def _search_root(self, board: MutableBoard, whites_turn: bool,
+                     moves: List[Move], depth: int, previous_best: Move,
+                     position_hash: int) -> Tuple[int, Move]:
+        """(Tuple[int, Move]) Searches every root move to depth, trying the
+        previous iteration's best move first."""
+        ordered = self._order_moves(board, moves, 0)
+        ordered.remove(previous_best)
+        ordered.insert(0, previous_best)
+
+        alpha = -INFINITY
+        best_move = ordered[0]
+        for move in ordered:
+            child_hash = self._child_hash(position_hash, board, move)
+            board.make_move(move)
+            score = -self._alpha_beta(board, not whites_turn, depth - 1, 1,
+                                      -INFINITY, -alpha, child_hash)
+            board.unmake_move()
+            if score > alpha:
+                alpha = score
+                best_move = move
+        return alpha, best_move
+
+    def _alpha_beta(self, board: MutableBoard, whites_turn: bool, depth: int,
+                    ply: int, alpha: int, beta: int,
+                    position_hash: int) -> int:
+        """(int) Returns negamax score of board for the side to move."""
+        self._count_node()
+        if depth <= 0:
+            return self._quiesce(board, whites_turn, alpha, beta)
+
+        hash_move = None
+        if self._table is not None:
+            entry = self._table.probe(position_hash)
+            if entry is not None:
+                entry_depth, score, kind, hash_move = entry
+                if entry_depth >= depth:
+                    score = self._score_from_table(score, ply)
+                    if kind == EXACT:
+                        return score
+                    if kind == LOWER_BOUND and score >= beta:
+                        return beta
+                    if kind == UPPER_BOUND and score <= alpha:
+                        return alpha
+
+        moves = generate_legal_moves(board, whites_turn)
+        if len(moves) == 0:
+            king, checks, pins = get_checks_and_pins(board, whites_turn)
+            if len(checks) > 0:
+                return -MATE_SCORE + ply
+            return 0
+
+        original_alpha = alpha
+        best_move = None
+        for move in self._order_moves(board, moves, ply, hash_move):
+            child_hash = self._child_hash(position_hash, board, move)
+            board.make_move(move)
+            score = -self._alpha_beta(board, not whites_turn, depth - 1,
+                                      ply + 1, -beta, -alpha, child_hash)
+            board.unmake_move()
+            if score >= beta:
+                if board[move[1][0]][move[1][1]] == EMPTY:
+                    self._record_cutoff(move, depth, ply)
+                self._store(position_hash, depth, ply, beta, LOWER_BOUND, move)
+                return beta
+            if score > alpha:
+                alpha = score
+                best_move = move
+
+        if alpha > original_alpha:
+            self._store(position_hash, depth, ply, alpha, EXACT, best_move)
+        else:
+            self._store(position_hash, depth, ply, alpha, UPPER_BOUND, None)
+        return alpha
+
+    def _store(self, position_hash: int, depth: int, ply: int, score: int,
+               kind: int, move: Optional[Move]) -> None:
+        """(None) Stores a result in the transposition table, if any.
+
+        Mate scores are stored relative to the stored position rather than
+        the root, so they stay correct when reached by another path."""
+        if self._table is None:
+            return None
+        if score > MATE_SCORE - MAX_DEPTH:
+            score += ply
+        elif score < -MATE_SCORE + MAX_DEPTH:
+            score -= ply
+        self._table.store(position_hash, depth, score, kind, move)
+
+    def _score_from_table(self, score: int, ply: int) -> int:
+        """(int) Converts a stored mate score back to be relative to the
+        root."""
+        if score > MATE_SCORE - MAX_DEPTH:
+            return score - ply
+        if score < -MATE_SCORE + MAX_DEPTH:
+            return score + ply
+        return score
+
+    def _quiesce(self, board: MutableBoard, whites_turn: bool, alpha: int,
+                 beta: int) -> int:
+        """(int) Returns score of board after resolving pending captures."""
+        stand_pat = evaluate(board)
+        if whites_turn == False:
+            stand_pat = -stand_pat
+        if stand_pat >= beta:
+            return beta
+        if stand_pat > alpha:
+            alpha = stand_pat
+
+        captures = [move for move in generate_legal_moves(board, whites_turn)
+                    if board[move[1][0]][move[1][1]] != EMPTY]
+        captures.sort(key=lambda move: self._capture_order(board, move),
+                      reverse=True)
+        for move in captures:
+            self._count_node()
+            board.make_move(move)
+            score = -self._quiesce(board, not whites_turn, -beta, -alpha)
+            board.unmake_move()
+            if score >= beta:
+                return beta
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    def _count_node(self) -> None:
+        """(None) Counts a node, raising SearchTimeout once out of time."""
+        self._nodes += 1
+        if self._nodes % TIME_CHECK_INTERVAL == 0 and \
+           time.perf_counter() >= self._deadline:
+            raise SearchTimeout()
+
+    def _capture_order(self, board: MutableBoard, move: Move) -> int:
+        """(int) Returns most valuable victim, least valuable attacker score
+        of a capture."""
+        victim = board[move[1][0]][move[1][1]].lower()
+        attacker = board[move[0][0]][move[0][1]].lower()
+        return PIECE_VALUES[victim] * 10 - PIECE_VALUES[attacker]
+
+    def _order_moves(self, board: MutableBoard, moves: List[Move], ply: int,
+                     hash_move: Optional[Move] = None) -> List[Move]:
+        """(List[Move]) Returns moves ordered by the transposition table's
+        best move, then captures, then killer moves, then history score."""
+        killers = self._killers[ply]
+        history = self._history
+
+        def order(move: Move) -> int:
+            if move == hash_move:
+                return HASH_MOVE_ORDER
+            if board[move[1][0]][move[1][1]] != EMPTY:
+                return CAPTURE_ORDER + self._capture_order(board, move)
+            code = ((move[0][0] * BOARD_SIZE + move[0][1]) << FROM_SHIFT
+                    | move[1][0] * BOARD_SIZE + move[1][1])
+            if code == killers[0]:
+                return KILLER_ORDER[0]
+            if code == killers[1]:
+                return KILLER_ORDER[1]
+            return history[code]
+
+        return sorted(moves, key=order, reverse=True)
+
+    def _record_cutoff(self, move: Move, depth: int, ply: int) -> None:
+        """(None) Remembers a quiet move which caused a beta cutoff."""
+        code = encode_move(move)
+        killers = self._killers[ply]
+        if killers[0] != code:
+            killers[1] = killers[0]
+            killers[0] = code
+        self._history[code] += depth * depth
+
+
+def format_move(move: Move) -> str:
+    """Converts a move to the "letternum letternum" form typed by players.
+
+    Parameters:
+        move (Move): A move of format ((row, col), (row, col)).
+
+    Returns:
+        (str): The move as two squares, e.g. "e2 e4".
+    """
+    squares = []
+    for row, col in move:
+        squares.append('abcdefgh'[col] + str(BOARD_SIZE - row))
+    return ' '.join(squares)
+
+def main():
+    """Entry point to gameplay against the computer."""
+    parser = argparse.ArgumentParser(description='Play chess against the '
+                                                 'computer.')
+    parser.add_argument('--time', type=float, default=2.0,
+                        help='seconds the computer may think per move')
+    parser.add_argument('--black', action='store_true',
+                        help='play black instead of white')
+    parser.add_argument('--book', metavar='BOOK_FILE',
+                        help='opening book written by chess_book.py')
+    parser.add_argument('--tablebase', metavar='DIRECTORY',
+                        help='endgame tables written by chess_tablebase.py')
+    args = parser.parse_args()
+
+    # Imported here, as chess_tablebase imports this module.
+    from chess_book import OpeningBook
+    from chess_tablebase import Tablebase
+    book = None if args.book is None else OpeningBook(args.book)
+    tablebase = None if args.tablebase is None else Tablebase(args.tablebase)
+    searcher = Searcher(time_limit=args.time, book=book, tablebase=tablebase)
+    computer_is_white = args.black
+    board = initial_state()
+    print_board(board)
+
+    whites_turn = True
+    game_state = GameState(board, whites_turn)
+
+    while True:
+        if whites_turn == computer_is_white:
+            result = searcher.search(board, whites_turn)
+            print(f'\nComputer plays {format_move(result.move)} '
+                  f'(depth {result.depth}, {result.nodes} nodes, '
+                  f'{result.get_nodes_per_second():.0f} nodes/s, '
+                  f'score {result.score})\n')
+            game_state.update(board, result.move)
+            board = update_board(board, result.move)
+        else:
+            if whites_turn == True:
+                move = str(input("\nWhite's move: "))
+            else:
+                move = str(input("\nBlack's move: "))
+
+            if interpret_move(move) == 'HELP':
+                print(HELP_MESSAGE)
+                print_board(board)
+                continue
+            elif interpret_move(move) == 'QUIT':
+                quit_confirm = input("Are you sure you want to quit? ")
+                if quit_confirm == 'y' or quit_confirm == 'Y':
+                    break
+                print_board(board)
+                continue
+
+            test_board = make_a_move(board, move, whites_turn)
+            if test_board == False:
+                print("Invalid move\n")
+                print_board(board)
+                continue
+            game_state.update(board, process_move(move))
+            board = test_board
+
+        print_board(board)
+        whites_turn = change_turn(whites_turn)
+        result = check_game_over(board, whites_turn, game_state)
+        if result.get_message() is not None:
+            print("\n" + result.get_message())
+        if result.is_over() == True:
+            break
+
+if __name__ == "__main__":
+    main()
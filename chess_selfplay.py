@@ -0,0 +1,287 @@
+"""
+Chess Self-Play
+Plays computer-vs-computer games of chess without any printing, across a pool
+of processes, and writes one line per game to a results file.
+
+Each game starts from an opening line, taken in turn from an opening book, so
+a tournament is reproducible when both players search to a fixed depth. Each
+opening is played twice with the players swapping colours.
+
+Usage:
+    python chess_selfplay.py RESULTS_FILE [--games N] [--depth A B]
+        [--time A B] [--openings OPENINGS_FILE] [--jobs N]
+"""
+
+import argparse
+import multiprocessing
+import time
+from typing import List, Tuple
+
+from a1_support import *
+from chess import CHECKMATE as CHECKMATE_STATUS
+from chess import STALEMATE as STALEMATE_STATUS
+from chess import (check_game_over, initial_state, position_to_square,
+                   process_move, update_board, validate_game)
+from chess_draws import GameState
+from chess_positions import BLACK_WIN, DRAW, WHITE_WIN
+from chess_search import Searcher
+
+__author__ = "Harold Shaw, 47020665"
+__email__ = "s4702066@student.uq.edu.au"
+
+# Reasons a game ended.
+CHECKMATE = 'checkmate'
+STALEMATE = 'stalemate'
+MOVE_LIMIT = 'move-limit'
+
+DEFAULT_MAX_PLIES = 300
+
+# Used when no opening book is given.
+DEFAULT_OPENINGS = (
+    ('e2 e4', 'e7 e5'),
+    ('d2 d4', 'd7 d5'),
+    ('e2 e4', 'c7 c5'),
+    ('d2 d4', 'g8 f6', 'c2 c4', 'e7 e6'),
+    ('c2 c4', 'e7 e5'),
+    ('g1 f3', 'd7 d5'),
+    ('e2 e4', 'e7 e6'),
+    ('e2 e4', 'c7 c6'),
+)
+
+RESULTS_HEADER = ('game', 'opening', 'white', 'black', 'result', 'reason',
+                  'plies', 'moves', 'move_ms')
+
+# Player settings: (name, depth limit, seconds per move).
+PlayerConfig = Tuple[str, int, float]
+
+
+class GameRecord(object):
+    """A class representing a finished self-play game."""
+    def __init__(self, game: int, opening: int, white: str, black: str,
+                 result: str, reason: str, moves: List[str],
+                 move_times: List[float]) -> None:
+        """Constructs a GameRecord.
+
+        Parameters:
+            game (int): Number of the game in the tournament.
+            opening (int): Index of the opening line in the book.
+            white (str): Name of the player with white.
+            black (str): Name of the player with black.
+            result (str): WHITE_WIN, BLACK_WIN or DRAW.
+            reason (str): CHECKMATE, STALEMATE, MOVE_LIMIT or a draw reason
+                of chess_draws.
+            moves (List[str]): Every move played, opening included.
+            move_times (List[float]): Seconds spent choosing each move played
+                after the opening.
+
+        Returns:
+            (None)
+        """
+        self.game = game
+        self.opening = opening
+        self.white = white
+        self.black = black
+        self.result = result
+        self.reason = reason
+        self.moves = moves
+        self.move_times = move_times
+
+    def to_line(self) -> str:
+        """(str) Returns the game as a tab-separated line, moves written
+        without spaces, e.g. "e2e4"."""
+        moves = ' '.join(move.replace(' ', '') for move in self.moves)
+        move_ms = ','.join(str(round(seconds * 1000))
+                           for seconds in self.move_times)
+        return '\t'.join((str(self.game), str(self.opening), self.white,
+                          self.black, self.result, self.reason,
+                          str(len(self.moves)), moves, move_ms))
+
+    def __repr__(self) -> str:
+        """(str) Returns representation of GameRecord."""
+        return (f'GameRecord({self.game}, {self.white} vs {self.black}, '
+                f'{self.result} by {self.reason} in {len(self.moves)} plies)')
+
+
+def play_game(game: int, opening: int, opening_moves: Tuple[str, ...],
+              white: PlayerConfig, black: PlayerConfig,
+              max_plies: int = DEFAULT_MAX_PLIES) -> GameRecord:
+    """Plays one game between two computer players to completion.
+
+    Parameters:
+        game (int): Number of the game in the tournament.
+        opening (int): Index of the opening line in the book.
+        opening_moves (Tuple[str, ...]): Moves played before the players take
+            over, of the form "letternum letternum".
+        white (PlayerConfig): Settings of the player with white.
+        black (PlayerConfig): Settings of the player with black.
+        max_plies (int): Plies after which the game is drawn, if no other
+            draw rule has ended it.
+
+    Returns:
+        (GameRecord): The finished game.
+    """
+    board = initial_state()
+    whites_turn = True
+    game_state = GameState(board, whites_turn)
+    moves = list(opening_moves)
+    for ply, next_board, status in validate_game(opening_moves):
+        game_state.update(board, process_move(opening_moves[ply - 1]))
+        board = next_board
+        whites_turn = not whites_turn
+
+    searchers = {
+        True: Searcher(time_limit=white[2], max_depth=white[1]),
+        False: Searcher(time_limit=black[2], max_depth=black[1]),
+    }
+    move_times = []
+    result = DRAW
+    reason = MOVE_LIMIT
+
+    # The game is checked before the move limit, so a mate or stalemate on
+    # the last ply allowed, or within the opening, is still recorded.
+    while True:
+        game_over = check_game_over(board, whites_turn, game_state)
+        if game_over.status == CHECKMATE_STATUS:
+            result = BLACK_WIN if whites_turn else WHITE_WIN
+            reason = CHECKMATE
+            break
+        if game_over.status == STALEMATE_STATUS:
+            reason = STALEMATE
+            break
+        if game_over.draw_reason is not None:
+            reason = game_over.draw_reason
+            break
+        if len(moves) >= max_plies:
+            break
+
+        start = time.perf_counter()
+        move = searchers[whites_turn].search(board, whites_turn).move
+        move_times.append(time.perf_counter() - start)
+
+        moves.append(position_to_square(move[0]) + ' '
+                     + position_to_square(move[1]))
+        game_state.update(board, move)
+        board = update_board(board, move)
+        whites_turn = not whites_turn
+
+    return GameRecord(game, opening, white[0], black[0], result, reason,
+                      moves, move_times)
+
+def _play_game_task(task: Tuple) -> GameRecord:
+    """(GameRecord) Unpacks a pool task for play_game()."""
+    return play_game(*task)
+
+def read_openings(file_name: str) -> List[Tuple[str, ...]]:
+    """Reads an opening book in the games file format of chess_games.
+
+    Parameters:
+        file_name (str): File of opening lines, one per line.
+
+    Returns:
+        (List[Tuple[str, ...]]): The opening lines, each checked to be legal.
+    """
+    # Imported here, as only the command line reads opening books.
+    from chess_games import read_games
+
+    openings = []
+    with open(file_name, 'r') as file:
+        for line_number, moves in read_games(file):
+            for ply, board, status in validate_game(moves):
+                pass
+            openings.append(tuple(moves))
+    return openings
+
+def run_tournament(games: int, players: Tuple[PlayerConfig, PlayerConfig],
+                   openings: List[Tuple[str, ...]], results_file: str,
+                   jobs: int = 1,
+                   max_plies: int = DEFAULT_MAX_PLIES) -> List[GameRecord]:
+    """Plays a tournament between two players, writing each game to
+    results_file as it finishes.
+
+    Parameters:
+        games (int): Number of games to play.
+        players (Tuple[PlayerConfig, PlayerConfig]): The two players.
+        openings (List[Tuple[str, ...]]): Opening lines to start games from.
+        results_file (str): File to write results to.
+        jobs (int): Number of processes to play games in.
+        max_plies (int): Plies after which a game is drawn.
+
+    Returns:
+        (List[GameRecord]): Every game, in the order they finished.
+    """
+    tasks = []
+    for game in range(games):
+        opening = (game // 2) % len(openings)
+        # Swaps colours on every second game, so each opening is played from
+        # both sides.
+        first, second = players if game % 2 == 0 else players[::-1]
+        tasks.append((game, opening, openings[opening], first, second,
+                      max_plies))
+
+    records = []
+    with open(results_file, 'w') as file:
+        file.write('\t'.join(RESULTS_HEADER) + '\n')
+        if jobs > 1:
+            with multiprocessing.Pool(jobs) as pool:
+                for record in pool.imap_unordered(_play_game_task, tasks):
+                    file.write(record.to_line() + '\n')
+                    records.append(record)
+        else:
+            for task in tasks:
+                record = _play_game_task(task)
+                file.write(record.to_line() + '\n')
+                records.append(record)
+    return records
+
+def main():
+    """Entry point to self-play tournaments."""
+    parser = argparse.ArgumentParser(description='Play computer-vs-computer '
+                                                 'games.')
+    parser.add_argument('results', metavar='RESULTS_FILE',
+                        help='file to write one line per game to')
+    parser.add_argument('--games', type=int, default=16,
+                        help='number of games to play (default 16)')
+    parser.add_argument('--depth', type=int, nargs=2, default=[3, 3],
+                        metavar=('A', 'B'),
+                        help='depth limit of each player (default 3 3)')
+    parser.add_argument('--time', type=float, nargs=2,
+                        default=[float('inf'), float('inf')],
+                        metavar=('A', 'B'),
+                        help='seconds per move of each player (default no '
+                             'limit, which keeps games reproducible)')
+    parser.add_argument('--openings', metavar='OPENINGS_FILE',
+                        help='opening book in the games file format')
+    parser.add_argument('--max-plies', type=int, default=DEFAULT_MAX_PLIES,
+                        help='plies after which a game is drawn')
+    parser.add_argument('--jobs', type=int, default=multiprocessing.cpu_count(),
+                        help='number of processes to play games in')
+    args = parser.parse_args()
+
+    players = (('A', args.depth[0], args.time[0]),
+               ('B', args.depth[1], args.time[1]))
+    if args.openings is None:
+        openings = list(DEFAULT_OPENINGS)
+    else:
+        openings = read_openings(args.openings)
+
+    start = time.perf_counter()
+    records = run_tournament(args.games, players, openings, args.results,
+                             args.jobs, args.max_plies)
+    elapsed = time.perf_counter() - start
+
+    scores = {'A': 0.0, 'B': 0.0}
+    for record in records:
+        if record.result == WHITE_WIN:
+            scores[record.white] += 1
+        elif record.result == BLACK_WIN:
+            scores[record.black] += 1
+        else:
+            scores[record.white] += 0.5
+            scores[record.black] += 0.5
+    plies = sum(len(record.moves) for record in records)
+    print(f'A {scores["A"]} - {scores["B"]} B over {len(records)} games')
+    print(f'{elapsed:.2f}s, {len(records) / elapsed:.3f} games/s, '
+          f'{plies / elapsed:.1f} plies/s')
+
+if __name__ == "__main__":
+    main()
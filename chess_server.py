@@ -0,0 +1,539 @@
+"""
+Chess Move Validation Server
+Validates moves for many games at once over a network connection. Clients
+send one JSON request per line and receive one JSON response per line, over
+TCP or a Unix socket. Each game's board is kept in memory by the server for
+as long as the connection which created it stays open.
+
+Requests are objects with an "op" and, except for "new", the id of a game
+created on the same connection:
+    {"op": "new", "fen": ...}            start a game, from fen if given
+    {"op": "move", "game": 1, "move": "e2 e4"}
+    {"op": "state", "game": 1}
+    {"op": "close", "game": 1}
+Any request may carry an "id", which is echoed back, and "moves": true to
+receive the legal moves of the resulting position. Responses hold "ok" and
+either the position ("game", "fen", "status" and "reason" for draws) or an
+"error".
+
+Moves arriving together are validated as a batch in a pool of worker
+processes, so the event loop only parses requests and updates game state.
+Each process keeps a transposition table of the legal moves of positions it
+has seen, which games reaching the same position share.
+
+Usage:
+    python chess_server.py [--host HOST] [--port PORT | --unix PATH]
+                           [--workers N] [--table-size N]
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import itertools
+import json
+import multiprocessing
+from typing import Any, Dict, List, Optional, Tuple
+
+from a1_support import *
+from chess import (CHECK, CHECKMATE, DRAW, NORMAL, STALEMATE,
+                   check_game_over, encode_move_text, explain_invalid_move,
+                   get_king, initial_state, position_to_square, process_move,
+                   update_board, valid_move_format)
+from chess_draws import GameState
+from chess_fen import board_to_fen, fen_to_board
+from chess_zobrist import TranspositionTable, hash_board, probe, update_hash
+
+__author__ = "Harold Shaw, 47020665"
+__email__ = "s4702066@student.uq.edu.au"
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# Moves sent to a worker process at a time, and the longest a move waits for
+# others to batch with.
+BATCH_SIZE = 64
+BATCH_DELAY = 0.001
+
+# Requests from one connection being handled at once before reading stops.
+MAX_PENDING_REQUESTS = 256
+MAX_GAMES = 100000
+
+# Positions held in each process's transposition table.
+DEFAULT_TABLE_SIZE = 10000
+
+# Task and result of validating one move in a worker process.
+ValidationTask = Tuple[Board, bool, str, bool]
+ValidationResult = Tuple[Optional[Board], Optional[str], Optional[str],
+                         Optional[List[str]]]
+
+
+_table = TranspositionTable(DEFAULT_TABLE_SIZE)
+
+def set_table_size(size: int) -> None:
+    """Replaces this process's transposition table with an empty one. Passed
+    to the process pool as its initializer.
+
+    Parameters:
+        size (int): Positions held in the table.
+
+    Returns:
+        (None)
+    """
+    global _table
+    _table = TranspositionTable(size)
+
+def move_to_text(move: Move) -> str:
+    """(str) Returns move in the form "letternum letternum"."""
+    return f'{position_to_square(move[0])} {position_to_square(move[1])}'
+
+def list_legal_moves(board: Board, whites_turn: bool) -> List[str]:
+    """(List[str]) Returns the legal moves in a position as "letternum
+    letternum", from the transposition table if it holds them."""
+    return [move_to_text(move)
+            for move in probe(_table, board, whites_turn).moves]
+
+def validate_moves(tasks: List[ValidationTask]) -> List[ValidationResult]:
+    """Validates a batch of moves, each against its own game. Run in worker
+    processes, so nothing is printed.
+
+    The legal moves before and after each move are looked up in the process's
+    transposition table, so a position reached by many games is only worked
+    out once.
+
+    Parameters:
+        tasks (List[ValidationTask]): Board, whose turn it is, the move as
+            "letternum letternum" and whether to list the legal moves after
+            it, for each move.
+
+    Returns:
+        (List[ValidationResult]): For each move, the board after it, status
+            and legal moves if requested, or the reason it is illegal.
+    """
+    results = []
+    for board, whites_turn, text, want_moves in tasks:
+        position_hash = hash_board(board)
+        info = probe(_table, board, whites_turn, position_hash)
+        if info.game_over == True:
+            results.append((None, None, 'game is already over', None))
+            continue
+        if encode_move_text(text) is None or valid_move_format(text) == False:
+            results.append((None, None, 'invalid move format', None))
+            continue
+        move = process_move(text)
+        if move not in info.moves:
+            results.append((None, None,
+                            explain_invalid_move(move, board, whites_turn),
+                            None))
+            continue
+
+        position_hash = update_hash(position_hash, board, move)
+        board = update_board(board, move)
+        info = probe(_table, board, not whites_turn, position_hash)
+        if info.game_over == True:
+            status = CHECKMATE if info.in_check == True else STALEMATE
+        else:
+            status = CHECK if info.in_check == True else NORMAL
+        moves = None
+        if want_moves == True:
+            moves = [move_to_text(move) for move in info.moves]
+        results.append((board, status, None, moves))
+    return results
+
+
+class ValidationBatcher(object):
+    """A class collecting moves to validate and sending them to a process
+    pool in batches, or validating them in the event loop with no pool."""
+    def __init__(self, executor: Optional[concurrent.futures.Executor],
+                 batch_size: int = BATCH_SIZE,
+                 delay: float = BATCH_DELAY) -> None:
+        """Constructs a ValidationBatcher.
+
+        Parameters:
+            executor (Optional[Executor]): Pool to validate moves in, or None
+                to validate them in the event loop.
+            batch_size (int): Moves which trigger sending a batch at once.
+            delay (float): Seconds to wait for a batch to fill.
+
+        Returns:
+            (None)
+        """
+        self._executor = executor
+        self._batch_size = batch_size
+        self._delay = delay
+        self._pending = []
+        self._timer = None
+
+    async def validate(self, board: Board, whites_turn: bool, text: str,
+                       want_moves: bool) -> ValidationResult:
+        """Validates a move as part of the next batch.
+
+        Parameters:
+            board (Board): The current state of the board.
+            whites_turn (bool): True iff it is white's turn.
+            text (str): The move as "letternum letternum".
+            want_moves (bool): True to list the legal moves after the move.
+
+        Returns:
+            (ValidationResult): As for validate_moves().
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append(((board, whites_turn, text, want_moves), future))
+        if len(self._pending) >= self._batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self._delay, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        """(None) Sends the pending moves to be validated."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending = self._pending
+        self._pending = []
+        tasks = [task for task, future in pending]
+        futures = [future for task, future in pending]
+
+        if self._executor is None:
+            self._resolve(futures, validate_moves(tasks))
+            return
+        batch = asyncio.get_running_loop().run_in_executor(
+            self._executor, validate_moves, tasks)
+        batch.add_done_callback(
+            lambda done: self._batch_done(futures, done))
+
+    def _batch_done(self, futures: List[asyncio.Future],
+                    batch: asyncio.Future) -> None:
+        """(None) Gives each waiting move the result of its batch, or passes
+        on the error if the worker failed."""
+        if batch.cancelled():
+            for future in futures:
+                future.cancel()
+        elif batch.exception() is not None:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(batch.exception())
+        else:
+            self._resolve(futures, batch.result())
+
+    def _resolve(self, futures: List[asyncio.Future],
+                 results: List[ValidationResult]) -> None:
+        """(None) Gives each waiting move its result."""
+        for future, result in zip(futures, results):
+            if not future.done():
+                future.set_result(result)
+
+
+class GameSession(object):
+    """A class representing one game held by the server."""
+    def __init__(self, game_id: int, board: Board, whites_turn: bool,
+                 halfmoves: int = 0, fullmoves: int = 1) -> None:
+        """Constructs a GameSession at board.
+
+        Parameters:
+            game_id (int): Number identifying the game.
+            board (Board): The current state of the board.
+            whites_turn (bool): True iff it is white's turn.
+            halfmoves (int): Moves since the last capture or pawn move.
+            fullmoves (int): Number of the current move, starting at 1.
+
+        Returns:
+            (None)
+        """
+        self.game_id = game_id
+        self.board = board
+        self.whites_turn = whites_turn
+        self.fullmoves = fullmoves
+        self.game_state = GameState(board, whites_turn, halfmoves)
+        result = check_game_over(board, whites_turn, self.game_state)
+        self.status = result.status
+        self.reason = result.draw_reason
+        # Moves of one game are validated one at a time, in order.
+        self.lock = asyncio.Lock()
+
+    def is_over(self) -> bool:
+        """(bool) True iff the game has ended."""
+        return self.status in (CHECKMATE, STALEMATE, DRAW)
+
+    def play(self, board: Board, text: str, status: str) -> None:
+        """Records a validated move.
+
+        Parameters:
+            board (Board): The state of the board after the move.
+            text (str): The move as "letternum letternum".
+            status (str): Status of the player to move after the move.
+
+        Returns:
+            (None)
+        """
+        self.game_state.update(self.board, process_move(text))
+        self.board = board
+        if self.whites_turn == False:
+            self.fullmoves += 1
+        self.whites_turn = not self.whites_turn
+        self.status = status
+        if status != CHECKMATE and status != STALEMATE:
+            self.reason = self.game_state.get_draw_reason()
+            if self.reason is not None:
+                self.status = DRAW
+
+    def describe(self) -> Dict[str, Any]:
+        """(Dict[str, Any]) Returns the game's position for a response."""
+        response = {
+            'game': self.game_id,
+            'fen': board_to_fen(self.board, self.whites_turn,
+                                self.game_state.get_halfmove_clock(),
+                                self.fullmoves),
+            'status': self.status,
+        }
+        if self.reason is not None:
+            response['reason'] = self.reason
+        return response
+
+
+class ValidationServer(object):
+    """A class representing the server's games and request handling."""
+    def __init__(self, batcher: ValidationBatcher,
+                 max_games: int = MAX_GAMES) -> None:
+        """Constructs a ValidationServer with no games.
+
+        Parameters:
+            batcher (ValidationBatcher): Validates moves.
+            max_games (int): Most games held at once.
+
+        Returns:
+            (None)
+        """
+        self._batcher = batcher
+        self._max_games = max_games
+        self._games = {}
+        self._game_ids = itertools.count(1)
+
+    def get_num_games(self) -> int:
+        """(int) Returns number of games held."""
+        return len(self._games)
+
+    async def handle_request(self, request: Dict[str, Any],
+                             owned: Dict[int, GameSession]
+                             ) -> Dict[str, Any]:
+        """Carries out one request.
+
+        Parameters:
+            request (Dict[str, Any]): The decoded request.
+            owned (Dict[int, GameSession]): Games created by the connection
+                the request arrived on.
+
+        Returns:
+            (Dict[str, Any]): The response, without "id".
+
+        Raises:
+            ValueError: If the request's game id is not an int.
+        """
+        op = request.get('op')
+        want_moves = request.get('moves') == True
+        if op == 'new':
+            return self._new_game(request.get('fen'), want_moves, owned)
+
+        game_id = request.get('game')
+        if isinstance(game_id, bool) or not isinstance(game_id, int):
+            raise ValueError('game must be an integer')
+        # Only the connection which created a game may use it.
+        game = owned.get(game_id)
+        if game is None:
+            return {'ok': False, 'error': 'no such game'}
+        if op == 'state':
+            response = game.describe()
+            if want_moves == True:
+                response['moves'] = list_legal_moves(game.board,
+                                                     game.whites_turn)
+            response['ok'] = True
+            return response
+        if op == 'close':
+            self._games.pop(game.game_id, None)
+            owned.pop(game.game_id, None)
+            return {'ok': True, 'game': game.game_id}
+        if op != 'move':
+            return {'ok': False, 'error': f'unknown op {op!r}'}
+
+        text = request.get('move')
+        if not isinstance(text, str):
+            return {'ok': False, 'error': 'missing move'}
+        async with game.lock:
+            if game.is_over():
+                return {'ok': False, 'error': 'game is already over'}
+            board, status, error, moves = await self._batcher.validate(
+                game.board, game.whites_turn, text, want_moves)
+            if error is not None:
+                return {'ok': False, 'error': error}
+            game.play(board, text, status)
+            response = game.describe()
+        if moves is not None:
+            response['moves'] = [] if game.is_over() else moves
+        response['ok'] = True
+        return response
+
+    def _new_game(self, fen: Optional[str], want_moves: bool,
+                  owned: Dict[int, GameSession]) -> Dict[str, Any]:
+        """(Dict[str, Any]) Starts a game and returns the response."""
+        if len(self._games) >= self._max_games:
+            return {'ok': False, 'error': 'too many games'}
+        halfmoves = 0
+        fullmoves = 1
+        if fen is None:
+            board, whites_turn = initial_state(), True
+        elif not isinstance(fen, str):
+            return {'ok': False, 'error': 'invalid FEN: not a string'}
+        else:
+            try:
+                board, whites_turn = fen_to_board(fen)
+                # Check detection needs exactly one king on each side.
+                for whites, side in ((True, 'white'), (False, 'black')):
+                    king = get_king(whites)
+                    if sum(row.count(king) for row in board) != 1:
+                        raise ValueError(f'{side} must have exactly one '
+                                         f'king')
+                fields = fen.split()
+                if len(fields) == 6:
+                    halfmoves, fullmoves = int(fields[4]), int(fields[5])
+            except ValueError as error:
+                return {'ok': False, 'error': f'invalid FEN: {error}'}
+
+        game = GameSession(next(self._game_ids), board, whites_turn,
+                           halfmoves, fullmoves)
+        self._games[game.game_id] = game
+        owned[game.game_id] = game
+        response = game.describe()
+        if want_moves == True:
+            response['moves'] = list_legal_moves(board, whites_turn)
+        response['ok'] = True
+        return response
+
+    async def _respond(self, line: bytes, owned: Dict[int, GameSession],
+                       writer: asyncio.StreamWriter,
+                       slots: asyncio.Semaphore) -> None:
+        """(None) Handles one request line and writes its response."""
+        request = {}
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError('request is not an object')
+            response = await self.handle_request(request, owned)
+        except ValueError as error:
+            response = {'ok': False, 'error': f'invalid request: {error}'}
+        except Exception as error:
+            # A failed worker process must not leave the client waiting.
+            response = {'ok': False, 'error': f'server error: {error!r}'}
+        finally:
+            slots.release()
+
+        if 'id' in request:
+            response['id'] = request['id']
+        if not writer.is_closing():
+            writer.write(json.dumps(response).encode() + b'\n')
+
+    async def handle_connection(self, reader: asyncio.StreamReader,
+                                writer: asyncio.StreamWriter) -> None:
+        """Serves requests from one client until it disconnects, then drops
+        the games it created.
+
+        Parameters:
+            reader (StreamReader): Stream of request lines.
+            writer (StreamWriter): Stream for response lines.
+
+        Returns:
+            (None)
+        """
+        owned = {}
+        slots = asyncio.Semaphore(MAX_PENDING_REQUESTS)
+        tasks = set()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ConnectionError, asyncio.LimitOverrunError,
+                        ValueError):
+                    break
+                if line == b'':
+                    break
+                if line.strip() == b'':
+                    continue
+                await slots.acquire()
+                task = asyncio.create_task(self._respond(line, owned, writer,
+                                                         slots))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                await writer.drain()
+            if len(tasks) > 0:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except ConnectionError:
+            pass
+        finally:
+            for game_id in owned:
+                self._games.pop(game_id, None)
+            writer.close()
+
+
+async def serve(host: str, port: int, unix_path: Optional[str],
+                workers: int, table_size: int = DEFAULT_TABLE_SIZE) -> None:
+    """Runs the server until cancelled.
+
+    Parameters:
+        host (str): Address to listen on for TCP.
+        port (int): Port to listen on for TCP.
+        unix_path (Optional[str]): Unix socket to listen on instead of TCP.
+        workers (int): Number of worker processes, 0 to validate moves in
+            the event loop.
+        table_size (int): Positions held in each process's transposition
+            table.
+
+    Returns:
+        (None)
+    """
+    set_table_size(table_size)
+    executor = None
+    if workers > 0:
+        executor = concurrent.futures.ProcessPoolExecutor(
+            workers, initializer=set_table_size, initargs=(table_size,))
+    server = ValidationServer(ValidationBatcher(executor))
+    if unix_path is None:
+        listener = await asyncio.start_server(server.handle_connection, host,
+                                              port)
+    else:
+        listener = await asyncio.start_unix_server(server.handle_connection,
+                                                   unix_path)
+    address = unix_path if unix_path is not None else f'{host}:{port}'
+    print(f'Listening on {address} with {workers} worker processes')
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+def main():
+    """Entry point to the move validation server."""
+    parser = argparse.ArgumentParser(description='Serve chess move '
+                                                 'validation.')
+    parser.add_argument('--host', default=DEFAULT_HOST,
+                        help=f'address to listen on (default {DEFAULT_HOST})')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                        help=f'port to listen on (default {DEFAULT_PORT})')
+    parser.add_argument('--unix', metavar='PATH',
+                        help='listen on a Unix socket instead of TCP')
+    parser.add_argument('--workers', type=int,
+                        default=multiprocessing.cpu_count(),
+                        help='worker processes validating moves, 0 to '
+                             'validate in the event loop')
+    parser.add_argument('--table-size', type=int, default=DEFAULT_TABLE_SIZE,
+                        help='positions in each process\'s transposition '
+                             f'table (default {DEFAULT_TABLE_SIZE})')
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.workers,
+                          args.table_size))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
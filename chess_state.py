@@ -0,0 +1,346 @@
+"""
+Chess Board State
+A mutable board for the chess game which keeps both kings' positions and
+each player's attack map up to date as moves are made, so check detection is
+a lookup rather than a scan of the whole board.
+"""
+
+from typing import List, Optional, Tuple
+
+from a1_support import *
+from chess import get_king, get_piece_targets, is_current_players_piece
+from chess_tables import ALL_DIRECTIONS, SLIDERS, get_attack_tables
+from chess_zobrist import BLACK_TO_MOVE_KEY, ZOBRIST_KEYS
+
+__author__ = "Harold Shaw, 47020665"
+__email__ = "s4702066@student.uq.edu.au"
+
+
+def _sign(value: int) -> int:
+    """(int) Returns -1, 0 or 1 according to the sign of value."""
+    return (value > 0) - (value < 0)
+
+
+class BoardState(object):
+    """A class representing a chess board with incrementally maintained king
+    positions, attack maps and Zobrist hash.
+
+    Squares are numbered 0-63 along rows from a8, as in chess_bitboard. For
+    each player the attack map counts how many of their pieces attack each
+    square. When a square changes, only that square's piece and the sliding
+    pieces whose rays reach the square have their attacks recomputed.
+    """
+    def __init__(self, board: Board) -> None:
+        """Constructs a BoardState from a tuple-of-strings Board.
+
+        Parameters:
+            board (Board): The current state of the board.
+
+        Returns:
+            (None)
+        """
+        self._rows = list(board)
+        self._board = tuple(board)
+        self._squares = [character for row in board for character in row]
+        self._kings = {True: None, False: None}
+        self._attacks = {True: [0] * (BOARD_SIZE * BOARD_SIZE),
+                         False: [0] * (BOARD_SIZE * BOARD_SIZE)}
+        self._piece_attacks = [()] * (BOARD_SIZE * BOARD_SIZE)
+        self._hash = 0
+        self._tables = get_attack_tables()
+        # (from square, to square, captured piece) of each move to take back.
+        self._undo = []
+
+        white_king = get_king(True)
+        black_king = get_king(False)
+        for square, piece in enumerate(self._squares):
+            if piece == white_king:
+                self._kings[True] = square
+            elif piece == black_king:
+                self._kings[False] = square
+            if piece != EMPTY:
+                self._hash ^= ZOBRIST_KEYS[piece][square]
+                self._add_attacks(square)
+
+    def get_board(self) -> Board:
+        """(Board) Returns the current position as a tuple of row strings."""
+        if self._board is None:
+            self._board = tuple(self._rows)
+        return self._board
+
+    def get_hash(self, whites_turn: Optional[bool] = None) -> int:
+        """Returns the Zobrist hash of the board, matching
+        chess_zobrist.hash_board(), or chess_zobrist.hash_position() if
+        whites_turn is given.
+
+        Parameters:
+            whites_turn (Optional[bool]): True iff it is white's turn.
+
+        Returns:
+            (int): A 64-bit hash of the position.
+        """
+        if whites_turn == False:
+            return self._hash ^ BLACK_TO_MOVE_KEY
+        return self._hash
+
+    def get_king_position(self, whites_turn: bool) -> Optional[Position]:
+        """Returns position of a player's king.
+
+        Parameters:
+            whites_turn (bool): True for white's king, False for black's.
+
+        Returns:
+            (Optional[Position]): The king's position, if it is on the board.
+        """
+        square = self._kings[whites_turn]
+        if square is None:
+            return None
+        return divmod(square, BOARD_SIZE)
+
+    def count_attackers(self, position: Position, by_white: bool) -> int:
+        """Returns the number of one player's pieces attacking position.
+
+        Parameters:
+            position (Position): A position on the board of form (row, col).
+            by_white (bool): True iff the attacking player is white.
+
+        Returns:
+            (int): Number of attacking pieces.
+        """
+        return self._attacks[by_white][position[0] * BOARD_SIZE + position[1]]
+
+    def is_in_check(self, whites_turn: bool) -> bool:
+        """Checks whether the player whose turn it is is in check.
+
+        Parameters:
+            whites_turn (bool): True iff it is white's turn.
+
+        Returns:
+            (bool): True iff the player's king is attacked.
+        """
+        king = self._kings[whites_turn]
+        if king is None:
+            return False
+        return self._attacks[not whites_turn][king] > 0
+
+    def leaves_king_in_check(self, move: Move, whites_turn: bool) -> bool:
+        """Checks whether making move would leave the mover's king in check.
+
+        Outside of check only the ray through the square being vacated can
+        change, so that one ray is walked. In check, the move is applied
+        incrementally, the attack map consulted and the move reverted.
+
+        Parameters:
+            move (Move): A move of format ((row, col), (row, col)).
+            whites_turn (bool): True iff it is white's turn.
+
+        Returns:
+            (bool): True iff the king would be attacked after move.
+        """
+        king = self._kings[whites_turn]
+        if king is None:
+            return False
+        from_square = move[0][0] * BOARD_SIZE + move[0][1]
+        to_square = move[1][0] * BOARD_SIZE + move[1][1]
+        enemy_attacks = self._attacks[not whites_turn]
+
+        if from_square == king:
+            if enemy_attacks[to_square]:
+                return True
+            # A slider checking the king also attacks the square behind it.
+            direction = (_sign(move[0][0] - move[1][0]),
+                         _sign(move[0][1] - move[1][1]))
+            attacker = self._first_piece(from_square, direction)
+            return (attacker is not None
+                    and self._is_slider_for(attacker, direction)
+                    and self._is_white(self._squares[attacker])
+                    != whites_turn)
+
+        if enemy_attacks[king]:
+            moved = self._squares[from_square]
+            captured = self._squares[to_square]
+            self._set_square(to_square, moved)
+            self._set_square(from_square, EMPTY)
+            in_check = enemy_attacks[king] > 0
+            self._set_square(from_square, moved)
+            self._set_square(to_square, captured)
+            return in_check
+
+        # Only a piece shielding the king along a line can expose it.
+        king_row, king_col = divmod(king, BOARD_SIZE)
+        d_row = move[0][0] - king_row
+        d_col = move[0][1] - king_col
+        if not (d_row == 0 or d_col == 0 or abs(d_row) == abs(d_col)):
+            return False
+        direction = (_sign(d_row), _sign(d_col))
+        if self._first_piece(king, direction) != from_square:
+            return False
+
+        # Staying on the same line keeps the king shielded.
+        t_row = move[1][0] - king_row
+        t_col = move[1][1] - king_col
+        if (_sign(t_row), _sign(t_col)) == direction and \
+           t_row * direction[1] == t_col * direction[0]:
+            return False
+
+        attacker = self._first_piece(from_square, direction)
+        return (attacker is not None
+                and self._is_slider_for(attacker, direction)
+                and self._is_white(self._squares[attacker]) != whites_turn)
+
+    def is_move_valid(self, move: Move, whites_turn: bool) -> bool:
+        """Checks whether a move is valid based on board and whose turn it is.
+
+        Applies the same rules as chess.is_move_valid(), but without copying
+        the board to test for check.
+
+        Parameters:
+            move (Move): A move of format ((row, col), (row, col)).
+            whites_turn (bool): True iff it is white's turn.
+
+        Returns:
+            (bool): True iff move is valid for board and player's turn.
+        """
+        if out_of_bounds(move[1]) or move[0] == move[1]:
+            return False
+        character = self._rows[move[0][0]][move[0][1]]
+        if is_current_players_piece(character, whites_turn) == False:
+            return False
+        target = self._rows[move[1][0]][move[1][1]]
+        if target != EMPTY and is_current_players_piece(target, whites_turn):
+            return False
+        if move[1] not in get_piece_targets(move[0], self.get_board()):
+            return False
+        return not self.leaves_king_in_check(move, whites_turn)
+
+    def make_move(self, move: Move) -> None:
+        """Makes move in place, remembering the captured piece so the move
+        can be taken back with unmake_move().
+
+        Parameters:
+            move (Move): A move of form ((row, col), (row, col)).
+
+        Returns:
+            (None)
+        """
+        from_square = move[0][0] * BOARD_SIZE + move[0][1]
+        to_square = move[1][0] * BOARD_SIZE + move[1][1]
+        self._undo.append((from_square, to_square, self._squares[to_square]))
+        self._set_square(to_square, self._squares[from_square])
+        self._set_square(from_square, EMPTY)
+        return None
+
+    def unmake_move(self) -> None:
+        """Takes back the last move made with make_move(), restoring king
+        positions, attack maps and hash.
+
+        Returns:
+            (None)
+
+        Raises:
+            IndexError: If there is no move to take back.
+        """
+        from_square, to_square, captured = self._undo.pop()
+        self._set_square(from_square, self._squares[to_square])
+        self._set_square(to_square, captured)
+        return None
+
+    def _is_white(self, piece: str) -> bool:
+        """(bool) True iff piece belongs to white."""
+        return piece in WHITE_PIECES
+
+    def _is_slider_for(self, square: int, direction: Tuple[int, int]) -> bool:
+        """(bool) True iff the piece at square slides along direction."""
+        return self._squares[square].lower() in SLIDERS[direction]
+
+    def _first_piece(self, square: int,
+                     direction: Tuple[int, int]) -> Optional[int]:
+        """(Optional[int]) Returns first occupied square from square along
+        direction, excluding square itself."""
+        for target in self._tables.ray_squares[direction][square]:
+            if self._squares[target] != EMPTY:
+                return target
+        return None
+
+    def _sliders_reaching(self, square: int) -> List[int]:
+        """(List[int]) Returns squares of sliding pieces whose rays reach
+        square."""
+        sliders = []
+        for direction in ALL_DIRECTIONS:
+            target = self._first_piece(square, direction)
+            if target is not None and self._is_slider_for(target, direction):
+                sliders.append(target)
+        return sliders
+
+    def _compute_attacks(self, square: int) -> Tuple[int, ...]:
+        """(Tuple[int, ...]) Returns squares attacked by the piece at
+        square."""
+        piece = self._squares[square]
+        kind = piece.lower()
+
+        if kind == 'n':
+            return self._tables.knight_squares[square]
+        if kind == 'k':
+            return self._tables.king_squares[square]
+        if kind == 'p':
+            return self._tables.pawn_attack_squares[self._is_white(piece)][
+                square]
+
+        attacks = []
+        for direction in ALL_DIRECTIONS:
+            if kind not in SLIDERS[direction]:
+                continue
+            for target in self._tables.ray_squares[direction][square]:
+                attacks.append(target)
+                if self._squares[target] != EMPTY:
+                    break
+        return tuple(attacks)
+
+    def _add_attacks(self, square: int) -> None:
+        """(None) Adds the attacks of the piece at square to its attack map."""
+        attacks = self._compute_attacks(square)
+        self._piece_attacks[square] = attacks
+        counts = self._attacks[self._is_white(self._squares[square])]
+        for target in attacks:
+            counts[target] += 1
+
+    def _remove_attacks(self, square: int) -> None:
+        """(None) Removes the attacks of the piece at square from its attack
+        map."""
+        counts = self._attacks[self._is_white(self._squares[square])]
+        for target in self._piece_attacks[square]:
+            counts[target] -= 1
+        self._piece_attacks[square] = ()
+
+    def _set_square(self, square: int, piece: str) -> None:
+        """(None) Places piece (or EMPTY) on square, updating attack maps for
+        only the pieces affected."""
+        sliders = self._sliders_reaching(square)
+        for slider in sliders:
+            self._remove_attacks(slider)
+
+        old_piece = self._squares[square]
+        if old_piece != EMPTY:
+            self._hash ^= ZOBRIST_KEYS[old_piece][square]
+            self._remove_attacks(square)
+            if old_piece.lower() == 'k' and \
+               self._kings[self._is_white(old_piece)] == square:
+                self._kings[self._is_white(old_piece)] = None
+
+        self._squares[square] = piece
+        row, col = divmod(square, BOARD_SIZE)
+        row_string = self._rows[row]
+        self._rows[row] = row_string[:col] + piece + row_string[col + 1:]
+        self._board = None
+
+        if piece != EMPTY:
+            self._hash ^= ZOBRIST_KEYS[piece][square]
+            if piece.lower() == 'k':
+                self._kings[self._is_white(piece)] = square
+            self._add_attacks(square)
+        for slider in sliders:
+            self._add_attacks(slider)
+
+    def __repr__(self) -> str:
+        """(str) Returns representation of BoardState."""
+        return f'BoardState({self.get_board()!r})'
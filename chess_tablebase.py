@@ -0,0 +1,357 @@
+"""
+Chess Endgame Tablebase
+Perfect play for endings of king and one piece against a lone king, for the
+queen (KQK), rook (KRK) and pawn (KPK). Tables are generated locally by
+retrograde analysis under this game's rules, so without promotion a pawn
+which reaches the last row is stuck there, and saved one file per ending.
+
+Each table holds one byte per position, indexed by side to move and the
+squares of the stronger side's king, its piece and the lone king. Endings
+where black has the piece are looked up with the board mirrored.
+
+Usage:
+    python chess_tablebase.py DIRECTORY
+"""
+
+import argparse
+import mmap
+import os
+import time
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from a1_support import *
+from chess import generate_legal_moves, is_position_attacked, update_board
+from chess_search import MATE_SCORE
+from chess_tables import SLIDERS, get_attack_tables
+
+__author__ = "Harold Shaw, 47020665"
+__email__ = "s4702066@student.uq.edu.au"
+
+NUM_SQUARES = BOARD_SIZE * BOARD_SIZE
+TABLE_SIZE = 2 * NUM_SQUARES ** 3
+# XORing a square with this flips its row, as from white's side to black's.
+MIRROR = NUM_SQUARES - BOARD_SIZE
+
+# Uppercase piece of the stronger side in each ending.
+ENDINGS = {'KQK': 'Q', 'KRK': 'R', 'KPK': 'P'}
+TABLE_EXTENSION = '.tb'
+
+# Table values: 0 is a draw, 1 to LOSS - 1 a win for the side to move in
+# that many plies, and LOSS + n a loss in n plies.
+DRAW = 0
+LOSS = 128
+
+
+def table_index(whites_turn: bool, king: int, piece: int,
+                other_king: int) -> int:
+    """Computes the position of an entry in a table.
+
+    Parameters:
+        whites_turn (bool): True iff it is the stronger side's turn.
+        king (int): Square of the stronger side's king.
+        piece (int): Square of the stronger side's piece.
+        other_king (int): Square of the lone king.
+
+    Returns:
+        (int): Index into the table.
+    """
+    return (((whites_turn == False) * NUM_SQUARES + king) * NUM_SQUARES
+            + piece) * NUM_SQUARES + other_king
+
+def _make_board(king: int, piece: int, other_king: int,
+                piece_character: str) -> Board:
+    """(Board) Returns board with white's king and piece and black's king."""
+    squares = [EMPTY] * NUM_SQUARES
+    squares[king] = 'K'
+    squares[piece] = piece_character
+    squares[other_king] = 'k'
+    return tuple(''.join(squares[start:start + BOARD_SIZE])
+                 for start in range(0, NUM_SQUARES, BOARD_SIZE))
+
+def _predecessors(index: int, piece_character: str) -> Iterator[int]:
+    """Yields the index of every position from which a non-capturing move
+    reaches the position at index. Legality is not checked.
+
+    Parameters:
+        index (int): Index of a position.
+        piece_character (str): Uppercase piece of the stronger side.
+
+    Yields:
+        (int): Index of each predecessor.
+    """
+    tables = get_attack_tables()
+    rest, other_king = divmod(index, NUM_SQUARES)
+    rest, piece = divmod(rest, NUM_SQUARES)
+    side, king = divmod(rest, NUM_SQUARES)
+    occupied = (king, piece, other_king)
+    # The side which just moved is the side to move in the predecessor.
+    movers_turn = side == 1
+
+    if movers_turn == False:
+        for origin in tables.king_squares[other_king]:
+            if origin not in occupied:
+                yield table_index(False, king, piece, origin)
+        return
+
+    for origin in tables.king_squares[king]:
+        if origin not in occupied:
+            yield table_index(True, origin, piece, other_king)
+
+    if piece_character == 'P':
+        # White pawns move towards row 0, so they came from a higher row.
+        row, col = divmod(piece, BOARD_SIZE)
+        for step in (1, 2):
+            origin_row = row + step
+            if origin_row >= BOARD_SIZE:
+                break
+            origin = origin_row * BOARD_SIZE + col
+            if origin in occupied:
+                break
+            if step == 1 or origin_row == BOARD_SIZE - 2:
+                yield table_index(True, king, origin, other_king)
+        return
+
+    kind = piece_character.lower()
+    for direction, squares in tables.ray_squares.items():
+        if kind not in SLIDERS[direction]:
+            continue
+        for origin in squares[piece]:
+            if origin in occupied:
+                break
+            yield table_index(True, king, origin, other_king)
+
+def generate_table(piece_character: str) -> bytearray:
+    """Solves every position of king and piece against a lone king.
+
+    Positions are first given their number of legal moves, checkmates being
+    losses in 0. Working outwards a ply at a time from the checkmates, a
+    position is a win if some move reaches a loss, and a loss once every move
+    reaches a win. Positions never reached are draws.
+
+    Parameters:
+        piece_character (str): Uppercase piece of the stronger side.
+
+    Returns:
+        (bytearray): The table, TABLE_SIZE bytes.
+    """
+    values = bytearray(TABLE_SIZE)
+    # Moves not yet known to lead to a win for the other side.
+    counts = array('B', bytes(TABLE_SIZE))
+    legal = bytearray(TABLE_SIZE)
+    frontier = []
+
+    for king in range(NUM_SQUARES):
+        for piece in range(NUM_SQUARES):
+            if piece == king:
+                continue
+            for other_king in range(NUM_SQUARES):
+                if other_king == king or other_king == piece:
+                    continue
+                board = _make_board(king, piece, other_king, piece_character)
+                for whites_turn in (True, False):
+                    # The side not to move may not be in check.
+                    waiting_king = divmod(other_king if whites_turn else king,
+                                          BOARD_SIZE)
+                    if is_position_attacked(board, waiting_king, whites_turn):
+                        continue
+                    index = table_index(whites_turn, king, piece, other_king)
+                    legal[index] = 1
+                    moves = generate_legal_moves(board, whites_turn)
+                    counts[index] = len(moves)
+                    if len(moves) == 0:
+                        own_king = divmod(king if whites_turn else other_king,
+                                          BOARD_SIZE)
+                        if is_position_attacked(board, own_king,
+                                                not whites_turn):
+                            values[index] = LOSS
+                            frontier.append(index)
+
+    plies = 0
+    while len(frontier) > 0:
+        plies += 1
+        next_frontier = []
+        for index in frontier:
+            is_loss = values[index] >= LOSS
+            for predecessor in _predecessors(index, piece_character):
+                if legal[predecessor] == 0 or values[predecessor] != DRAW:
+                    continue
+                if is_loss:
+                    values[predecessor] = plies
+                    next_frontier.append(predecessor)
+                else:
+                    counts[predecessor] -= 1
+                    if counts[predecessor] == 0:
+                        values[predecessor] = LOSS + plies
+                        next_frontier.append(predecessor)
+        frontier = next_frontier
+    return values
+
+def value_to_score(value: int) -> int:
+    """Converts a table value to a score on the scale of chess_search.
+
+    Parameters:
+        value (int): A table value.
+
+    Returns:
+        (int): MATE_SCORE less the plies to mate if the side to move wins,
+            the negation of that if it loses, or 0 for a draw.
+    """
+    if value >= LOSS:
+        return -(MATE_SCORE - (value - LOSS))
+    if value == DRAW:
+        return 0
+    return MATE_SCORE - value
+
+
+class Tablebase(object):
+    """A class representing the endgame tables found in a directory, each
+    memory-mapped so a probe reads a single byte."""
+    def __init__(self, directory: str) -> None:
+        """Opens every table in directory.
+
+        Parameters:
+            directory (str): Directory written by save_tables().
+
+        Returns:
+            (None)
+        """
+        self._files = []
+        self._tables = {}
+        for name, piece_character in ENDINGS.items():
+            path = os.path.join(directory, name + TABLE_EXTENSION)
+            if not os.path.exists(path):
+                continue
+            file = open(path, 'rb')
+            self._files.append(file)
+            self._tables[piece_character] = mmap.mmap(file.fileno(), 0,
+                                                      access=mmap.ACCESS_READ)
+        # Pieces with a table, for either player.
+        self._characters = ''.join(self._tables)
+        self._characters += self._characters.lower()
+
+    def get_endings(self) -> List[str]:
+        """(List[str]) Returns names of the endings available, e.g. 'KQK'."""
+        return ['K' + piece + 'K' for piece in self._tables]
+
+    def probe(self, board: Board, whites_turn: bool) -> Optional[int]:
+        """Looks up the result of board with perfect play.
+
+        Parameters:
+            board (Board): The current state of the board.
+            whites_turn (bool): True iff it is white's turn.
+
+        Returns:
+            (Optional[int]): Score for the side to move as value_to_score(),
+                or None if the position is not in any table.
+        """
+        squares = ''.join(board)
+        num_pieces = NUM_SQUARES - squares.count(EMPTY)
+        king = squares.find('K')
+        other_king = squares.find('k')
+        if king < 0 or other_king < 0 or num_pieces > 3:
+            return None
+        if num_pieces == 2:
+            return 0
+
+        for character in self._characters:
+            piece = squares.find(character)
+            if piece >= 0:
+                break
+        else:
+            return None
+
+        table = self._tables[character.upper()]
+        if character in WHITE_PIECES:
+            index = table_index(whites_turn, king, piece, other_king)
+        else:
+            index = table_index(not whites_turn, other_king ^ MIRROR,
+                                piece ^ MIRROR, king ^ MIRROR)
+        return value_to_score(table[index])
+
+    def best_move(self, board: Board, whites_turn: bool
+                  ) -> Optional[Tuple[Move, int]]:
+        """Finds a move keeping the best result, mating as fast as possible
+        when winning and as slowly as possible when losing.
+
+        Parameters:
+            board (Board): The current state of the board.
+            whites_turn (bool): True iff it is white's turn.
+
+        Returns:
+            (Optional[Tuple[Move, int]]): The move and its score as for
+                probe(), or None if the position is not in any table or there
+                are no legal moves.
+        """
+        if self.probe(board, whites_turn) is None:
+            return None
+        best = None
+        best_score = None
+        for move in generate_legal_moves(board, whites_turn):
+            score = self.probe(update_board(board, move), not whites_turn)
+            if score is None:
+                continue
+            # Mate is one ply further away than it is for the opponent.
+            if score < 0:
+                score = -score - 1
+            elif score > 0:
+                score = -score + 1
+            if best_score is None or score > best_score:
+                best = (move, score)
+                best_score = score
+        return best
+
+    def close(self) -> None:
+        """(None) Closes every table."""
+        for table in self._tables.values():
+            table.close()
+        for file in self._files:
+            file.close()
+        self._tables = {}
+        self._characters = ''
+        self._files = []
+
+    def __enter__(self) -> 'Tablebase':
+        """(Tablebase) Returns self, for use in a with statement."""
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """(None) Closes every table on leaving a with statement."""
+        self.close()
+
+
+def save_tables(directory: str) -> Dict[str, bytearray]:
+    """Generates every table and writes each to directory.
+
+    Parameters:
+        directory (str): Directory to write tables to, created if missing.
+
+    Returns:
+        (Dict[str, bytearray]): Each table by name, e.g. 'KQK'.
+    """
+    os.makedirs(directory, exist_ok=True)
+    tables = {}
+    for name, piece_character in ENDINGS.items():
+        start = time.perf_counter()
+        table = generate_table(piece_character)
+        with open(os.path.join(directory, name + TABLE_EXTENSION), 'wb') \
+                as file:
+            file.write(table)
+        tables[name] = table
+
+        wins = sum(1 for value in table if 0 < value < LOSS)
+        longest = max((value for value in table if value < LOSS), default=0)
+        print(f'{name}: {wins} wins for the side to move, longest mate '
+              f'{longest} plies, {time.perf_counter() - start:.1f}s')
+    return tables
+
+def main():
+    """Entry point to tablebase generation."""
+    parser = argparse.ArgumentParser(description='Generate endgame tables.')
+    parser.add_argument('directory', metavar='DIRECTORY',
+                        help='directory to write the tables to')
+    args = parser.parse_args()
+    save_tables(args.directory)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Chess Attack Tables
+Lookup tables of the squares each piece can reach from each square of the
+board, so move generation does not recompute the same geometry on every call.
+
+Tables are built the first time get_attack_tables() is called rather than on
+import, so the interactive game starts without paying for them. Modules that
+generate many moves call it at import time to build them up front.
+
+Sliding pieces use the classical ray approach on bitboards: each ray from a
+square is a precomputed mask, and the nearest blocker on it is found with a
+single bit scan, after which the blocker's own ray is masked off. This gives
+constant-time attacks per direction without the start-up cost of searching
+for magic numbers.
+"""
+
+from typing import Tuple
+
+from a1_support import *
+
+__author__ = "Harold Shaw, 47020665"
+__email__ = "s4702066@student.uq.edu.au"
+
+NUM_SQUARES = BOARD_SIZE * BOARD_SIZE
+
+# Deltas of (row, col) for pieces which move a fixed distance.
+KNIGHT_DELTAS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2),
+                 (1, -2), (1, 2), (2, -1), (2, 1))
+KING_DELTAS = ((-1, -1), (-1, 0), (-1, 1), (0, -1),
+               (0, 1), (1, -1), (1, 0), (1, 1))
+
+# Directions of (row, col) for pieces which slide until blocked.
+ORTHOGONAL_DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+DIAGONAL_DIRECTIONS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+ALL_DIRECTIONS = ORTHOGONAL_DIRECTIONS + DIAGONAL_DIRECTIONS
+
+# Lowercase sliding pieces which attack along each direction.
+SLIDERS = {direction: 'rq' for direction in ORTHOGONAL_DIRECTIONS}
+SLIDERS.update({direction: 'bq' for direction in DIAGONAL_DIRECTIONS})
+
+# Rows pawns start on and the direction they move in, keyed by whites_turn.
+PAWN_START_ROWS = {True: BOARD_SIZE - 2, False: 1}
+PAWN_DIRECTIONS = {True: -1, False: 1}
+
+
+def _in_bounds(row: int, col: int) -> bool:
+    """(bool) True iff (row, col) is on the board."""
+    return 0 <= row < BOARD_SIZE and 0 <= col < BOARD_SIZE
+
+def _to_mask(positions: Tuple[Position, ...]) -> int:
+    """(int) Returns bitboard with the bit of each position set."""
+    mask = 0
+    for row, col in positions:
+        mask |= 1 << (row * BOARD_SIZE + col)
+    return mask
+
+def _to_squares(positions: Tuple[Position, ...]) -> Tuple[int, ...]:
+    """(Tuple[int, ...]) Returns square index of each position."""
+    return tuple(row * BOARD_SIZE + col for row, col in positions)
+
+
+class AttackTables(object):
+    """A class representing precomputed move and attack tables.
+
+    Each table is a tuple indexed by square, row * BOARD_SIZE + col, and
+    comes in three forms holding the same squares: *_targets and rays hold
+    (row, col) positions for use with Board, *_squares hold square indices
+    for use with chess_state, and *_masks hold bitboards for use with
+    chess_bitboard. Pawn and ray tables are further keyed by whites_turn and
+    by direction.
+
+    rays[square] holds a (direction, sliders, positions) tuple for each
+    direction with at least one square on the board, where sliders are the
+    lowercase pieces moving along it and positions run from nearest to
+    furthest.
+    """
+    def __init__(self) -> None:
+        """Builds every table.
+
+        Returns:
+            (None)
+        """
+        knight_targets = []
+        king_targets = []
+        rays = []
+        ray_masks = {direction: [] for direction in ALL_DIRECTIONS}
+        ray_squares = {direction: [] for direction in ALL_DIRECTIONS}
+        pawn_attacks = {True: [], False: []}
+        pawn_pushes = {True: [], False: []}
+
+        for square in range(NUM_SQUARES):
+            row, col = divmod(square, BOARD_SIZE)
+            knight_targets.append(self._step_targets(row, col, KNIGHT_DELTAS))
+            king_targets.append(self._step_targets(row, col, KING_DELTAS))
+
+            square_rays = []
+            for direction in ALL_DIRECTIONS:
+                ray = self._ray(row, col, direction)
+                ray_masks[direction].append(_to_mask(ray))
+                ray_squares[direction].append(_to_squares(ray))
+                if len(ray) > 0:
+                    square_rays.append((direction, SLIDERS[direction], ray))
+            rays.append(tuple(square_rays))
+
+            for whites_turn in (True, False):
+                step = PAWN_DIRECTIONS[whites_turn]
+                pawn_attacks[whites_turn].append(tuple(
+                    (row + step, col + d_col) for d_col in (-1, 1)
+                    if _in_bounds(row + step, col + d_col)))
+                pushes = []
+                if _in_bounds(row + step, col):
+                    pushes.append((row + step, col))
+                    if row == PAWN_START_ROWS[whites_turn]:
+                        pushes.append((row + 2 * step, col))
+                pawn_pushes[whites_turn].append(tuple(pushes))
+
+        self.knight_targets = tuple(knight_targets)
+        self.king_targets = tuple(king_targets)
+        self.rays = tuple(rays)
+        self.pawn_attacks = {side: tuple(table)
+                             for side, table in pawn_attacks.items()}
+        self.pawn_pushes = {side: tuple(table)
+                            for side, table in pawn_pushes.items()}
+
+        self.knight_masks = tuple(_to_mask(targets)
+                                  for targets in self.knight_targets)
+        self.king_masks = tuple(_to_mask(targets)
+                                for targets in self.king_targets)
+        self.pawn_attack_masks = {side: tuple(_to_mask(targets)
+                                              for targets in table)
+                                  for side, table in self.pawn_attacks.items()}
+        self.ray_masks = {direction: tuple(masks)
+                          for direction, masks in ray_masks.items()}
+
+        self.knight_squares = tuple(_to_squares(targets)
+                                    for targets in self.knight_targets)
+        self.king_squares = tuple(_to_squares(targets)
+                                  for targets in self.king_targets)
+        self.pawn_attack_squares = {side: tuple(_to_squares(targets)
+                                                for targets in table)
+                                    for side, table
+                                    in self.pawn_attacks.items()}
+        self.ray_squares = {direction: tuple(squares)
+                            for direction, squares in ray_squares.items()}
+
+    def _step_targets(self, row: int, col: int,
+                      deltas: Tuple[Tuple[int, int], ...]
+                      ) -> Tuple[Position, ...]:
+        """(Tuple[Position, ...]) Returns on-board positions one delta away
+        from (row, col)."""
+        return tuple((row + d_row, col + d_col) for d_row, d_col in deltas
+                     if _in_bounds(row + d_row, col + d_col))
+
+    def _ray(self, row: int, col: int,
+             direction: Tuple[int, int]) -> Tuple[Position, ...]:
+        """(Tuple[Position, ...]) Returns positions from (row, col) along
+        direction to the edge of the board, excluding (row, col)."""
+        ray = []
+        row += direction[0]
+        col += direction[1]
+        while _in_bounds(row, col):
+            ray.append((row, col))
+            row += direction[0]
+            col += direction[1]
+        return tuple(ray)
+
+    def sliding_attacks(self, square: int, occupied: int,
+                        directions: Tuple[Tuple[int, int], ...]) -> int:
+        """Returns squares attacked from square along directions, stopping at
+        and including the first occupied square in each.
+
+        Parameters:
+            square (int): Square index of the sliding piece.
+            occupied (int): Bitboard of all occupied squares.
+            directions (Tuple[Tuple[int, int], ...]): Directions to slide in.
+
+        Returns:
+            (int): Bitboard of attacked squares.
+        """
+        attacks = 0
+        for direction in directions:
+            masks = self.ray_masks[direction]
+            ray = masks[square]
+            blockers = ray & occupied
+            if blockers:
+                # Rays towards higher squares meet their lowest blocker first.
+                if direction[0] * BOARD_SIZE + direction[1] > 0:
+                    blocker = (blockers & -blockers).bit_length() - 1
+                else:
+                    blocker = blockers.bit_length() - 1
+                ray ^= masks[blocker]
+            attacks |= ray
+        return attacks
+
+    def rook_attacks(self, square: int, occupied: int) -> int:
+        """(int) Returns bitboard of squares a rook on square attacks."""
+        return self.sliding_attacks(square, occupied, ORTHOGONAL_DIRECTIONS)
+
+    def bishop_attacks(self, square: int, occupied: int) -> int:
+        """(int) Returns bitboard of squares a bishop on square attacks."""
+        return self.sliding_attacks(square, occupied, DIAGONAL_DIRECTIONS)
+
+    def queen_attacks(self, square: int, occupied: int) -> int:
+        """(int) Returns bitboard of squares a queen on square attacks."""
+        return self.sliding_attacks(square, occupied, ALL_DIRECTIONS)
+
+
+_attack_tables = None
+
+def get_attack_tables() -> AttackTables:
+    """Returns the shared attack tables, building them on the first call.
+
+    Returns:
+        (AttackTables): The tables.
+    """
+    global _attack_tables
+    if _attack_tables is None:
+        _attack_tables = AttackTables()
+    return _attack_tables
@@ -0,0 +1,245 @@
+"""
+Chess Zobrist Hashing
+Position hashing for the chess game, and a bounded transposition table for
+caching what is known about positions that have already been seen.
+"""
+
+import random
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from a1_support import *
+from chess import _iter_legal_moves, get_checks_and_pins
+
+__author__ = "Harold Shaw, 47020665"
+__email__ = "s4702066@student.uq.edu.au"
+
+# Fixed seed so hashes agree between runs and between processes.
+ZOBRIST_SEED = 20210830
+NUM_SQUARES = BOARD_SIZE * BOARD_SIZE
+
+_generator = random.Random(ZOBRIST_SEED)
+ZOBRIST_KEYS = {
+    piece: tuple(_generator.getrandbits(64) for square in range(NUM_SQUARES))
+    for piece in tuple(WHITE_PIECES) + tuple(BLACK_PIECES)
+}
+BLACK_TO_MOVE_KEY = _generator.getrandbits(64)
+del _generator
+
+# Replacement policies for TranspositionTable.
+LRU = 'lru'
+FIFO = 'fifo'
+REPLACEMENT_POLICIES = (LRU, FIFO)
+
+def hash_board(board: Board) -> int:
+    """Computes the Zobrist hash of piece placement from scratch.
+
+    Parameters:
+        board (Board): The current state of the board.
+
+    Returns:
+        (int): A 64-bit hash of board.
+    """
+    position_hash = 0
+    square = 0
+    for row in board:
+        for character in row:
+            if character != EMPTY:
+                position_hash ^= ZOBRIST_KEYS[character][square]
+            square += 1
+    return position_hash
+
+def hash_position(board: Board, whites_turn: bool) -> int:
+    """Computes the Zobrist hash of board and side to move from scratch.
+
+    Parameters:
+        board (Board): The current state of the board.
+        whites_turn (bool): True iff it is white's turn.
+
+    Returns:
+        (int): A 64-bit hash of the position.
+    """
+    position_hash = hash_board(board)
+    if whites_turn == False:
+        position_hash ^= BLACK_TO_MOVE_KEY
+    return position_hash
+
+def update_hash(position_hash: int, board: Board, move: Move) -> int:
+    """Updates a board hash for move without rehashing the whole board.
+
+    Parameters:
+        position_hash (int): Hash of board before move.
+        board (Board): The state of the board before move.
+        move (Move): A move of form ((row, col), (row, col)).
+
+    Returns:
+        (int): Hash of board after update_board(board, move).
+    """
+    from_square = move[0][0] * BOARD_SIZE + move[0][1]
+    to_square = move[1][0] * BOARD_SIZE + move[1][1]
+    moved = board[move[0][0]][move[0][1]]
+    captured = board[move[1][0]][move[1][1]]
+
+    keys = ZOBRIST_KEYS[moved]
+    position_hash ^= keys[from_square] ^ keys[to_square]
+    if captured != EMPTY:
+        position_hash ^= ZOBRIST_KEYS[captured][to_square]
+    return position_hash
+
+
+class PositionInfo(object):
+    """A class representing what is known about a position."""
+    __slots__ = ('moves', 'in_check', 'game_over')
+
+    def __init__(self, moves: List[Move], in_check: bool) -> None:
+        """Constructs a PositionInfo.
+
+        Parameters:
+            moves (List[Move]): All legal moves in the position.
+            in_check (bool): True iff the player to move is in check.
+
+        Returns:
+            (None)
+        """
+        self.moves = moves
+        self.in_check = in_check
+        self.game_over = len(moves) == 0
+
+    def __repr__(self) -> str:
+        """(str) Returns representation of PositionInfo."""
+        return (f'PositionInfo({len(self.moves)} moves, '
+                f'in_check={self.in_check}, game_over={self.game_over})')
+
+
+class TranspositionTable(object):
+    """A class representing a bounded cache of PositionInfo keyed by
+    (hash, side to move).
+
+    Once full, adding an entry evicts either the least recently used entry
+    (LRU) or the oldest entry (FIFO).
+    """
+    def __init__(self, capacity: int, policy: str = LRU) -> None:
+        """Constructs an empty TranspositionTable.
+
+        Parameters:
+            capacity (int): Maximum number of entries held.
+            policy (str): Replacement policy, either LRU or FIFO.
+
+        Returns:
+            (None)
+        """
+        if capacity <= 0:
+            raise ValueError(f'capacity must be positive, not {capacity}')
+        if policy not in REPLACEMENT_POLICIES:
+            raise ValueError(f'unknown replacement policy {policy!r}')
+        self._capacity = capacity
+        self._policy = policy
+        self._entries = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get_capacity(self) -> int:
+        """(int) Returns maximum number of entries."""
+        return self._capacity
+
+    def get_policy(self) -> str:
+        """(str) Returns replacement policy."""
+        return self._policy
+
+    def get(self, position_hash: int,
+            whites_turn: bool) -> Optional[PositionInfo]:
+        """Looks up a position, counting a hit or a miss.
+
+        Parameters:
+            position_hash (int): Hash of the board.
+            whites_turn (bool): True iff it is white's turn.
+
+        Returns:
+            (Optional[PositionInfo]): The cached entry, if present.
+        """
+        key = (position_hash, whites_turn)
+        entry = self._entries.get(key)
+        if entry is None:
+            self._misses += 1
+            return None
+        self._hits += 1
+        if self._policy == LRU:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, position_hash: int, whites_turn: bool,
+            entry: PositionInfo) -> None:
+        """Stores an entry, evicting another if the table is full.
+
+        Parameters:
+            position_hash (int): Hash of the board.
+            whites_turn (bool): True iff it is white's turn.
+            entry (PositionInfo): What is known about the position.
+
+        Returns:
+            (None)
+        """
+        key = (position_hash, whites_turn)
+        if key in self._entries:
+            self._entries[key] = entry
+            if self._policy == LRU:
+                self._entries.move_to_end(key)
+            return None
+        if len(self._entries) >= self._capacity:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+        self._entries[key] = entry
+        return None
+
+    def clear(self) -> None:
+        """(None) Removes all entries and resets counters."""
+        self._entries.clear()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get_stats(self) -> Dict[str, int]:
+        """(Dict[str, int]) Returns size, hit, miss and eviction counts."""
+        return {
+            'size': len(self._entries),
+            'capacity': self._capacity,
+            'hits': self._hits,
+            'misses': self._misses,
+            'evictions': self._evictions,
+        }
+
+    def __len__(self) -> int:
+        """(int) Returns number of entries held."""
+        return len(self._entries)
+
+    def __repr__(self) -> str:
+        """(str) Returns representation of TranspositionTable."""
+        return f'TranspositionTable({self._capacity}, {self._policy!r})'
+
+
+def probe(table: TranspositionTable, board: Board, whites_turn: bool,
+          position_hash: Optional[int] = None) -> PositionInfo:
+    """Returns legal moves, check status and game over status for a position,
+    computing them only if the position is not already in table.
+
+    Parameters:
+        table (TranspositionTable): Cache of previously seen positions.
+        board (Board): The current state of the board.
+        whites_turn (bool): True iff it is white's turn.
+        position_hash (Optional[int]): Hash of board if already known, e.g.
+            from update_hash().
+
+    Returns:
+        (PositionInfo): What is known about the position.
+    """
+    if position_hash is None:
+        position_hash = hash_board(board)
+    entry = table.get(position_hash, whites_turn)
+    if entry is None:
+        king, checks, pins = get_checks_and_pins(board, whites_turn)
+        moves = list(_iter_legal_moves(board, whites_turn, king, checks,
+                                       pins))
+        entry = PositionInfo(moves, len(checks) > 0)
+        table.put(position_hash, whites_turn, entry)
+    return entry
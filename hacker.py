@@ -1,374 +1,14 @@
 import tkinter as tk
-import random
 from a3_support import *
 from tkinter import messagebox as mb
 from tkinter import filedialog as fd
 from PIL import Image, ImageTk
+from hacker_model import (Blocker, Collectable, Destroyable, Entity, Game,
+                          Grid, Player)
 
 __author__ = "Harold Shaw, 47020665"
 __email__ = "s4702066@student.uq.edu.au"
 
-class Entity(object):
-    """An abstract class representing an Entity within Hacker."""
-    def display(self) -> str:
-        """(str) Returns character representing Entity."""
-        raise NotImplementedError
-
-    def __repr__(self) -> str:
-        """(str) Returns representation of Entity."""
-        return f'{self.__class__.__name__}()'
-
-
-class Player(Entity):
-    """A class representing a Player Entity within Hacker."""
-    def display(self) -> str:
-        return PLAYER
-
-
-class Destroyable(Entity):
-    """A class representing a Destroyable Entity within Hacker."""
-    def display(self) -> str:
-        return DESTROYABLE
-
-
-class Collectable(Entity):
-    """A class representing a Collectable Entity within Hacker."""
-    def display(self) -> str:
-        return COLLECTABLE
-
-
-class Blocker(Entity):
-    """A class representing a Blocker Entity within Hacker."""
-    def display(self) -> str:
-        return BLOCKER
-
-
-class Grid(object):
-    """A class representing a Grid of Entities in Hacker."""
-    def __init__(self, size: int) -> None:
-        """Constructs a Grid.
-
-        Parameters:
-            size (int): Number of rows (and cols) in Grid.
-
-        Returns:
-            (None)
-        """
-        self._size = size
-        self._entities = {}
-
-    def get_size(self) -> int:
-        """(int) Returns Grid size."""
-        return self._size
-
-    def add_entity(self, position: Position, entity: Entity) -> None:
-        """Adds an Entity to Grid at Position.
-
-        Parameters:
-            position (Position): A Position on the Grid.
-            entity (Entity): A Player, Destroyable, Collectable or Blocker.
-
-        Returns:
-            (None)
-        """
-        position_col = position.get_x()
-        position_row = position.get_y()
-
-        # Checks that iff entity is Player, it is in the correct position
-        if (isinstance(entity, Player)) and \
-           (position_col == ((self._size - 1) // 2) and not position_row):
-            self._entities[position] = entity
-        # Checks that iff entity is not a Player, it is in bounds
-        if (not isinstance(entity, Player)) and \
-           (position_row == (self._size - 1)) and (self.in_bounds(position)):
-            self._entities[position] = entity
-        return None
-
-    def get_entities(self) -> Dict[Position, Entity]:
-        """(Dict[Position, Entity]) Returns all Entities on Grid."""
-        return self._entities.copy()
-
-    def get_entity(self, position: Position) -> Optional[Entity]:
-        """Returns Entity at Position.
-
-        Parameters:
-            position (Position): A Position on the Grid.
-
-        Returns:
-            (Optional[Entity]): A Player, Destroyable, Collectable or Blocker.
-        """
-        return self.get_entities().get(position)
-
-    def remove_entity(self, position: Position) -> None:
-        """Removes an Entity from Grid at Position.
-
-        Parameters:
-            position (Position): A Position on the Grid.
-
-        Returns:
-            (None)
-        """
-        self._entities.pop(position)
-        return None
-
-    def serialise(self) -> Dict[Tuple[int, int], str]:
-        """(Dict[Tuple[int, int], str]) Returns serialised mapping of Grid."""
-        serialised = {}
-        for entity in self.get_entities():
-            position_col = entity.get_x()
-            position_row = entity.get_y()
-            serialised_position = (position_col, position_row)
-            serialised_entity = self.get_entities().get(entity).display()
-            serialised[serialised_position] = serialised_entity
-        return serialised
-
-    def in_bounds(self, position: Position) -> bool:
-        """Determines whether Position is valid for Grid.
-
-        Parameters:
-            position (Position): A Position on the Grid.
-
-        Returns:
-            (bool): True iff (x >= 0 and x < GRID_SIZE) and
-                        (y >= 1 and y < GRID_SIZE).
-        """
-        position_col = position.get_x()
-        position_row = position.get_y()
-
-        if not (position_col >= 0 and position_col < self.get_size()):
-            return False
-        if not (position_row >= 1 and position_row < self.get_size()):
-            return False
-        return True
-
-    def __repr__(self) -> str:
-        """(str) Returns representation of Grid."""
-        return f'Grid({self._size})'
-
-
-class Game(object):
-    """A class representing a Game of Hacker."""
-    def __init__(self, size: int) -> None:
-        """Constructs a Game.
-
-        Parameters:
-            size (int): Number of rows (and cols) in Game Grid.
-
-        Returns:
-            (None)
-        """
-        self._flag = None
-        self._grid = Grid(size)
-        self._collectables_collected = 0
-        self._destroyables_destroyed = 0
-        self._total_shots = 0
-
-        # Adds Player Entity to Game Entities
-        self.get_grid().add_entity(self.get_player_position(), Player())
-
-    def get_grid(self) -> Grid:
-        """(Grid) Returns Game Grid."""
-        return self._grid
-
-    def get_player_position(self) -> Position:
-        """(Position) Returns Position of Player on Grid."""
-        median_col = (self.get_grid().get_size() - 1) // 2
-        return Position(median_col, 0)
-
-    def get_num_collected(self) -> int:
-        """(int) Returns total Collectables collected."""
-        return self._collectables_collected
-
-    def get_num_destroyed(self) -> int:
-        """(int) Returns total Destroyables destroyed."""
-        return self._destroyables_destroyed
-
-    def get_total_shots(self) -> int:
-        """(int) Returns total number of shots taken in Game."""
-        return self._total_shots
-
-    def rotate_grid(self, direction: str) -> None:
-        """Rotates Grid in Direction.
-
-        Parameters:
-            direction (str): Direction of Rotation.
-
-        Returns:
-            (None)
-        """
-        # Specifies rotational offset
-        if direction == LEFT:
-            offset = -1
-        else:
-            offset = 1
-
-        to_be_rotated_grid = self.get_grid().get_entities()
-        rotated_grid = {}
-
-        for position in to_be_rotated_grid:
-            position_col = position.get_x()
-            position_row = position.get_y()
-
-            # Keeps Player Position constant
-            if position_row == 0:
-                rotated_grid[position] = to_be_rotated_grid.get(position)
-                continue
-
-            # Checks special cases
-            end_col = self.get_grid().get_size() - 1
-            new_position = Position(position_col + offset, position_row)
-            if (position_col == end_col) and (direction == RIGHT):
-                new_position = Position(0, position_row)
-            if (not position_col) and (direction == LEFT):
-                new_position = Position(end_col, position_row)
-
-            # Updates position with new position
-            rotated_grid[new_position] = to_be_rotated_grid.get(position)
-
-        # Updates grid entities
-        self.get_grid()._entities = rotated_grid
-        return None
-
-    def _create_entity(self, display: str) -> Entity:
-        """(Entity) Creates an Entity for Game."""
-        all_entity_types = [Player(), Collectable(), Destroyable(), Blocker()]
-        for entity in all_entity_types:
-            if entity.display() == display:
-                return entity
-        raise NotImplementedError
-
-    def generate_entities(self) -> None:
-        """
-        Method given to the students to generate a random amount of entities to
-        add into the game after each step
-        """
-        # Generate amount
-        entity_count = random.randint(0, self.get_grid().get_size() - 3)
-        entities = random.choices(ENTITY_TYPES, k=entity_count)
-
-        # Blocker in a 1 in 4 chance
-        blocker = random.randint(1, 4) % 4 == 0
-
-        # UNCOMMENT THIS FOR TASK 3 (CSSE7030)
-        # bomb = False
-        # if not blocker:
-        #     bomb = random.randint(1, 4) % 4 == 0
-
-        total_count = entity_count
-        if blocker:
-            total_count += 1
-            entities.append(BLOCKER)
-
-        # UNCOMMENT THIS FOR TASK 3 (CSSE7030)
-        # if bomb:
-        #     total_count += 1
-        #     entities.append(BOMB)
-
-        entity_index = random.sample(range(self.get_grid().get_size()),
-                                     total_count)
-
-        # Add entities into grid
-        for pos, entity in zip(entity_index, entities):
-            position = Position(pos, self.get_grid().get_size() - 1)
-            new_entity = self._create_entity(entity)
-            self.get_grid().add_entity(position, new_entity)
-
-    def step(self) -> None:
-        """Performs Game's 'step event'.
-
-        A 'step event' is when all entities on a Game's Grid shift by an offset
-        of (0, -1) in the direction of the Player Entity. The only entity which
-        doesn't move during a 'step event' is the Player, as their position
-        is fixed.
-
-        Returns:
-            (None)
-        """
-        offset = -1
-
-        to_be_stepped_grid = self.get_grid().get_entities()
-        stepped_grid = {}
-
-        for position in to_be_stepped_grid:
-            position_col = position.get_x()
-            position_row = position.get_y()
-            position_display = to_be_stepped_grid.get(position).display()
-
-            # Keeps Player Position constant
-            if position_row == 0:
-                stepped_grid[position] = to_be_stepped_grid.get(position)
-                continue
-
-            # Checks if Game is lost
-            if (position_row == 1) and (position_display == DESTROYABLE):
-                self._flag = False
-
-            # Checks special cases
-            new_position = Position(position_col, position_row + offset)
-            if not self.get_grid().in_bounds(new_position):
-                continue
-
-            # Updates Position with new Position
-            stepped_grid[new_position] = to_be_stepped_grid.get(position)
-
-        # Updates Grid Entities
-        self.get_grid()._entities = stepped_grid
-        self.generate_entities()
-        return None
-
-    def fire(self, shot_type: str) -> None:
-        """Performs Player's 'fire' action.
-
-        When a Player 'fires', they shoot either a 'collect' or 'destroy' shot
-        iteratively down the Grid. If the first entity hit is compatible with
-        the type of shot fired, relevant action will be taken.
-
-        Parameters:
-            shot_type (str): Type of shot fired - either COLLECT or DESTROY.
-
-        Returns:
-            (None)
-        """
-        player_position = self.get_player_position()
-        player_col = player_position.get_x()
-        entities = self.get_grid().get_entities()
-
-        # Finds Position and type of Entity shot
-        entity_shot = None
-        for entity_row in range(1, self.get_grid().get_size()):
-            test_position = Position(player_col, entity_row)
-            if entities.get(test_position) is not None:
-                position_shot = test_position
-                entity_shot = entities.get(test_position).display()
-                break
-
-        # Handles Entity cases
-        self._total_shots += 1
-        if (entity_shot == DESTROYABLE) and (shot_type == DESTROY):
-            self._destroyables_destroyed += 1
-            self.get_grid()._entities.pop(position_shot)
-        if (entity_shot == COLLECTABLE) and (shot_type == COLLECT):
-            self._collectables_collected += 1
-            self.get_grid()._entities.pop(position_shot)
-
-        # Checks if Game is won
-        if self.get_num_collected() == COLLECTION_TARGET:
-            self._flag = True
-
-        return None
-
-    def has_won(self) -> bool:
-        """(bool) True iff Player has won Game."""
-        if self._flag:
-            return self._flag
-        return False
-
-    def has_lost(self) -> bool:
-        """(bool) True iff Player has lost Game."""
-        if (not self._flag) and (self._flag is not None):
-            return not self._flag
-        return False
-
 
 class AbstractField(tk.Canvas):
     """An abstract class inheriting from tk.Canvas."""
@@ -997,7 +637,8 @@ class AdvancedHackerController(HackerController):
         self._game._destroyables_destroyed = 0
 
         # Resets Game Grid
-        self._game._grid._entities = {Position(3, 0): Player()}
+        self._game.get_grid().set_entities(
+            {self._game.get_player_position(): Player()})
         self.draw(self._game)
 
         # Recommences recursive step and timer loops
@@ -1035,8 +676,9 @@ class AdvancedHackerController(HackerController):
             self._game._total_shots = int(file.readline())
             self._game._collectables_collected = int(file.readline())
             self._game._destroyables_destroyed = int(file.readline())
-            self._game._grid._entities = eval(file.readline())
-            self._game._grid.add_entity(Position(3, 0), Player())
+            self._game.get_grid().set_entities(eval(file.readline()))
+            self._game.get_grid().add_entity(
+                self._game.get_player_position(), Player())
             self.draw(self._game)
         return None
 
@@ -0,0 +1,669 @@
+"""
+Hacker Game Model
+The entities, grid and rules of Hacker, without any display, so games can be
+played by hacker.py's Tk controllers or run headless by hacker_sim.py.
+"""
+
+import random
+from typing import Dict, List, Optional, Tuple
+
+from a3_support import *
+
+__author__ = "Harold Shaw, 47020665"
+__email__ = "s4702066@student.uq.edu.au"
+
+
+class Entity(object):
+    """An abstract class representing an Entity within Hacker."""
+    def display(self) -> str:
+        """(str) Returns character representing Entity."""
+        raise NotImplementedError
+
+    def __repr__(self) -> str:
+        """(str) Returns representation of Entity."""
+        return f'{self.__class__.__name__}()'
+
+
+class Player(Entity):
+    """A class representing a Player Entity within Hacker."""
+    def display(self) -> str:
+        return PLAYER
+
+
+class Destroyable(Entity):
+    """A class representing a Destroyable Entity within Hacker."""
+    def display(self) -> str:
+        return DESTROYABLE
+
+
+class Collectable(Entity):
+    """A class representing a Collectable Entity within Hacker."""
+    def display(self) -> str:
+        return COLLECTABLE
+
+
+class Blocker(Entity):
+    """A class representing a Blocker Entity within Hacker."""
+    def display(self) -> str:
+        return BLOCKER
+
+
+# Entity class of each display character.
+ENTITY_CLASSES = {
+    PLAYER: Player,
+    COLLECTABLE: Collectable,
+    DESTROYABLE: Destroyable,
+    BLOCKER: Blocker,
+}
+
+def create_entity(display: str) -> Entity:
+    """Creates an Entity from its display character.
+
+    Parameters:
+        display (str): Display character of the Entity.
+
+    Returns:
+        (Entity): A new Player, Destroyable, Collectable or Blocker.
+
+    Raises:
+        NotImplementedError: If no Entity has display character display.
+    """
+    entity_type = ENTITY_CLASSES.get(display)
+    if entity_type is None:
+        raise NotImplementedError
+    return entity_type()
+
+
+# Code of an empty cell in Grid. Each Entity stored is given the next code
+# the first time its display character is seen.
+EMPTY_CODE = 0
+# Code looked up for a display character no Entity in a Grid has yet.
+UNSEEN_CODE = 255
+
+# Maps every code but EMPTY_CODE to 1, marking the occupied cells of a row.
+_OCCUPIED_TABLE = bytes([0]) + bytes([1]) * 255
+
+# Masks keeping each row's bytes in Grid.to_bytes(), by Grid size and columns
+# shown from the end of the stored row, shared so new Grids need not
+# compute them again.
+_rotation_masks = {}
+
+
+class Grid(object):
+    """A class representing a Grid of Entities in Hacker.
+
+    Cells are held in a flat bytearray of entity codes, row by row, so looking
+    up a cell allocates nothing. Entities are stateless, so one Entity of each
+    display character is kept and returned for every cell holding it.
+
+    Rotating and stepping move no cells. Instead a column offset is kept for
+    every row but the Player's, and those rows are a circular buffer whose
+    first row is the one next to the Player. Positions are translated through
+    both when cells are read or written.
+
+    The buffer slots holding an Entity are also kept as one integer, a run
+    of bits for each column as stored, so the Entity nearest the Player in a
+    column is found without a scan and a whole row's bits are replaced at
+    once as Grid steps.
+    """
+    def __init__(self, size: int) -> None:
+        """Constructs a Grid.
+
+        Parameters:
+            size (int): Number of rows (and cols) in Grid.
+
+        Returns:
+            (None)
+        """
+        self._size = size
+        self._cells = bytearray(size * size)
+        # Columns every row but the Player's has been rotated to the right.
+        self._col_offset = 0
+        # Slot, counting from 0 after the Player's row, holding row 1.
+        self._first_row = 0
+        # Occupied slots of every column as stored, column col's slots
+        # starting at bit col * self._slot_stride with the slot after the
+        # Player's row. The stride is a whole number of bytes, so a row's
+        # bits come straight from its bytes.
+        self._slot_bytes = max(1, (size + 6) // 8)
+        self._slot_stride = 8 * self._slot_bytes
+        self._slots = 0
+        # Bit 0 of every column's slots.
+        self._slot_row = int.from_bytes(
+            (b'\x01' + bytes(self._slot_bytes - 1)) * size, 'little')
+        # Entity of each code, and code of each display character.
+        self._kinds = [None]
+        self._codes = {}
+        # Maps each code to its display character's byte, for to_bytes(),
+        # and each display character's byte but the Player's to its code,
+        # for shift_down().
+        self._display_table = bytearray(256)
+        self._code_table = bytearray([UNSEEN_CODE]) * 256
+        self._code_table[EMPTY_CODE] = EMPTY_CODE
+
+    def get_size(self) -> int:
+        """(int) Returns Grid size."""
+        return self._size
+
+    def _get_code(self, entity: Entity) -> int:
+        """(int) Returns the code stored for Entity, assigning one the first
+        time its display character is seen."""
+        display = entity.display()
+        code = self._codes.get(display)
+        if code is None:
+            code = len(self._kinds)
+            self._kinds.append(entity)
+            self._codes[display] = code
+            self._display_table[code] = ord(display)
+            # The Player's byte stays unseen, so shift_down() rejects it.
+            if display != PLAYER:
+                self._code_table[ord(display)] = code
+        return code
+
+    def _get_index(self, position: Position) -> Optional[int]:
+        """(Optional[int]) Returns index of Position's cell, or None if it is
+        off Grid."""
+        position_col = position.get_x()
+        position_row = position.get_y()
+        if not (0 <= position_col < self._size and
+                0 <= position_row < self._size):
+            return None
+        if position_row == 0:
+            return position_col
+        return (self._get_row_start(position_row)
+                + (position_col - self._col_offset) % self._size)
+
+    def _get_row_start(self, row: int) -> int:
+        """(int) Returns index of the first cell of a row other than the
+        Player's."""
+        slot = (row - 1 + self._first_row) % (self._size - 1)
+        return (slot + 1) * self._size
+
+    def _set_cell(self, index: int, code: int) -> None:
+        """(None) Stores code in the cell at index, keeping the column
+        bitmasks up to date."""
+        self._cells[index] = code
+        cell_row, cell_col = divmod(index, self._size)
+        if cell_row == 0:
+            return None
+        slot_bit = 1 << (cell_col * self._slot_stride + cell_row - 1)
+        if code == EMPTY_CODE:
+            self._slots &= ~slot_bit
+        else:
+            self._slots |= slot_bit
+        return None
+
+    def _get_row_slots(self, codes: bytes) -> int:
+        """(int) Returns the bits, for slot 0, of the occupied cells in a row
+        of codes as stored."""
+        occupied = codes.translate(_OCCUPIED_TABLE)
+        if self._slot_bytes > 1:
+            spaced = bytearray(len(occupied) * self._slot_bytes)
+            spaced[::self._slot_bytes] = occupied
+            occupied = spaced
+        return int.from_bytes(occupied, 'little')
+
+    def _get_position(self, index: int) -> Tuple[int, int]:
+        """(Tuple[int, int]) Returns (col, row) of the cell at index."""
+        cell_row, cell_col = divmod(index, self._size)
+        if cell_row == 0:
+            return cell_col, cell_row
+        position_row = (cell_row - 1 - self._first_row) % (self._size - 1) + 1
+        return (cell_col + self._col_offset) % self._size, position_row
+
+    def add_entity(self, position: Position, entity: Entity) -> None:
+        """Adds an Entity to Grid at Position.
+
+        Parameters:
+            position (Position): A Position on the Grid.
+            entity (Entity): A Player, Destroyable, Collectable or Blocker.
+
+        Returns:
+            (None)
+        """
+        position_col = position.get_x()
+        position_row = position.get_y()
+
+        # Checks that iff entity is Player, it is in the correct position
+        if (isinstance(entity, Player)) and \
+           (position_col == ((self._size - 1) // 2) and not position_row):
+            self._set_cell(position_col, self._get_code(entity))
+        # Checks that iff entity is not a Player, it is in bounds
+        if (not isinstance(entity, Player)) and \
+           (position_row == (self._size - 1)) and (self.in_bounds(position)):
+            self._set_cell(self._get_index(position), self._get_code(entity))
+        return None
+
+    def set_entities(self, entities: Dict[Position, Entity]) -> None:
+        """Replaces every Entity on Grid, placing each where given without
+        the checks made by add_entity.
+
+        Parameters:
+            entities (Dict[Position, Entity]): Entities and their Positions.
+
+        Returns:
+            (None)
+        """
+        self._cells = bytearray(self._size * self._size)
+        self._col_offset = 0
+        self._first_row = 0
+        self._slots = 0
+        for position, entity in entities.items():
+            index = self._get_index(position)
+            if index is not None:
+                self._set_cell(index, self._get_code(entity))
+        return None
+
+    def get_entities(self) -> Dict[Position, Entity]:
+        """(Dict[Position, Entity]) Returns a new mapping of all Entities on
+        Grid."""
+        entities = {}
+        kinds = self._kinds
+        for index, code in enumerate(self._cells):
+            if code != EMPTY_CODE:
+                position_col, position_row = self._get_position(index)
+                entities[Position(position_col, position_row)] = kinds[code]
+        return entities
+
+    def get_entity(self, position: Position) -> Optional[Entity]:
+        """Returns Entity at Position.
+
+        Parameters:
+            position (Position): A Position on the Grid.
+
+        Returns:
+            (Optional[Entity]): A Player, Destroyable, Collectable or Blocker.
+        """
+        index = self._get_index(position)
+        if index is None:
+            return None
+        return self._kinds[self._cells[index]]
+
+    def remove_entity(self, position: Position) -> None:
+        """Removes an Entity from Grid at Position.
+
+        Parameters:
+            position (Position): A Position on the Grid.
+
+        Returns:
+            (None)
+
+        Raises:
+            KeyError: If there is no Entity at Position.
+        """
+        index = self._get_index(position)
+        if index is None or self._cells[index] == EMPTY_CODE:
+            raise KeyError(position)
+        self._set_cell(index, EMPTY_CODE)
+        return None
+
+    def serialise(self) -> Dict[Tuple[int, int], str]:
+        """(Dict[Tuple[int, int], str]) Returns serialised mapping of Grid."""
+        serialised = {}
+        displays = [None] + [kind.display() for kind in self._kinds[1:]]
+        for index, code in enumerate(self._cells):
+            if code != EMPTY_CODE:
+                serialised[self._get_position(index)] = displays[code]
+        return serialised
+
+    def to_bytes(self) -> bytes:
+        """Describes every cell compactly, e.g. as an observation for an
+        agent.
+
+        Returns:
+            (bytes): The display character of each cell as one byte, or 0
+                where it is empty, row by row from the Player's row and
+                column by column within each row.
+        """
+        size = self._size
+        cells = self._cells.translate(self._display_table)
+        # Rows after the Player's, from row 1 up, as stored.
+        start = (self._first_row + 1) * size
+        rows = cells[start:] + cells[size:start]
+        if self._col_offset == 0:
+            return bytes(cells[:size] + rows)
+        # Rotated columns stored from col 0 are shown from col offset. Every
+        # row is rotated at once, as one integer shifted both ways and masked
+        # back within its own row.
+        split = size - self._col_offset
+        masks = _rotation_masks.get((size, split))
+        if masks is None:
+            masks = _rotation_masks[size, split] = (
+                int.from_bytes((b'\xff' * (size - split) + bytes(split))
+                               * (size - 1), 'big'),
+                int.from_bytes((bytes(size - split) + b'\xff' * split)
+                               * (size - 1), 'big'))
+        value = int.from_bytes(rows, 'big')
+        value = (((value << 8 * split) & masks[0])
+                 | ((value >> 8 * (size - split)) & masks[1]))
+        return bytes(cells[:size]) + value.to_bytes(len(rows), 'big')
+
+    def rotate(self, offset: int) -> None:
+        """Moves every Entity but the Player offset columns to the right,
+        wrapping around the edges of Grid.
+
+        Parameters:
+            offset (int): Columns to move by, negative for left.
+
+        Returns:
+            (None)
+        """
+        self._col_offset = (self._col_offset + offset) % self._size
+        return None
+
+    def fill_top_row(self, cols: List[int], displays: List[str]) -> None:
+        """Adds Entities to the top row of Grid, as add_entity would one at a
+        time.
+
+        Parameters:
+            cols (List[int]): Column of each Entity.
+            displays (List[str]): Display character of each Entity, for
+                Destroyables, Collectables or Blockers.
+
+        Returns:
+            (None)
+        """
+        size = self._size
+        if size < 2:
+            return None
+        start = self._get_row_start(size - 1)
+        slot_bit = 1 << (start // size - 1)
+        stride = self._slot_stride
+        offset = self._col_offset
+        cells = self._cells
+        codes = self._codes
+        for col, display in zip(cols, displays):
+            if 0 <= col < size and display != PLAYER:
+                cell_col = (col - offset) % size
+                code = codes.get(display)
+                if code is None:
+                    code = self._get_code(create_entity(display))
+                cells[start + cell_col] = code
+                self._slots |= slot_bit << (cell_col * stride)
+        return None
+
+    def shift_down(self, top_row: Optional[bytes] = None) -> None:
+        """Moves every Entity but the Player one row towards the Player,
+        removing those already in the row next to the Player.
+
+        The row next to the Player is cleared and becomes the top row, holding
+        top_row if it is given. Entities are added from top_row without
+        creating one for each cell, so a whole row costs about as much as an
+        empty one.
+
+        Parameters:
+            top_row (Optional[bytes]): The display character of each cell of
+                the new top row as one byte, or 0 where it is empty, column by
+                column as in to_bytes().
+
+        Returns:
+            (None)
+
+        Raises:
+            NotImplementedError: If a byte of top_row is not the display
+                character of a Destroyable, Collectable or Blocker.
+        """
+        size = self._size
+        if size < 2:
+            return None
+        first_row = self._first_row
+        start = (first_row + 1) * size
+        end = start + size
+        slots = self._slots & ~(self._slot_row << first_row)
+        if top_row is None:
+            if self._cells.count(EMPTY_CODE, start, end) != size:
+                self._cells[start:end] = bytes(size)
+                self._slots = slots
+        else:
+            codes = top_row.translate(self._code_table)
+            if UNSEEN_CODE in codes:
+                for byte in set(top_row):
+                    if self._code_table[byte] == UNSEEN_CODE:
+                        display = chr(byte)
+                        if display == PLAYER:
+                            raise NotImplementedError
+                        self._get_code(create_entity(display))
+                codes = top_row.translate(self._code_table)
+            # Stored cells are rotated, as in fill_top_row().
+            offset = self._col_offset
+            if offset:
+                codes = codes[offset:] + codes[:offset]
+            self._cells[start:end] = codes
+            self._slots = slots | self._get_row_slots(codes) << first_row
+        self._first_row = (first_row + 1) % (size - 1)
+        return None
+
+    def get_lowest_position(self, col: int) -> Optional[Position]:
+        """Finds the Entity nearest the Player in a column, ignoring the
+        Player.
+
+        Parameters:
+            col (int): A column of the Grid.
+
+        Returns:
+            (Optional[Position]): Position of the Entity, or None if the
+                column is empty.
+        """
+        size = self._size
+        if not 0 <= col < size:
+            return None
+        num_slots = size - 1
+        cell_col = (col - self._col_offset) % size
+        slots = ((self._slots >> (cell_col * self._slot_stride))
+                 & ((1 << num_slots) - 1))
+        if slots == 0:
+            return None
+        # Rotates the slots so bit 0 is row 1.
+        first_row = self._first_row
+        rows = ((slots >> first_row)
+                | (slots << (num_slots - first_row)) & ((1 << num_slots) - 1))
+        return Position(col, (rows & -rows).bit_length())
+
+    def row_contains(self, row: int, display: str) -> bool:
+        """Determines whether an Entity is in a row of Grid.
+
+        Parameters:
+            row (int): A row of the Grid.
+            display (str): Display character of the Entity.
+
+        Returns:
+            (bool): True iff an Entity with display character display is in
+                row.
+        """
+        code = self._codes.get(display)
+        if code is None or not 0 <= row < self._size:
+            return False
+        start = 0 if row == 0 else self._get_row_start(row)
+        return self._cells.find(code, start, start + self._size) != -1
+
+    def in_bounds(self, position: Position) -> bool:
+        """Determines whether Position is valid for Grid.
+
+        Parameters:
+            position (Position): A Position on the Grid.
+
+        Returns:
+            (bool): True iff (x >= 0 and x < GRID_SIZE) and
+                        (y >= 1 and y < GRID_SIZE).
+        """
+        position_col = position.get_x()
+        position_row = position.get_y()
+
+        if not (position_col >= 0 and position_col < self.get_size()):
+            return False
+        if not (position_row >= 1 and position_row < self.get_size()):
+            return False
+        return True
+
+    def __repr__(self) -> str:
+        """(str) Returns representation of Grid."""
+        return f'Grid({self._size})'
+
+
+class Game(object):
+    """A class representing a Game of Hacker."""
+    def __init__(self, size: int,
+                 generator: Optional[random.Random] = None) -> None:
+        """Constructs a Game.
+
+        Parameters:
+            size (int): Number of rows (and cols) in Game Grid.
+            generator (Optional[random.Random]): Chooses the Entities added
+                after each step, the random module itself if not given.
+
+        Returns:
+            (None)
+        """
+        self._random = random if generator is None else generator
+        self._flag = None
+        self._grid = Grid(size)
+        self._collectables_collected = 0
+        self._destroyables_destroyed = 0
+        self._total_shots = 0
+
+        # Adds Player Entity to Game Entities
+        self.get_grid().add_entity(self.get_player_position(), Player())
+
+    def get_grid(self) -> Grid:
+        """(Grid) Returns Game Grid."""
+        return self._grid
+
+    def get_player_position(self) -> Position:
+        """(Position) Returns Position of Player on Grid."""
+        median_col = (self.get_grid().get_size() - 1) // 2
+        return Position(median_col, 0)
+
+    def get_num_collected(self) -> int:
+        """(int) Returns total Collectables collected."""
+        return self._collectables_collected
+
+    def get_num_destroyed(self) -> int:
+        """(int) Returns total Destroyables destroyed."""
+        return self._destroyables_destroyed
+
+    def get_total_shots(self) -> int:
+        """(int) Returns total number of shots taken in Game."""
+        return self._total_shots
+
+    def rotate_grid(self, direction: str) -> None:
+        """Rotates Grid in Direction.
+
+        Parameters:
+            direction (str): Direction of Rotation.
+
+        Returns:
+            (None)
+        """
+        # Specifies rotational offset
+        if direction == LEFT:
+            offset = -1
+        else:
+            offset = 1
+
+        self.get_grid().rotate(offset)
+        return None
+
+    def generate_entities(self) -> None:
+        """
+        Method given to the students to generate a random amount of entities to
+        add into the game after each step
+        """
+        size = self.get_grid().get_size()
+        # Generate amount
+        entity_count = self._random.randint(0, size - 3)
+        entities = self._random.choices(ENTITY_TYPES, k=entity_count)
+
+        # Blocker in a 1 in 4 chance
+        blocker = self._random.randint(1, 4) % 4 == 0
+
+        # UNCOMMENT THIS FOR TASK 3 (CSSE7030)
+        # bomb = False
+        # if not blocker:
+        #     bomb = self._random.randint(1, 4) % 4 == 0
+
+        total_count = entity_count
+        if blocker:
+            total_count += 1
+            entities.append(BLOCKER)
+
+        # UNCOMMENT THIS FOR TASK 3 (CSSE7030)
+        # if bomb:
+        #     total_count += 1
+        #     entities.append(BOMB)
+
+        entity_index = self._random.sample(range(size), total_count)
+
+        # Add entities into grid
+        self.get_grid().fill_top_row(entity_index, entities)
+
+    def step(self) -> None:
+        """Performs Game's 'step event'.
+
+        A 'step event' is when all entities on a Game's Grid shift by an offset
+        of (0, -1) in the direction of the Player Entity. The only entity which
+        doesn't move during a 'step event' is the Player, as their position
+        is fixed.
+
+        Returns:
+            (None)
+        """
+        grid = self.get_grid()
+
+        # Checks if Game is lost
+        if grid.row_contains(1, DESTROYABLE):
+            self._flag = False
+
+        # Moves every Entity but the Player one row down
+        grid.shift_down()
+        self.generate_entities()
+        return None
+
+    def fire(self, shot_type: str) -> None:
+        """Performs Player's 'fire' action.
+
+        When a Player 'fires', they shoot either a 'collect' or 'destroy' shot
+        iteratively down the Grid. If the first entity hit is compatible with
+        the type of shot fired, relevant action will be taken.
+
+        Parameters:
+            shot_type (str): Type of shot fired - either COLLECT or DESTROY.
+
+        Returns:
+            (None)
+        """
+        player_position = self.get_player_position()
+        player_col = player_position.get_x()
+        grid = self.get_grid()
+
+        # Finds Position and type of Entity shot
+        entity_shot = None
+        position_shot = grid.get_lowest_position(player_col)
+        if position_shot is not None:
+            entity_shot = grid.get_entity(position_shot).display()
+
+        # Handles Entity cases
+        self._total_shots += 1
+        if (entity_shot == DESTROYABLE) and (shot_type == DESTROY):
+            self._destroyables_destroyed += 1
+            grid.remove_entity(position_shot)
+        if (entity_shot == COLLECTABLE) and (shot_type == COLLECT):
+            self._collectables_collected += 1
+            grid.remove_entity(position_shot)
+
+        # Checks if Game is won
+        if self.get_num_collected() == COLLECTION_TARGET:
+            self._flag = True
+
+        return None
+
+    def has_won(self) -> bool:
+        """(bool) True iff Player has won Game."""
+        if self._flag:
+            return self._flag
+        return False
+
+    def has_lost(self) -> bool:
+        """(bool) True iff Player has lost Game."""
+        if (not self._flag) and (self._flag is not None):
+            return not self._flag
+        return False
@@ -0,0 +1,375 @@
+"""
+Hacker Simulator
+Plays Hacker without a display or timer, for training and evaluating agents.
+Each call to step() takes one action, and the grid steps once every
+actions_per_tick actions rather than every 2 seconds, so games run as fast as
+the model allows.
+
+Observations are Grid.to_bytes(): one byte per cell, row by row from the
+Player's row, holding the display character of the Entity there or 0.
+
+Usage:
+    python hacker_sim.py [--size N] [--ticks N] [--actions-per-tick N]
+                         [--seed N]
+"""
+
+import argparse
+import itertools
+import math
+import random
+import time
+from typing import List, Optional, Tuple
+
+from a3_support import *
+from hacker_model import Game
+
+__author__ = "Harold Shaw, 47020665"
+__email__ = "s4702066@student.uq.edu.au"
+
+# Actions accepted by HackerSimulator.step().
+NO_ACTION = 0
+ROTATE_LEFT = 1
+ROTATE_RIGHT = 2
+FIRE_COLLECT = 3
+FIRE_DESTROY = 4
+NUM_ACTIONS = 5
+
+COLLECT_REWARD = 1.0
+DESTROY_REWARD = 1.0
+WIN_REWARD = 10.0
+LOSS_REWARD = -10.0
+
+DEFAULT_BENCHMARK_TICKS = 100000
+
+ENTITY_BYTES = [ord(display) for display in ENTITY_TYPES]
+BLOCKER_BYTE = ord(BLOCKER)
+# Chance of Game.generate_entities() adding a Blocker.
+BLOCKER_CHANCE = 0.25
+# Most distinct top rows listed by tabulate_rows().
+MAX_TABULATED_ROWS = 1 << 16
+# Top rows drawn at once from the rows listed by tabulate_rows().
+ROW_BATCH = 256
+
+# Every top row which can be added and the cumulative chance of each.
+RowTable = Tuple[List[bytes], List[float]]
+
+
+def tabulate_rows(size: int) -> Optional[RowTable]:
+    """Lists every top row Game.generate_entities() can add to a Grid, with
+    its chance, so one can be drawn with a single random number.
+
+    Parameters:
+        size (int): Number of rows (and cols) in the Grid.
+
+    Returns:
+        (Optional[RowTable]): Each row as described by Grid.to_bytes() and the
+            cumulative chances, or None if there are more than
+            MAX_TABULATED_ROWS rows.
+    """
+    num_types = len(ENTITY_BYTES)
+    num_counts = size - 2
+    num_rows = sum(math.comb(size, count) * num_types ** count
+                   + math.comb(size, count + 1) * (count + 1)
+                   * num_types ** count for count in range(num_counts))
+    if num_counts < 1 or num_rows > MAX_TABULATED_ROWS:
+        return None
+
+    rows = []
+    chances = []
+    for entity_count in range(num_counts):
+        for blocker in (False, True):
+            total_count = entity_count + blocker
+            # Every set of columns is equally likely, as is every choice of
+            # types and which column holds the Blocker.
+            chance = ((BLOCKER_CHANCE if blocker else 1 - BLOCKER_CHANCE)
+                      / num_counts / math.comb(size, total_count)
+                      / num_types ** entity_count
+                      / (total_count if blocker else 1))
+            for cols in itertools.combinations(range(size), total_count):
+                blocker_cols = cols if blocker else (None,)
+                for blocker_col in blocker_cols:
+                    entity_cols = [col for col in cols if col != blocker_col]
+                    for types in itertools.product(ENTITY_BYTES,
+                                                   repeat=entity_count):
+                        row = bytearray(size)
+                        for col, byte in zip(entity_cols, types):
+                            row[col] = byte
+                        if blocker_col is not None:
+                            row[blocker_col] = BLOCKER_BYTE
+                        rows.append(bytes(row))
+                        chances.append(chance)
+    return rows, list(itertools.accumulate(chances))
+
+
+class SimulationGame(Game):
+    """A class representing a Game of Hacker which writes each new top row
+    straight into its Grid as the Grid steps.
+
+    Entities are drawn from the same distribution as Game.generate_entities()
+    draws them, to within the 2**-53 resolution of random(), but not in the
+    same sequence for a seed. Given a table from tabulate_rows(), whole rows
+    are drawn ROW_BATCH at a time.
+    """
+    def __init__(self, size: int, generator: random.Random,
+                 row_table: Optional[RowTable] = None) -> None:
+        """Constructs a SimulationGame.
+
+        Parameters:
+            size (int): Number of rows (and cols) in Game Grid.
+            generator (random.Random): Chooses the Entities added after each
+                step.
+            row_table (Optional[RowTable]): tabulate_rows(size), or None to
+                choose each Entity in turn.
+
+        Returns:
+            (None)
+        """
+        super().__init__(size, generator)
+        self._row_table = row_table
+        # Columns in the order last shuffled, so sampling them needs no new
+        # list each step.
+        self._columns = list(range(size))
+        # Rows drawn from row_table and not yet added.
+        self._rows = []
+
+    def reset(self, seed: Optional[int] = None) -> None:
+        """Starts the Game again on an empty Grid, keeping the Entity codes
+        the Grid has already assigned.
+
+        Parameters:
+            seed (Optional[int]): Reseeds the generator if given, discarding
+                rows already drawn and the order columns were shuffled into,
+                otherwise the new Game continues the previous random
+                sequence.
+
+        Returns:
+            (None)
+        """
+        if seed is not None:
+            self._random.seed(seed)
+            self._rows = []
+            self._columns.sort()
+        grid = self.get_grid()
+        player_position = self.get_player_position()
+        grid.set_entities({player_position: grid.get_entity(player_position)})
+        self._flag = None
+        self._collectables_collected = 0
+        self._destroyables_destroyed = 0
+        self._total_shots = 0
+        return None
+
+    def generate_row(self) -> bytes:
+        """Chooses a random top row, choosing the number of Entities, their
+        types, whether to add a Blocker and their columns as
+        Game.generate_entities() does.
+
+        Returns:
+            (bytes): The row as described by Grid.to_bytes().
+        """
+        if self._row_table is not None:
+            if not self._rows:
+                rows, cumulative_chances = self._row_table
+                self._rows = self._random.choices(
+                    rows, cum_weights=cumulative_chances, k=ROW_BATCH)
+            return self._rows.pop()
+
+        size = self.get_grid().get_size()
+        random = self._random.random
+        entity_count = int(random() * (size - 2))
+        total_count = entity_count
+        if random() < BLOCKER_CHANCE:
+            total_count += 1
+
+        row = bytearray(size)
+        columns = self._columns
+        num_types = len(ENTITY_BYTES)
+        # A partial Fisher-Yates shuffle chooses distinct columns.
+        for index in range(total_count):
+            other = index + int(random() * (size - index))
+            col = columns[other]
+            columns[other] = columns[index]
+            columns[index] = col
+            if index < entity_count:
+                row[col] = ENTITY_BYTES[int(random() * num_types)]
+            else:
+                row[col] = BLOCKER_BYTE
+        return bytes(row)
+
+    def step(self) -> None:
+        """Performs Game's 'step event' as Game.step() does, adding the new
+        top row as the Grid shifts.
+
+        Returns:
+            (None)
+        """
+        grid = self._grid
+
+        # Checks if Game is lost
+        if grid.row_contains(1, DESTROYABLE):
+            self._flag = False
+
+        grid.shift_down(self.generate_row())
+        return None
+
+
+class HackerSimulator(object):
+    """A class representing a headless Game of Hacker with a reset() and
+    step(action) interface."""
+    def __init__(self, size: int = GRID_SIZE, seed: Optional[int] = None,
+                 actions_per_tick: int = 1,
+                 max_ticks: Optional[int] = None) -> None:
+        """Constructs a HackerSimulator and starts its first Game.
+
+        Parameters:
+            size (int): Number of rows (and cols) in the Game Grid.
+            seed (Optional[int]): Seed for the Entities added each step.
+            actions_per_tick (int): Actions taken between steps of the Grid.
+            max_ticks (Optional[int]): Steps after which a Game ends, or None
+                to play until it is won or lost.
+
+        Returns:
+            (None)
+        """
+        self._size = size
+        self._actions_per_tick = actions_per_tick
+        self._max_ticks = max_ticks
+        self._random = random.Random(seed)
+        self._row_table = tabulate_rows(size)
+        self._game = SimulationGame(size, self._random, self._row_table)
+        # Bound once, as the Game and its Grid are kept across resets.
+        self._to_bytes = self._game.get_grid().to_bytes
+        self.reset()
+
+    def reset(self, seed: Optional[int] = None) -> bytes:
+        """Starts a new Game.
+
+        Parameters:
+            seed (Optional[int]): Reseeds the simulator if given, otherwise
+                the new Game continues the previous random sequence.
+
+        Returns:
+            (bytes): Observation of the new Game.
+        """
+        self._game.reset(seed)
+        self._actions = 0
+        self._ticks = 0
+        self._done = False
+        self._observation = self._to_bytes()
+        return self._observation
+
+    def step(self, action: int) -> Tuple[bytes, float, bool]:
+        """Takes an action, then steps the Grid if a tick has passed.
+
+        Parameters:
+            action (int): One of NO_ACTION, ROTATE_LEFT, ROTATE_RIGHT,
+                FIRE_COLLECT or FIRE_DESTROY.
+
+        Returns:
+            (Tuple[bytes, float, bool]): Observation after the action, the
+                reward for it and True iff the Game is over.
+
+        Raises:
+            ValueError: If action is not one of the actions.
+            RuntimeError: If the Game is already over.
+        """
+        if self._done:
+            raise RuntimeError('game is over, call reset() to start another')
+        game = self._game
+        reward = 0.0
+        # The observation is only described again once the Grid changes.
+        changed = False
+        if action == ROTATE_LEFT:
+            game.rotate_grid(LEFT)
+            changed = True
+        elif action == ROTATE_RIGHT:
+            game.rotate_grid(RIGHT)
+            changed = True
+        elif action == FIRE_COLLECT or action == FIRE_DESTROY:
+            collected = game.get_num_collected()
+            destroyed = game.get_num_destroyed()
+            game.fire(COLLECT if action == FIRE_COLLECT else DESTROY)
+            collected = game.get_num_collected() - collected
+            destroyed = game.get_num_destroyed() - destroyed
+            if collected or destroyed:
+                reward += (COLLECT_REWARD * collected
+                           + DESTROY_REWARD * destroyed)
+                changed = True
+            # Only a collection can win the Game.
+            if collected and game.has_won():
+                reward += WIN_REWARD
+                self._done = True
+        elif action != NO_ACTION:
+            raise ValueError(f'unknown action {action!r}')
+
+        if not self._done:
+            self._actions += 1
+            if self._actions == self._actions_per_tick:
+                self._actions = 0
+                self._ticks += 1
+                game.step()
+                changed = True
+                if game.has_lost():
+                    reward += LOSS_REWARD
+                    self._done = True
+                elif self._ticks == self._max_ticks:
+                    self._done = True
+        if changed:
+            self._observation = self._to_bytes()
+        return self._observation, reward, self._done
+
+    def get_game(self) -> Game:
+        """(Game) Returns the Game being played, which reset() starts
+        again."""
+        return self._game
+
+    def get_ticks(self) -> int:
+        """(int) Returns number of steps of the Grid in this Game."""
+        return self._ticks
+
+    def __repr__(self) -> str:
+        """(str) Returns representation of HackerSimulator."""
+        return (f'HackerSimulator(size={self._size}, '
+                f'actions_per_tick={self._actions_per_tick}, '
+                f'max_ticks={self._max_ticks})')
+
+
+def main():
+    """Entry point to the simulator benchmark, playing random actions."""
+    parser = argparse.ArgumentParser(description='Benchmark the headless '
+                                                 'Hacker simulator.')
+    parser.add_argument('--size', type=int, default=GRID_SIZE,
+                        help=f'rows (and cols) of the grid (default '
+                             f'{GRID_SIZE})')
+    parser.add_argument('--ticks', type=int, default=DEFAULT_BENCHMARK_TICKS,
+                        help='grid steps to simulate (default '
+                             f'{DEFAULT_BENCHMARK_TICKS})')
+    parser.add_argument('--actions-per-tick', type=int, default=1,
+                        help='actions between grid steps (default 1)')
+    parser.add_argument('--seed', type=int,
+                        help='seed for the games and actions')
+    args = parser.parse_args()
+
+    simulator = HackerSimulator(args.size, args.seed, args.actions_per_tick,
+                                args.ticks)
+    agent = random.Random(args.seed).random
+    step = simulator.step
+    games = 1
+    total_reward = 0.0
+    ticks = 0
+    start = time.perf_counter()
+    while ticks < args.ticks:
+        done = False
+        while not done:
+            observation, reward, done = step(int(agent() * NUM_ACTIONS))
+            total_reward += reward
+        ticks += simulator.get_ticks()
+        if ticks < args.ticks:
+            simulator.reset()
+            games += 1
+    elapsed = time.perf_counter() - start
+    print(f'{ticks} ticks over {games} games in {elapsed:.2f}s, '
+          f'{ticks / elapsed:.0f} ticks/s, mean reward '
+          f'{total_reward / games:.2f}')
+
+if __name__ == "__main__":
+    main()
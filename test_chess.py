@@ -0,0 +1,1173 @@
+"""
+Chess Tests
+Checks of the chess modules, run with pytest.
+"""
+
+import asyncio
+import random
+from array import array
+
+import pytest
+
+from a1_support import *
+from a3_support import (BLOCKER, COLLECT, COLLECTABLE, COLLECTION_TARGET,
+                        DESTROY, DESTROYABLE, ENTITY_TYPES, LEFT, PLAYER,
+                        RIGHT, Position)
+from chess import (CAPTURE_FLAG, CHECK, CHECKMATE, DRAW, MOVE_MASK, NORMAL,
+                   NUM_MOVE_CODES, PROMOTION_FLAG, PROMOTION_PIECES, STALEMATE,
+                   IllegalMoveError, MutableBoard, can_move, can_piece_perform,
+                   check_game_over, decode_move, decode_move_text, encode_move,
+                   encode_move_text, encode_moves, generate_legal_move_codes,
+                   generate_legal_moves, get_move_flags, get_move_promotion,
+                   get_possible_moves, initial_state, is_current_players_piece,
+                   is_move_position_valid, is_move_valid, is_position_attacked,
+                   is_stalemate, perft, process_move, update_board,
+                   validate_game)
+from chess_batch import (benchmark, evaluate_boards, evaluate_planes,
+                         mobility, mobility_scores, pack_boards,
+                         random_positions, to_planes)
+import chess_bitboard
+from chess_book import OpeningBook, build_book, write_book
+from chess_draws import (FIFTY_MOVES, HALFMOVE_LIMIT, REPETITION,
+                         GameState)
+from chess_fen import (PACKED_SIZE, board_to_fen, fen_to_board,
+                       iter_packed_boards, pack_board, unpack_board)
+from chess_games import check_game, read_games
+from chess_parallel import ParallelSearcher, SharedTranspositionTable
+from chess_perft import TEST_POSITIONS, validator_perft
+from chess_positions import DRAW as DRAWN_GAME
+from chess_positions import BLACK_WIN, PositionStore
+from chess_profile import (PROFILE_VARIABLE, Profiler, format_snapshot,
+                           get_profile_setting)
+from chess_search import EXACT, LOWER_BOUND, MATE_SCORE, Searcher, evaluate
+from chess_state import BoardState
+from chess_selfplay import CHECKMATE as MATE_REASON
+from chess_selfplay import play_game
+from chess_server import ValidationBatcher, ValidationServer
+from chess_tablebase import (ENDINGS, LOSS, TABLE_EXTENSION, Tablebase,
+                             generate_table)
+from chess_tables import (ALL_DIRECTIONS, DIAGONAL_DIRECTIONS,
+                          ORTHOGONAL_DIRECTIONS, get_attack_tables)
+from chess_zobrist import (FIFO, LRU, PositionInfo, TranspositionTable,
+                           hash_board, hash_position, probe, update_hash)
+from hacker_model import Game, Grid, create_entity
+from hacker_sim import (COLLECT_REWARD, FIRE_COLLECT, FIRE_DESTROY,
+                        LOSS_REWARD, NO_ACTION, NUM_ACTIONS, ROTATE_LEFT,
+                        WIN_REWARD, HackerSimulator)
+
+__author__ = "Harold Shaw, 47020665"
+__email__ = "s4702066@student.uq.edu.au"
+
+# Black king boxed in on h8 by its own pawns, white rook about to mate.
+BACK_RANK_BOARD = (
+    '.......k',
+    '......pp',
+    '........',
+    '........',
+    '........',
+    '........',
+    '........',
+    'R......K',
+)
+
+
+def test_mate_reaching_fifty_move_limit_is_checkmate():
+    """Mate on the ply reaching the fifty-move limit ends the game as
+    checkmate, not a draw."""
+    game_state = GameState(BACK_RANK_BOARD, True, HALFMOVE_LIMIT - 1)
+    move = process_move('a1 a8')
+    game_state.update(BACK_RANK_BOARD, move)
+    board = update_board(BACK_RANK_BOARD, move)
+    assert game_state.get_halfmove_clock() == HALFMOVE_LIMIT
+
+    result = check_game_over(board, False, game_state)
+    assert result.status == CHECKMATE
+    assert result.draw_reason is None
+    assert result.checking_pieces == [(0, 0)]
+
+def test_fifty_move_limit_without_mate_is_draw():
+    """Reaching the fifty-move limit with legal moves left is a draw."""
+    game_state = GameState(BACK_RANK_BOARD, True, HALFMOVE_LIMIT - 1)
+    move = process_move('a1 a2')
+    game_state.update(BACK_RANK_BOARD, move)
+    board = update_board(BACK_RANK_BOARD, move)
+
+    result = check_game_over(board, False, game_state)
+    assert result.status == DRAW
+    assert result.draw_reason == FIFTY_MOVES
+
+def _valid_moves(board, whites_turn, board_state=None):
+    """(Set[Move]) Returns every candidate move is_move_valid() accepts."""
+    valid = set()
+    for row_index, row in enumerate(board):
+        for col_index, character in enumerate(row):
+            if is_current_players_piece(character, whites_turn):
+                position = (row_index, col_index)
+                for target in get_possible_moves(position, board):
+                    if is_move_valid((position, target), board, whites_turn,
+                                     board_state):
+                        valid.add((position, target))
+    return valid
+
+def test_is_move_valid_matches_legal_moves_through_a_game():
+    """is_move_valid() accepts exactly the generated legal moves, with or
+    without a BoardState following the game forwards and back."""
+    moves = ['e2 e4', 'e7 e5', 'd1 h5', 'b8 c6', 'f1 c4', 'g8 f6', 'h5 f7']
+    board = initial_state()
+    whites_turn = True
+    board_state = BoardState(board)
+    positions = []
+    for text in moves + [None]:
+        legal = set(generate_legal_moves(board, whites_turn))
+        assert _valid_moves(board, whites_turn) == legal
+        assert _valid_moves(board, whites_turn, board_state) == legal
+        positions.append((board, whites_turn, legal))
+        if text is not None:
+            board_state.make_move(process_move(text))
+            board = update_board(board, process_move(text))
+            whites_turn = not whites_turn
+
+    for board, whites_turn, legal in positions[-2::-1]:
+        board_state.unmake_move()
+        assert board_state.get_board() == board
+        assert _valid_moves(board, whites_turn, board_state) == legal
+
+def test_self_play_records_mate_on_the_last_ply_allowed():
+    """A mate played on the ply reaching max_plies ends the game as
+    checkmate, not by the move limit."""
+    player = ('A', 2, float('inf'))
+    record = play_game(0, 0, ('f2 f3', 'e7 e5', 'g2 g4'), player, player,
+                       max_plies=4)
+    assert (record.result, record.reason) == (BLACK_WIN, MATE_REASON)
+    assert record.moves[-1] == 'd8 h4'
+
+def test_self_play_records_mate_within_the_opening():
+    """An opening at least max_plies long which ends in mate is recorded
+    as checkmate."""
+    player = ('A', 1, float('inf'))
+    record = play_game(0, 0, ('f2 f3', 'e7 e5', 'g2 g4', 'd8 h4'), player,
+                       player, max_plies=2)
+    assert record.reason == MATE_REASON
+    assert len(record.moves) == 4
+
+def _request(server, request, owned):
+    """(Dict[str, Any]) Returns server's response to one request."""
+    return asyncio.run(server.handle_request(request, owned))
+
+def test_server_rejects_bad_game_ids():
+    """Game ids must be ints of games created on the same connection."""
+    server = ValidationServer(ValidationBatcher(None))
+    owned = {}
+    game_id = _request(server, {'op': 'new'}, owned)['game']
+    for bad_id in (str(game_id), True, None, 1.0, [game_id]):
+        with pytest.raises(ValueError, match='game must be an integer'):
+            _request(server, {'op': 'state', 'game': bad_id}, owned)
+
+    response = _request(server, {'op': 'state', 'game': game_id}, {})
+    assert response == {'ok': False, 'error': 'no such game'}
+    response = _request(server, {'op': 'move', 'game': game_id,
+                                 'move': 'e2 e4'}, owned)
+    assert response['ok'] == True
+
+def test_server_rejects_bad_fens():
+    """A FEN which is malformed, or lacks exactly one king per side, starts
+    no game."""
+    server = ValidationServer(ValidationBatcher(None))
+    owned = {}
+    for fen in ('8/8/8/8/8/8/8/8 w', '4k3/8/8/8/8/8/8/8 w',
+                '4K3/8/8/8/8/8/8/8 b', '3kk3/8/8/8/8/8/8/4K3 w',
+                'rnbqkbnr/pppppppp/8/8', 'x7/8/8/8/8/8/8/8 w', 7):
+        response = _request(server, {'op': 'new', 'fen': fen}, owned)
+        assert response['ok'] == False
+        assert response['error'].startswith('invalid FEN')
+    assert owned == {}
+    assert server.get_num_games() == 0
+
+def test_server_reports_bad_moves_and_limits():
+    """Unknown ops, missing, malformed and illegal moves and moves after
+    the end are errors which leave the game as it was, and closing a game
+    frees its place."""
+    server = ValidationServer(ValidationBatcher(None), max_games=1)
+    owned = {}
+    game_id = _request(server, {'op': 'new'}, owned)['game']
+    response = _request(server, {'op': 'new'}, owned)
+    assert response == {'ok': False, 'error': 'too many games'}
+    state = _request(server, {'op': 'state', 'game': game_id}, owned)
+
+    for request, error in (({'op': 'undo'}, "unknown op 'undo'"),
+                           ({'op': 'move'}, 'missing move'),
+                           ({'op': 'move', 'move': 'e2e4'},
+                            'invalid move format'),
+                           ({'op': 'move', 'move': 'e2 j9'},
+                            'invalid move format')):
+        request['game'] = game_id
+        assert _request(server, request, owned) == {'ok': False,
+                                                    'error': error}
+    response = _request(server, {'op': 'move', 'game': game_id,
+                                 'move': 'e2 e5'}, owned)
+    assert response['ok'] == False and len(response['error']) > 0
+    assert _request(server, {'op': 'state', 'game': game_id},
+                    owned) == state
+
+    for text in FOOLS_MATE:
+        response = _request(server, {'op': 'move', 'game': game_id,
+                                     'move': text, 'moves': True}, owned)
+    assert response['ok'] == True and response['moves'] == []
+    assert response['status'] == CHECKMATE
+    response = _request(server, {'op': 'move', 'game': game_id,
+                                 'move': 'a2 a3'}, owned)
+    assert response == {'ok': False, 'error': 'game is already over'}
+
+    assert _request(server, {'op': 'close', 'game': game_id}, owned) == {
+        'ok': True, 'game': game_id}
+    assert owned == {} and server.get_num_games() == 0
+    assert _request(server, {'op': 'new'}, owned)['ok'] == True
+
+def test_batch_scores_match_scalar_on_random_boards():
+    """Batch evaluation and mobility give evaluate() and mobility() of every
+    position from random games."""
+    boards = random_positions(500, seed=7)
+    codes = pack_boards(boards)
+    expected = [evaluate(board) for board in boards]
+    assert evaluate_boards(boards).tolist() == expected
+    assert evaluate_planes(to_planes(codes)).tolist() == expected
+    assert mobility_scores(codes).tolist() == [mobility(board)
+                                               for board in boards]
+
+def test_batch_benchmark_reports_matching_scores():
+    """The benchmark behind `python chess_batch.py` runs and its batch
+    scores match; its speedup is checked by that command's exit status."""
+    speedups = benchmark(200, seed=1, repeats=1)
+    assert speedups['matches'] == 1.0
+    assert speedups['total'] > 1
+
+def _play(simulator, seed, actions=2000):
+    """Plays random actions from a reset with seed, resetting after each
+    Game, and returns everything observed."""
+    agent = random.Random(seed)
+    trace = [simulator.reset(seed)]
+    for _ in range(actions):
+        observation, reward, done = simulator.step(
+            int(agent.random() * NUM_ACTIONS))
+        trace.append((observation, reward, done))
+        if done:
+            trace.append(simulator.reset())
+    return trace
+
+def test_simulator_reset_with_seed_repeats_games():
+    """Resetting with a seed repeats the same Games whatever was played
+    before, with and without tabulated rows."""
+    for size in (7, 12):
+        played = HackerSimulator(size, seed=5)
+        _play(played, 1, 300)
+        assert _play(played, 4) == _play(HackerSimulator(size), 4)
+
+def test_simulator_reset_empties_the_game():
+    """A reset Game has only the Player on its Grid and nothing collected."""
+    simulator = HackerSimulator(7, seed=2, max_ticks=20)
+    game = simulator.get_game()
+    _play(simulator, 2, 200)
+    observation = simulator.reset()
+    assert simulator.get_game() is game
+    assert observation == bytes(3) + b'P' + bytes(3 + 6 * 7)
+    assert (game.get_num_collected(), game.get_num_destroyed(),
+            game.get_total_shots(), simulator.get_ticks()) == (0, 0, 0, 0)
+    assert not game.has_won() and not game.has_lost()
+
+def _random_games(count, seed, plies=40):
+    """(List[Tuple[Board, bool, List[Move]]]) Returns positions from games of
+    random legal moves, with whose turn it is and the legal moves."""
+    generator = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        board = initial_state()
+        whites_turn = True
+        for _ in range(plies):
+            moves = generate_legal_moves(board, whites_turn)
+            positions.append((board, whites_turn, moves))
+            if len(moves) == 0 or len(positions) == count:
+                break
+            board = update_board(board, generator.choice(moves))
+            whites_turn = not whites_turn
+    return positions
+
+def test_bitboard_make_and_unmake_match_the_board():
+    """A BitBoard converts to and from a Board unchanged, and each move made
+    on it gives update_board()'s position until it is unmade."""
+    for board, whites_turn, moves in _random_games(60, seed=1):
+        bitboard = chess_bitboard.from_board(board)
+        assert chess_bitboard.to_board(bitboard) == board
+        assert chess_bitboard.is_in_check(bitboard, whites_turn) == (
+            check_game_over(board, whites_turn).status in (CHECK, CHECKMATE))
+        for move in moves:
+            bitboard.make_move(move)
+            assert chess_bitboard.to_board(bitboard) == update_board(board,
+                                                                     move)
+            bitboard.unmake_move()
+            assert bitboard == chess_bitboard.from_board(board)
+
+def _brute_force_moves(board, whites_turn):
+    """(Set[Move]) Returns every move the piece rules allow which leaves no
+    piece of the other player able to take the king."""
+    squares = [(row, col) for row in range(len(board))
+               for col in range(len(board))]
+    king = 'K' if whites_turn else 'k'
+    legal = set()
+    for position in squares:
+        if not is_current_players_piece(board[position[0]][position[1]],
+                                        whites_turn):
+            continue
+        for target in get_possible_moves(position, board):
+            move = (position, target)
+            if not (is_move_position_valid(move, board, whites_turn)
+                    and can_piece_perform(move, board, whites_turn)):
+                continue
+            after = update_board(board, move)
+            king_position = next(square for square in squares
+                                 if after[square[0]][square[1]] == king)
+            if not any(is_current_players_piece(after[row][col],
+                                                not whites_turn)
+                       and can_piece_perform(((row, col), king_position),
+                                             after, not whites_turn)
+                       for row, col in squares):
+                legal.add(move)
+    return legal
+
+def test_legal_moves_match_brute_force():
+    """generate_legal_moves() finds exactly the moves which do not leave the
+    king attacked, and can_move() agrees with it."""
+    for board, whites_turn, moves in _random_games(150, seed=2):
+        assert set(moves) == _brute_force_moves(board, whites_turn)
+        assert can_move(board, whites_turn) == (len(moves) > 0)
+
+def test_stalemate_has_no_moves_without_check():
+    """A king with no safe square and no other piece is stalemated."""
+    board = (
+        '.......k',
+        '.....Q..',
+        '......K.',
+        '........',
+        '........',
+        '........',
+        '........',
+        '........',
+    )
+    assert generate_legal_moves(board, False) == []
+    assert is_stalemate(board, False)
+    assert not is_stalemate(board, True)
+
+def test_perft_counts_match_known_values():
+    """perft() and the is_move_valid()-based perft count the known number of
+    positions for every test position."""
+    for name, (board, whites_turn, counts) in TEST_POSITIONS.items():
+        depth = 3 if name == 'initial' else 2
+        for ply, count in enumerate(counts[:depth], 1):
+            assert perft(board, whites_turn, ply) == count, (name, ply)
+        assert validator_perft(board, whites_turn, 2) == counts[1], name
+
+def _attack_counts(board_state):
+    """(List[int]) Returns the number of each player's attackers of every
+    square."""
+    return [board_state.count_attackers((row, col), by_white)
+            for by_white in (True, False)
+            for row in range(8) for col in range(8)]
+
+def test_board_state_updates_match_a_fresh_state():
+    """Making and unmaking moves keeps BoardState's kings, attack counts and
+    checks as a BoardState built from the position has them."""
+    generator = random.Random(3)
+    board = initial_state()
+    whites_turn = True
+    board_state = BoardState(board)
+    boards = []
+    for _ in range(80):
+        fresh = BoardState(board)
+        assert board_state.get_board() == board
+        assert _attack_counts(board_state) == _attack_counts(fresh)
+        for player in (True, False):
+            assert (board_state.get_king_position(player)
+                    == fresh.get_king_position(player))
+        assert board_state.is_in_check(whites_turn) == (
+            check_game_over(board, whites_turn).status in (CHECK, CHECKMATE))
+        moves = generate_legal_moves(board, whites_turn)
+        if len(moves) == 0:
+            break
+        move = generator.choice(moves)
+        boards.append(board)
+        board_state.make_move(move)
+        board = update_board(board, move)
+        whites_turn = not whites_turn
+
+    for board in reversed(boards):
+        board_state.unmake_move()
+        assert board_state.get_board() == board
+        assert _attack_counts(board_state) == _attack_counts(BoardState(board))
+
+def test_incremental_hash_matches_full_hash():
+    """update_hash() and BoardState give the hash computed from scratch
+    after every move, and transposed moves reach the same hash."""
+    for board, whites_turn, moves in _random_games(60, seed=4):
+        board_state = BoardState(board)
+        assert board_state.get_hash(whites_turn) == hash_position(
+            board, whites_turn)
+        for move in moves:
+            after = update_board(board, move)
+            assert update_hash(hash_board(board), board, move) == hash_board(
+                after)
+            board_state.make_move(move)
+            assert board_state.get_hash() == hash_board(after)
+            board_state.unmake_move()
+
+    board = initial_state()
+    knights_first = update_board(update_board(board, process_move('g1 f3')),
+                                 process_move('b1 c3'))
+    knights_last = update_board(update_board(board, process_move('b1 c3')),
+                                process_move('g1 f3'))
+    assert hash_board(knights_first) == hash_board(knights_last)
+    assert (hash_position(knights_first, True)
+            != hash_position(knights_first, False))
+
+@pytest.mark.parametrize('policy', [LRU, FIFO])
+def test_transposition_table_replacement(policy):
+    """A full table evicts its least recently used entry under LRU and its
+    oldest entry under FIFO."""
+    table = TranspositionTable(2, policy)
+    entries = [PositionInfo([], False) for _ in range(3)]
+    table.put(1, True, entries[0])
+    table.put(2, True, entries[1])
+    assert table.get(1, True) is entries[0]
+    assert table.get(1, False) is None
+    table.put(3, True, entries[2])
+
+    kept = {key for key in (1, 2, 3) if table.get(key, True) is not None}
+    assert kept == ({1, 3} if policy == LRU else {2, 3})
+    assert len(table) == 2
+    assert table.get_stats()['evictions'] == 1
+
+def test_probe_caches_legal_moves():
+    """probe() computes a position's moves once and returns the cached entry
+    afterwards."""
+    table = TranspositionTable(8)
+    board = initial_state()
+    entry = probe(table, board, True)
+    assert sorted(entry.moves) == sorted(generate_legal_moves(board, True))
+    assert not entry.in_check and not entry.game_over
+    assert probe(table, board, True) is entry
+    assert table.get_stats()['hits'] == 1
+
+def test_search_finds_mate_in_one():
+    """The search plays the back rank mate and scores it as a mate."""
+    result = Searcher(time_limit=60, max_depth=3).search(BACK_RANK_BOARD,
+                                                         True)
+    assert result.move == process_move('a1 a8')
+    assert result.score > MATE_SCORE - 10
+
+def test_search_takes_a_hanging_queen():
+    """The search captures an undefended queen rather than moving away."""
+    board = (
+        '....k...',
+        '........',
+        '........',
+        '...q....',
+        '........',
+        '........',
+        '........',
+        '...RK...',
+    )
+    result = Searcher(time_limit=60, max_depth=2).search(board, True)
+    assert result.move == process_move('d1 d5')
+
+def test_evaluation_is_symmetric():
+    """The initial position scores zero, and swapping the colours and ranks
+    of a position negates its score."""
+    assert evaluate(initial_state()) == 0
+    for board in random_positions(30, seed=5):
+        mirrored = tuple(row.swapcase() for row in reversed(board))
+        assert evaluate(mirrored) == -evaluate(board)
+
+def test_shared_table_keeps_deeper_results():
+    """A shared table is seen by every attached copy, and keeps a deeper
+    result over a shallower one for the same position."""
+    table = SharedTranspositionTable(64)
+    attached = SharedTranspositionTable(64, name=table.get_name())
+    try:
+        move = process_move('e2 e4')
+        table.store(12345, 4, -30, EXACT, move)
+        assert attached.probe(12345) == (4, -30, EXACT, move)
+        attached.store(12345, 2, 50, LOWER_BOUND, None)
+        assert table.probe(12345) == (4, -30, EXACT, move)
+        assert table.probe(12345 + 64) is None
+    finally:
+        attached.close()
+        table.close()
+
+def test_parallel_search_finds_mate_in_one():
+    """Worker processes find the same mate as the single process search."""
+    with ParallelSearcher(2, time_limit=60, max_depth=2,
+                          table_entries=1 << 10) as searcher:
+        result = searcher.search(BACK_RANK_BOARD, True)
+    assert result.move == process_move('a1 a8')
+    assert result.score > MATE_SCORE - 10
+
+# Fool's mate, the shortest game ending in checkmate.
+FOOLS_MATE = ['f2 f3', 'e7 e5', 'g2 g4', 'd8 h4']
+
+def test_validate_game_reports_each_ply():
+    """validate_game() plays every move, giving each board and status."""
+    plies = list(validate_game(FOOLS_MATE))
+    assert [ply for ply, board, status in plies] == [1, 2, 3, 4]
+    assert [status for ply, board, status in plies] == [NORMAL] * 3 + [
+        CHECKMATE]
+    board = initial_state()
+    for text in FOOLS_MATE:
+        board = update_board(board, process_move(text))
+    assert plies[-1][1] == board
+
+@pytest.mark.parametrize('moves, ply, reason', [
+    (['e2 e4', 'e7e5'], 2, 'invalid move format'),
+    (['e2 e5'], 1, None),
+    (FOOLS_MATE + ['e2 e4'], 5, 'game is already over'),
+])
+def test_validate_game_stops_at_the_first_illegal_move(moves, ply, reason):
+    """validate_game() raises IllegalMoveError naming the first move which
+    cannot be played."""
+    with pytest.raises(IllegalMoveError) as error:
+        list(validate_game(moves))
+    assert (error.value.ply, error.value.move) == (ply, moves[ply - 1])
+    if reason is not None:
+        assert error.value.reason == reason
+
+def test_check_game_reads_and_replays_games():
+    """Games read from a file are replayed to their final status, and an
+    illegal game reports how many plies were legal."""
+    lines = ['# comment', '', ','.join(FOOLS_MATE), 'e2 e4,e2 e4']
+    games = list(read_games(lines))
+    assert [check_game(game)[:3] for game in games] == [
+        (3, 4, CHECKMATE), (4, 1, None)]
+    assert 'ply 2' in check_game(games[1])[3]
+
+def test_fen_round_trips():
+    """Boards convert to FEN and back unchanged, with the side to move."""
+    assert board_to_fen(initial_state()) == (
+        'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w - - 0 1')
+    for board, whites_turn, moves in _random_games(40, seed=6):
+        fen = board_to_fen(board, whites_turn)
+        assert fen_to_board(fen) == (board, whites_turn)
+    assert fen_to_board('4k3/8/8/8/8/8/8/4K3')[1] is True
+
+@pytest.mark.parametrize('fen', [
+    '', '8/8/8/8/8/8/8 w', '9/8/8/8/8/8/8/8 w', '8/8/8/8/8/8/8/7x w',
+    '8/8/8/8/8/8/8/8 x',
+])
+def test_fen_rejects_bad_positions(fen):
+    """Malformed FENs raise ValueError."""
+    with pytest.raises(ValueError):
+        fen_to_board(fen)
+
+def test_packed_boards_are_32_bytes_and_round_trip():
+    """pack_board() gives PACKED_SIZE (32) bytes which unpack to the same
+    board, alone or back to back."""
+    boards = random_positions(40, seed=7)
+    packed = [pack_board(board) for board in boards]
+    assert PACKED_SIZE == 32
+    assert all(len(data) == 32 for data in packed)
+    assert [unpack_board(data) for data in packed] == boards
+    data = b''.join(packed)
+    assert list(iter_packed_boards(data)) == boards
+    assert unpack_board(data, 32 * 5) == boards[5]
+    with pytest.raises(ValueError):
+        unpack_board(data[:31])
+
+def test_position_store_counts_results_and_reopens(tmp_path):
+    """The store counts each position's results, keeps them when reopened
+    and rebuilds a missing index."""
+    path = str(tmp_path / 'positions.db')
+    with PositionStore(path) as store:
+        assert store.add_game(FOOLS_MATE) == 4
+        store.add_game(['e2 e4', 'e7 e5'], DRAWN_GAME)
+        assert len(store) == 7
+        record = store.lookup(initial_state(), True)
+        assert (record.black_wins, record.draws, record.get_games()) == (
+            1, 1, 2)
+        assert store.lookup(initial_state(), False) is None
+
+    (tmp_path / 'positions.db.idx').unlink()
+    positions = random_positions(1500, seed=8)
+    with PositionStore(path) as store:
+        assert store.lookup(initial_state(), True).get_games() == 2
+        for board in positions:
+            store.add_position(board, True, DRAWN_GAME)
+        for board in positions:
+            record = store.lookup(board, True)
+            assert record.get_board() == board
+        assert store.get_record(0).get_board() == initial_state()
+
+def test_step_tables_count_moves_from_corners_and_centre():
+    """Knights and kings have fewer targets in the corner than the centre,
+    and pawns push twice only from their starting row."""
+    tables = get_attack_tables()
+    assert [len(tables.knight_targets[square]) for square in (0, 27)] == [
+        2, 8]
+    assert [len(tables.king_targets[square]) for square in (0, 27)] == [3, 8]
+    assert tables.pawn_pushes[True][6 * 8 + 4] == ((5, 4), (4, 4))
+    assert tables.pawn_pushes[True][5 * 8 + 4] == ((4, 4),)
+    assert tables.pawn_attacks[False][1 * 8] == ((2, 1),)
+
+def _walk_rays(square, occupied, directions):
+    """(int) Returns the bitboard of squares reached from square along
+    directions, one step at a time up to the first occupied square."""
+    attacks = 0
+    for d_row, d_col in directions:
+        row, col = divmod(square, 8)
+        row, col = row + d_row, col + d_col
+        while 0 <= row < 8 and 0 <= col < 8:
+            attacks |= 1 << (row * 8 + col)
+            if occupied >> (row * 8 + col) & 1:
+                break
+            row, col = row + d_row, col + d_col
+    return attacks
+
+def test_sliding_attacks_match_walking_the_rays():
+    """Rook, bishop and queen attacks from the ray masks match walking each
+    ray square by square."""
+    tables = get_attack_tables()
+    generator = random.Random(9)
+    for _ in range(200):
+        occupied = generator.getrandbits(64) & generator.getrandbits(64)
+        square = generator.randrange(64)
+        assert tables.rook_attacks(square, occupied) == _walk_rays(
+            square, occupied, ORTHOGONAL_DIRECTIONS)
+        assert tables.bishop_attacks(square, occupied) == _walk_rays(
+            square, occupied, DIAGONAL_DIRECTIONS)
+        assert tables.queen_attacks(square, occupied) == _walk_rays(
+            square, occupied, ALL_DIRECTIONS)
+
+def test_attack_checks_agree_on_every_square():
+    """The Board, BitBoard and BoardState attack checks, all built on the
+    tables, agree on every square of random positions."""
+    for board in random_positions(40, seed=10):
+        bitboard = chess_bitboard.from_board(board)
+        board_state = BoardState(board)
+        for square in range(64):
+            position = divmod(square, 8)
+            for by_white in (True, False):
+                attacked = is_position_attacked(board, position, by_white)
+                assert chess_bitboard.is_square_attacked(
+                    bitboard, square, by_white) == attacked
+                assert (board_state.count_attackers(position, by_white)
+                        > 0) == attacked
+
+def test_third_repetition_is_a_draw():
+    """A position reached for the third time draws the game, and a capture
+    or pawn move clears the history."""
+    game_state = GameState()
+    board = initial_state()
+    shuffle = ['g1 f3', 'g8 f6', 'f3 g1', 'f6 g8']
+    for text in shuffle * 2 + ['e2 e4']:
+        if text == 'e2 e4':
+            assert game_state.get_repetitions() == 3
+            assert game_state.get_draw_reason() == REPETITION
+            assert check_game_over(board, True, game_state).status == DRAW
+        else:
+            assert game_state.get_draw_reason() is None
+        game_state.update(board, process_move(text))
+        board = update_board(board, process_move(text))
+    assert game_state.get_repetitions() == 1
+    assert game_state.get_halfmove_clock() == 0
+    assert game_state.get_draw_reason() is None
+
+@pytest.mark.parametrize('pieces, insufficient', [
+    ('', True), ('N', True), ('b', True), ('B.b', True), ('Bb', False),
+    ('NN', False), ('Nb', False), ('P', False), ('r', False),
+])
+def test_insufficient_material(pieces, insufficient):
+    """Only kings with at most one minor piece, or with bishops all on one
+    colour of square, cannot mate."""
+    board = ('K.......', '........', pieces.ljust(8, '.'), '........',
+             '........', '........', '........', '.......k')
+    assert GameState(board).is_insufficient_material() == insufficient
+
+def test_unmake_restores_every_position():
+    """Moves made on a MutableBoard give update_board()'s positions, its
+    legal moves and kings match, and unmaking them restores each position
+    in turn."""
+    generator = random.Random(11)
+    board = initial_state()
+    whites_turn = True
+    mutable = MutableBoard(board)
+    boards = []
+    for _ in range(120):
+        moves = generate_legal_moves(board, whites_turn)
+        assert generate_legal_moves(mutable, whites_turn) == moves
+        if len(moves) == 0:
+            break
+        for move in moves:
+            mutable.make_move(move)
+            assert mutable.get_board() == update_board(board, move)
+            mutable.unmake_move()
+            assert mutable.get_board() == board
+        move = generator.choice(moves)
+        boards.append(board)
+        mutable.make_move(move)
+        board = update_board(board, move)
+        whites_turn = not whites_turn
+        assert mutable.get_king_position(True) == MutableBoard(
+            board).get_king_position(True)
+
+    for board in reversed(boards):
+        mutable.unmake_move()
+        assert mutable.get_board() == board
+    with pytest.raises(IndexError):
+        mutable.unmake_move()
+
+def test_opening_book_gives_moves_by_weight(tmp_path):
+    """A book written from games gives the moves played from a position,
+    most played first, and nothing for positions out of the book."""
+    games = [['e2 e4', 'e7 e5'], ['e2 e4', 'c7 c5'], ['d2 d4', 'd7 d5']]
+    book = build_book(games, max_plies=1)
+    file_name = str(tmp_path / 'book.bin')
+    assert write_book(file_name, book) == 2
+
+    board = initial_state()
+    with OpeningBook(file_name) as opening_book:
+        assert len(opening_book) == 2
+        assert opening_book.get_moves(board, True) == [
+            (process_move('e2 e4'), 2), (process_move('d2 d4'), 1)]
+        assert opening_book.choose_move(board, True) == process_move('e2 e4')
+        assert opening_book.choose_move(
+            board, True, random.Random(1)) in book[hash_position(board, True)]
+        board = update_board(board, process_move('e2 e4'))
+        assert opening_book.get_moves(board, False) == []
+        assert opening_book.choose_move(board, False) is None
+
+@pytest.fixture(scope='module')
+def table_directory(tmp_path_factory):
+    """(str) Returns a directory holding the KQK and KRK tables."""
+    directory = tmp_path_factory.mktemp('tables')
+    for name in ('KQK', 'KRK'):
+        table = generate_table(ENDINGS[name])
+        (directory / (name + TABLE_EXTENSION)).write_bytes(table)
+    return str(directory)
+
+@pytest.mark.parametrize('name, longest', [('KQK', 19), ('KRK', 31)])
+def test_tablebase_longest_mates(table_directory, name, longest):
+    """The longest forced mates are 19 plies with a queen and 31 with a
+    rook."""
+    with open(f'{table_directory}/{name}{TABLE_EXTENSION}', 'rb') as file:
+        table = file.read()
+    assert max(value for value in table if value < LOSS) == longest
+
+def test_tablebase_probes_and_finds_mates(table_directory):
+    """Probes score mates for either colour, and the best move from a mate
+    in one mates."""
+    board = ('.......k', 'Q.......', '......K.', '........',
+             '........', '........', '........', '........')
+    mirrored = tuple(row.swapcase() for row in reversed(board))
+    with Tablebase(table_directory) as tablebase:
+        assert sorted(tablebase.get_endings()) == ['KQK', 'KRK']
+        for position, whites_turn in ((board, True), (mirrored, False)):
+            assert tablebase.probe(position, whites_turn) == MATE_SCORE - 1
+            move, score = tablebase.best_move(position, whites_turn)
+            assert score == MATE_SCORE - 1
+            mated = update_board(position, move)
+            assert check_game_over(mated, not whites_turn).status == CHECKMATE
+            assert tablebase.probe(mated, not whites_turn) == -MATE_SCORE
+
+        bare_kings = tuple(row.replace('Q', '.') for row in board)
+        assert tablebase.probe(bare_kings, True) == 0
+        pawn = tuple(row.replace('Q', 'P') for row in board)
+        assert tablebase.probe(pawn, True) is None
+        assert tablebase.best_move(pawn, True) is None
+
+def test_game_over_results(capsys):
+    """check_game_over() reports the status, checking pieces and number of
+    legal moves without printing."""
+    board = initial_state()
+    result = check_game_over(board, True)
+    assert (result.status, result.num_legal_moves) == (NORMAL, 20)
+    assert result.checking_pieces == []
+    assert not result.is_over() and result.get_message() is None
+
+    for text in ['e2 e4', 'f7 f6', 'd1 h5']:
+        board = update_board(board, process_move(text))
+    result = check_game_over(board, False)
+    assert result.status == CHECK and not result.whites_turn
+    assert result.checking_pieces == [(3, 7)]
+    assert result.num_legal_moves == len(generate_legal_moves(board, False))
+    assert not result.is_over()
+    assert result.get_message() == 'Black is in check'
+
+    board = initial_state()
+    for text in FOOLS_MATE:
+        board = update_board(board, process_move(text))
+    result = check_game_over(board, True)
+    assert result.status == CHECKMATE and result.whites_turn
+    assert result.checking_pieces == [(4, 7)]
+    assert result.num_legal_moves == 0
+    assert result.is_over() and result.get_message() == 'Checkmate'
+
+    board = ('k.......', '........', '.Q......', '........',
+             '........', '........', '........', '.......K')
+    result = check_game_over(board, False)
+    assert result.status == STALEMATE
+    assert (result.checking_pieces, result.num_legal_moves) == ([], 0)
+    assert result.is_over() and result.get_message() == 'Stalemate'
+    assert capsys.readouterr().out == ''
+
+def test_profiler_counts_calls_only_while_enabled(tmp_path):
+    """An enabled profiler counts calls to each stage wherever it was
+    imported, and disabling it restores the original functions."""
+    original = generate_legal_moves
+    profiler = Profiler()
+    profiler.enable(('generate_legal_moves', 'update_board'))
+    try:
+        assert profiler.is_enabled()
+        assert generate_legal_moves is not original
+        board = initial_state()
+        generate_legal_moves(board, True)
+        for text in ['e2 e4', 'e7 e5']:
+            board = update_board(board, process_move(text))
+    finally:
+        profiler.disable()
+    assert generate_legal_moves is original and not profiler.is_enabled()
+    generate_legal_moves(board, True)
+
+    snapshot = profiler.snapshot()
+    assert sorted(snapshot) == ['generate_legal_moves', 'update_board']
+    assert snapshot['generate_legal_moves'][0] == 1
+    assert snapshot['update_board'][0] == 2
+    previous = {'update_board': snapshot['update_board']}
+    lines = format_snapshot(snapshot, previous)
+    assert len(lines) == 1 and lines[0].startswith('generate_legal_moves: 1 ')
+
+    file_name = str(tmp_path / 'stacks.txt')
+    assert profiler.write_collapsed(file_name) == 2
+    with open(file_name) as file:
+        for line in file:
+            stack, microseconds = line.split()
+            assert stack in snapshot and int(microseconds) > 0
+    profiler.reset()
+    assert profiler.snapshot() == {}
+
+@pytest.mark.parametrize('value, setting', [
+    ('', (False, None)), ('0', (False, None)), ('1', (True, None)),
+    ('stacks.txt', (True, 'stacks.txt')),
+])
+def test_profile_setting_from_environment(monkeypatch, value, setting):
+    """CHESS_PROFILE turns profiling on and may name a file for stacks."""
+    monkeypatch.setenv(PROFILE_VARIABLE, value)
+    assert get_profile_setting() == setting
+
+def test_move_codes_round_trip():
+    """Every move encodes to a distinct 16-bit code which decodes back, with
+    its promotion, flags and text kept."""
+    positions = [(row, col) for row in range(BOARD_SIZE)
+                 for col in range(BOARD_SIZE)]
+    codes = set()
+    for from_position in positions:
+        for to_position in positions:
+            move = (from_position, to_position)
+            code = encode_move(move)
+            assert 0 <= code < NUM_MOVE_CODES
+            assert decode_move(code) == move
+            assert get_move_flags(code) == 0
+            assert get_move_promotion(code) is None
+            text = decode_move_text(code)
+            assert process_move(text) == move
+            assert encode_move_text(text) == code
+            codes.add(code)
+    assert len(codes) == len(positions) ** 2
+    assert encode_move_text('e2 i9') is None
+
+    move = process_move('e7 f8')
+    for piece in PROMOTION_PIECES:
+        code = encode_move(move, piece.upper(), CAPTURE_FLAG)
+        assert code < 1 << 16 and decode_move(code) == move
+        assert get_move_promotion(code) == piece
+        assert get_move_flags(code) == CAPTURE_FLAG | PROMOTION_FLAG
+
+def test_legal_move_codes_match_legal_moves():
+    """Legal move codes are the encoded legal moves, flagged as captures
+    exactly when they take a piece."""
+    for board, whites_turn, moves in _random_games(200, 5, plies=80):
+        codes = generate_legal_move_codes(board, whites_turn)
+        assert codes.typecode == 'H' and codes.itemsize == 2
+        assert [decode_move(code) for code in codes] == moves
+        assert encode_moves(moves) == array('H', [
+            code & MOVE_MASK for code in codes])
+        for code, ((_, _), (row, col)) in zip(codes, moves):
+            assert (get_move_flags(code) == CAPTURE_FLAG) == (
+                board[row][col] != EMPTY)
+
+class _DictGame(object):
+    """The rules of the original dict-backed Hacker Game, drawing from the
+    generator in the same order, with cells keyed by (col, row)."""
+    def __init__(self, size, generator):
+        """(None) Starts a Game with only the Player on the Grid."""
+        self.size = size
+        self.random = generator
+        self.cells = {((size - 1) // 2, 0): PLAYER}
+        self.flag = None
+        self.counts = [0, 0, 0]
+
+    def rotate_grid(self, direction):
+        """(None) Moves every Entity but the Player a column, wrapping."""
+        offset = -1 if direction == LEFT else 1
+        self.cells = {(col if row == 0 else (col + offset) % self.size, row):
+                      display for (col, row), display in self.cells.items()}
+
+    def step(self):
+        """(None) Moves every Entity but the Player down a row, losing if a
+        Destroyable leaves row 1, then adds a random top row."""
+        cells = {}
+        for (col, row), display in self.cells.items():
+            if row == 1 and display == DESTROYABLE:
+                self.flag = False
+            if row != 1:
+                cells[(col, max(row - 1, 0))] = display
+        self.cells = cells
+        entities = self.random.choices(
+            ENTITY_TYPES, k=self.random.randint(0, self.size - 3))
+        if self.random.randint(1, 4) % 4 == 0:
+            entities.append(BLOCKER)
+        columns = self.random.sample(range(self.size), len(entities))
+        for col, display in zip(columns, entities):
+            self.cells[(col, self.size - 1)] = display
+
+    def get_target(self):
+        """(Optional[str]) Returns the first Entity in the Player's column."""
+        col = (self.size - 1) // 2
+        for row in range(1, self.size):
+            if (col, row) in self.cells:
+                return self.cells[(col, row)]
+        return None
+
+    def fire(self, shot_type):
+        """(None) Shoots the first Entity in the Player's column."""
+        col = (self.size - 1) // 2
+        self.counts[2] += 1
+        for row in range(1, self.size):
+            display = self.cells.get((col, row))
+            if display is None:
+                continue
+            if display == COLLECTABLE and shot_type == COLLECT:
+                self.counts[0] += 1
+                del self.cells[(col, row)]
+            if display == DESTROYABLE and shot_type == DESTROY:
+                self.counts[1] += 1
+                del self.cells[(col, row)]
+            break
+        if self.counts[0] == COLLECTION_TARGET:
+            self.flag = True
+
+def test_game_matches_the_dict_model():
+    """Under the same seed, Game keeps the Entities, counts and result of
+    the original dict-backed Game through random play, won and lost."""
+    results = set()
+    for size in (3, 7, 12):
+        for seed in range(6):
+            game = Game(size, random.Random(seed))
+            reference = _DictGame(size, random.Random(seed))
+            agent = random.Random(seed)
+            for _ in range(1000):
+                action = agent.choice([LEFT, RIGHT, COLLECT, DESTROY, 'aim',
+                                       None])
+                if action == 'aim':
+                    action = (COLLECT if reference.get_target() == COLLECTABLE
+                              else DESTROY)
+                for model in (game, reference):
+                    if action is None:
+                        model.step()
+                    elif action in (COLLECT, DESTROY):
+                        model.fire(action)
+                    else:
+                        model.rotate_grid(action)
+                assert game.get_grid().serialise() == reference.cells
+                assert [game.get_num_collected(), game.get_num_destroyed(),
+                        game.get_total_shots()] == reference.counts
+                assert game.has_won() == (reference.flag == True)
+                assert game.has_lost() == (reference.flag == False)
+                if reference.flag is not None:
+                    break
+            results.add(reference.flag)
+    assert {True, False} <= results
+
+def _random_grid(size, generator):
+    """(Tuple[Grid, Dict[Tuple[int, int], str]]) Returns a Grid holding the
+    Player and random Entities, and the display at each (col, row)."""
+    cells = {((size - 1) // 2, 0): PLAYER}
+    for row in range(1, size):
+        for col in range(size):
+            display = generator.choice([None, None, BLOCKER] + ENTITY_TYPES)
+            if display is not None:
+                cells[(col, row)] = display
+    grid = Grid(size)
+    grid.set_entities({Position(col, row): create_entity(display)
+                       for (col, row), display in cells.items()})
+    return grid, cells
+
+def _cells_to_bytes(cells, size):
+    """(bytes) Returns cells as Grid.to_bytes() describes them."""
+    return bytes(ord(cells.get((col, row), '\0')) for row in range(size)
+                 for col in range(size))
+
+def _check_grid(grid, cells):
+    """(None) Asserts every way of reading grid finds cells."""
+    size = grid.get_size()
+    assert grid.serialise() == cells
+    assert grid.to_bytes() == _cells_to_bytes(cells, size)
+    assert {(position.get_x(), position.get_y()): entity.display()
+            for position, entity in grid.get_entities().items()} == cells
+    for row in range(size):
+        for col in range(size):
+            entity = grid.get_entity(Position(col, row))
+            assert (entity and entity.display()) == cells.get((col, row))
+
+def test_grid_rotation_moves_every_entity_but_the_player():
+    """Rotating moves each Entity off the Player's row by the offset,
+    wrapping, and every read of Grid sees the moved Entities."""
+    generator = random.Random(3)
+    for size in (2, 5, 8, 11):
+        grid, cells = _random_grid(size, generator)
+        _check_grid(grid, cells)
+        for offset in (1, -1, 3, -2 * size - 1, size):
+            grid.rotate(offset)
+            cells = {(col if row == 0 else (col + offset) % size, row):
+                     display for (col, row), display in cells.items()}
+            _check_grid(grid, cells)
+        for direction, offset in ((LEFT, -1), (RIGHT, 1)):
+            game = Game(size, random.Random(1))
+            game.get_grid().set_entities(grid.get_entities())
+            game.rotate_grid(direction)
+            assert game.get_grid().serialise() == {
+                (col if row == 0 else (col + offset) % size, row): display
+                for (col, row), display in cells.items()}
+
+def test_grid_shift_down_moves_rows_towards_the_player():
+    """Shifting drops the row next to the Player and moves the rest down,
+    leaving an empty top row to fill, and steps of Game are lost once a
+    Destroyable is next to the Player."""
+    generator = random.Random(4)
+    for size in (2, 5, 8, 11):
+        grid, cells = _random_grid(size, generator)
+        for _ in range(3 * size):
+            grid.rotate(generator.randint(-size, size))
+            cells = grid.serialise()
+            grid.shift_down()
+            cells = {(col, row if row == 0 else row - 1): display
+                     for (col, row), display in cells.items() if row != 1}
+            _check_grid(grid, cells)
+            top = {col: generator.choice([BLOCKER] + ENTITY_TYPES)
+                   for col in generator.sample(range(size), size // 2)}
+            grid.fill_top_row(list(top), list(top.values()))
+            cells.update(((col, size - 1), display)
+                         for col, display in top.items())
+            _check_grid(grid, cells)
+            for row in range(size):
+                assert grid.row_contains(row, DESTROYABLE) == (
+                    DESTROYABLE in [cells.get((col, row))
+                                    for col in range(size)])
+
+    game = Game(5, random.Random(1))
+    game.get_grid().set_entities({Position(2, 0): create_entity(PLAYER),
+                                  Position(4, 2): create_entity(DESTROYABLE)})
+    game.step()
+    assert not game.has_lost()
+    game.step()
+    assert game.has_lost()
+
+def test_lowest_position_matches_scanning_the_column():
+    """The Entity nearest the Player in each column is the one a scan up
+    the column finds, through adding, removing, rotating and shifting."""
+    generator = random.Random(5)
+    for size in (2, 5, 8, 11):
+        grid, cells = _random_grid(size, generator)
+        for _ in range(20 * size):
+            action = generator.randrange(4)
+            if action == 0:
+                grid.rotate(generator.choice([-1, 1]))
+            elif action == 1:
+                grid.shift_down()
+            elif action == 2:
+                col = generator.randrange(size)
+                grid.add_entity(Position(col, size - 1),
+                                create_entity(generator.choice(ENTITY_TYPES)))
+            else:
+                position = Position(generator.randrange(size),
+                                    generator.randrange(1, size))
+                if grid.get_entity(position) is None:
+                    with pytest.raises(KeyError):
+                        grid.remove_entity(position)
+                else:
+                    grid.remove_entity(position)
+            cells = grid.serialise()
+            for col in range(size):
+                rows = [row for row in range(1, size) if (col, row) in cells]
+                lowest = grid.get_lowest_position(col)
+                if len(rows) == 0:
+                    assert lowest is None
+                else:
+                    assert (lowest.get_x(), lowest.get_y()) == (col, rows[0])
+        assert grid.get_lowest_position(-1) is None
+        assert grid.get_lowest_position(size) is None
+
+def test_grid_shift_down_adds_a_top_row_of_bytes():
+    """A top row given as bytes is added in the columns shown, and a row
+    holding the Player or an unknown Entity is rejected unchanged."""
+    generator = random.Random(6)
+    for size in (2, 5, 8, 11):
+        grid, cells = _random_grid(size, generator)
+        for _ in range(3 * size):
+            grid.rotate(generator.randint(-size, size))
+            cells = grid.serialise()
+            top = [generator.choice([None, BLOCKER] + ENTITY_TYPES)
+                   for _ in range(size)]
+            grid.shift_down(bytes(0 if display is None else ord(display)
+                                  for display in top))
+            cells = {(col, row if row == 0 else row - 1): display
+                     for (col, row), display in cells.items() if row != 1}
+            cells.update(((col, size - 1), display)
+                         for col, display in enumerate(top)
+                         if display is not None)
+            _check_grid(grid, cells)
+
+        for display in (PLAYER, '?'):
+            with pytest.raises(NotImplementedError):
+                grid.shift_down(display.encode() + bytes(size - 1))
+            _check_grid(grid, cells)
+
+def test_simulator_step_rewards_and_ends_games():
+    """Shots that hit are rewarded, collecting the target wins, a
+    Destroyable next to the Player loses, and a finished Game must be reset
+    before another action."""
+    size = COLLECTION_TARGET + 2
+    simulator = HackerSimulator(size, seed=1, actions_per_tick=1000)
+    game = simulator.get_game()
+    col = (size - 1) // 2
+    entities = {Position(col, row): create_entity(COLLECTABLE)
+                for row in range(1, COLLECTION_TARGET + 1)}
+    entities[Position(col, 0)] = create_entity(PLAYER)
+    game.get_grid().set_entities(entities)
+
+    assert simulator.step(FIRE_DESTROY)[1:] == (0.0, False)
+    for shot in range(1, COLLECTION_TARGET + 1):
+        observation, reward, done = simulator.step(FIRE_COLLECT)
+        assert observation == game.get_grid().to_bytes()
+        assert observation[shot * size + col] == 0
+        if shot < COLLECTION_TARGET:
+            assert (reward, done) == (COLLECT_REWARD, False)
+    assert (reward, done) == (COLLECT_REWARD + WIN_REWARD, True)
+    with pytest.raises(RuntimeError):
+        simulator.step(NO_ACTION)
+
+    simulator = HackerSimulator(size, seed=1, max_ticks=3)
+    simulator.get_game().get_grid().set_entities({
+        Position(col, 0): create_entity(PLAYER),
+        Position(col, 1): create_entity(DESTROYABLE)})
+    assert simulator.step(NO_ACTION)[1:] == (LOSS_REWARD, True)
+    simulator.reset()
+    with pytest.raises(ValueError):
+        simulator.step(NUM_ACTIONS)
+    assert [simulator.step(ROTATE_LEFT)[2] for _ in range(3)] == [
+        False, False, True]
+    assert simulator.get_ticks() == 3